@@ -7,7 +7,7 @@ opens webcam to verify hardware access, manages guard on/off state.
 
 Notes:
 - Uses Google Web Speech (SpeechRecognition) by default (high accuracy, needs internet).
-- Uses fuzzy matching (rapidfuzz) to accept close variants of the phrase.
+- Uses fuzzy matching (rapidfuzz, via CommandMatcher) to accept close variants of the phrase.
 - Uses pyttsx3 for offline TTS confirmation.
 - Optional: Integrate Vosk offline ASR as fallback (notes below).
 """
@@ -19,7 +19,9 @@ import sys
 import cv2
 import speech_recognition as sr
 import pyttsx3
-from rapidfuzz import fuzz, process
+from src.agents.commandMatcher import CommandMatcher
+from src.agents.frameRate import AdaptiveFrameRate
+from src.agents.motionDetector import MotionDetector
 
 # --- Config ---
 WAKE_PHRASES = ["guard my room", "guard the room", "guard my room please"]
@@ -31,11 +33,16 @@ LANG = "en-IN"  # adjust to accent; "en-US" / "en-GB" / "en-IN" etc.
 
 # --- Helper classes ---
 class CameraThread(threading.Thread):
-    def __init__(self, camera_index=0):
+    def __init__(self, camera_index=0, is_guarding=lambda: True):
         super().__init__(daemon=True)
         self.camera_index = camera_index
+        self.is_guarding = is_guarding
         self.running = True
         self.cap = None
+        # A tiny change detector decides how often frames are worth reading
+        self.motion_detector = MotionDetector()
+        self.frame_rate = AdaptiveFrameRate()
+        self.wake = threading.Event()
 
     def run(self):
         try:
@@ -43,20 +50,26 @@ class CameraThread(threading.Thread):
             if not self.cap.isOpened():
                 print(f"[camera] Cannot open camera index {self.camera_index}")
                 return
+            # Keep the driver queue short so a slowly read frame is not stale
+            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
             print("[camera] Camera opened OK.")
             while self.running:
                 ret, frame = self.cap.read()
                 if not ret:
                     print("[camera] Failed to read frame.")
                     break
-                # Keep CPU low: don't display unless you want; just sleep a bit
-                time.sleep(0.05)
+                # Keep CPU low: a static room is sampled slowly, motion brings the rate back up
+                active = self.motion_detector.update(frame).active
+                fps = self.frame_rate.update(active, guarding=self.is_guarding())
+                if fps:
+                    self.wake.wait(1.0 / fps)
             self.cap.release()
         except Exception as e:
             print("[camera] Exception:", e)
 
     def stop(self):
         self.running = False
+        self.wake.set()
 
 class GuardAgent:
     def __init__(self):
@@ -72,24 +85,24 @@ class GuardAgent:
         self.tts.setProperty("rate", int(rate * 0.95))
 
         self.guard_on = False
-        self.camera_thread = CameraThread()
+        self.camera_thread = CameraThread(is_guarding=lambda: self.guard_on)
         self.listen_lock = threading.Lock()
         self.stop_event = threading.Event()
 
+        # Built once; each utterance is scored against all phrases in one call
+        self.command_matcher = CommandMatcher(
+            {"activate": WAKE_PHRASES, "deactivate": DEACTIVATE_PHRASES},
+            threshold=FUZZY_THRESHOLD, minMargin=0, scorer="WRatio", minLengthRatio=0.0,
+        )
+        self.confirm_matcher = CommandMatcher({"yes": CONFIRM_YES}, threshold=70, minMargin=0, scorer="WRatio",
+                                              minLengthRatio=0.0, exactWords=False)
+
     def speak(self, text):
         # synchronous TTS (pyttsx3)
         print("[TTS]", text)
         self.tts.say(text)
         self.tts.runAndWait()
 
-    def fuzzy_match(self, phrase, candidates):
-        # returns (best_candidate, score)
-        # Use rapidfuzz.process.extractOne for best match
-        best = process.extractOne(phrase, candidates, scorer=fuzz.WRatio)
-        if best:
-            return best[0], best[1]
-        return None, 0
-
     def recognize_audio(self, audio):
         """
         Try Google Web Speech first (good accuracy). On errors, return None
@@ -134,9 +147,9 @@ class GuardAgent:
         text = self.listen_once(timeout=3)
         if not text:
             return False
-        candidate, score = self.fuzzy_match(text, CONFIRM_YES)
-        print(f"[confirm] heard='{text}' best='{candidate}' score={score}")
-        return score >= 70
+        match = self.confirm_matcher.match(text)
+        print(f"[confirm] heard='{text}' best='{match.phrase}' score={match.score:.0f}")
+        return match.matched
 
     def handle_candidate_phrase(self, text):
         """
@@ -145,12 +158,10 @@ class GuardAgent:
         if not text:
             return False
 
-        # Check for activation
-        cand_act, score_act = self.fuzzy_match(text, WAKE_PHRASES)
-        cand_deact, score_deact = self.fuzzy_match(text, DEACTIVATE_PHRASES)
-        print(f"[match] act_best='{cand_act}' ({score_act}), deact_best='{cand_deact}' ({score_deact})")
+        match = self.command_matcher.match(text)
+        print(f"[match] best='{match.phrase}' intent={match.intent} ({match.score:.0f}, margin {match.margin:.0f})")
 
-        if score_act >= FUZZY_THRESHOLD:
+        if match.intent == "activate":
             # Ask confirmation to reduce false positives (improves real-world accuracy)
             if self.confirm_with_user("I heard activation. Confirm activation by saying 'yes'."):
                 self.activate_guard()
@@ -159,7 +170,7 @@ class GuardAgent:
                 self.speak("Activation canceled.")
                 return False
 
-        if score_deact >= FUZZY_THRESHOLD:
+        if match.intent == "deactivate":
             if self.confirm_with_user("I heard request to stop guard. Say 'yes' to confirm."):
                 self.deactivate_guard()
                 return True
@@ -175,7 +186,7 @@ class GuardAgent:
             return
         # start camera thread if not already started
         if not self.camera_thread.is_alive():
-            self.camera_thread = CameraThread()
+            self.camera_thread = CameraThread(is_guarding=lambda: self.guard_on)
             self.camera_thread.start()
             time.sleep(0.5)
         self.guard_on = True
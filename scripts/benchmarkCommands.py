@@ -0,0 +1,40 @@
+import argparse
+import random
+import time
+
+from src.utils import load_config
+from src.agents.commandMatcher import CommandMatcher
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure command matching latency as the phrase lists grow.")
+    parser.add_argument("--config", default="config.yaml")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 100, 300], help="Extra phrases per command")
+    parser.add_argument("--utterances", type=int, default=2000)
+    args = parser.parse_args()
+
+    commands = load_config(args.config).get("commands", {})
+    words = sorted({word for phrases in commands.values() for phrase in phrases for word in phrase.split()})
+    rng = random.Random(0)
+    utterances = [" ".join(rng.choices(words, k=rng.randint(1, 5))) for _ in range(args.utterances)]
+
+    print(f"{'phrases':>8} {'uncached us':>12} {'cached us':>10}")
+    for size in args.sizes:
+        intents = {
+            intent: list(phrases) + [" ".join(rng.choices(words, k=rng.randint(2, 5))) for _ in range(size)]
+            for intent, phrases in commands.items()
+        }
+        matcher = CommandMatcher(intents, cacheSize=args.utterances)
+        start = time.perf_counter()
+        for utterance in utterances:
+            matcher.match(utterance)
+        uncached = (time.perf_counter() - start) / len(utterances)
+        start = time.perf_counter()
+        for utterance in utterances:
+            matcher.match(utterance)
+        cached = (time.perf_counter() - start) / len(utterances)
+        print(f"{len(matcher.phrases):>8} {uncached * 1e6:>12.1f} {cached * 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
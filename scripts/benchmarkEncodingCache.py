@@ -0,0 +1,44 @@
+import argparse
+import logging
+import tempfile
+import time
+
+from pathlib import Path
+from src.utils import load_config, setup_logging
+from src.agents.faceRecognition import FaceRecognition
+
+
+def timeLoad(trustedFacesDir, cachePath):
+    faceRecognition = FaceRecognition()
+    start = time.perf_counter()
+    faceRecognition.add_known_face(trustedFacesDir, cachePath=cachePath)
+    return time.perf_counter() - start, len(faceRecognition.known_faces)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare cold and warm trusted-face gallery loading.")
+    parser.add_argument("--config", default="config.yaml")
+    parser.add_argument("--faces", help="Trusted faces directory (defaults to paths.trustedFaces)")
+    parser.add_argument("--repeats", type=int, default=3, help="Number of warm loads to time")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    setup_logging(log_dir=config.get("paths", {}).get("logDir", "logs"), logLevel=logging.WARNING)
+    trustedFacesDir = args.faces or config.get("paths", {}).get("trustedFaces", "data/trustedFaces")
+
+    with tempfile.TemporaryDirectory() as tmpDir:
+        cachePath = str(Path(tmpDir) / "encodings.npz")
+
+        uncached, count = timeLoad(trustedFacesDir, None)
+        print(f"uncached: {uncached:.3f}s ({count} faces)")
+
+        cold, count = timeLoad(trustedFacesDir, cachePath)
+        print(f"cold:     {cold:.3f}s ({count} faces)")
+
+        warm = [timeLoad(trustedFacesDir, cachePath)[0] for _ in range(args.repeats)]
+        best = min(warm)
+        print(f"warm:     {best:.3f}s best of {args.repeats} ({uncached / max(best, 1e-9):.0f}x faster than uncached)")
+
+
+if __name__ == "__main__":
+    main()
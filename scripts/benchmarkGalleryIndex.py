@@ -0,0 +1,73 @@
+import argparse
+import time
+
+import numpy as np
+
+from src.agents.enrollment import load_gallery
+from src.agents.galleryIndex import Gallery, IvfGallery
+
+
+def synthetic_gallery(rng, identities, perIdentity):
+    """Encodings shaped like dlib's: people about 1.2 apart, photos of one person about 0.3 apart."""
+    centers = rng.normal(0, 0.075, size=(identities, 128))
+    encodings = np.repeat(centers, perIdentity, axis=0) + rng.normal(0, 0.02, size=(identities * perIdentity, 128))
+    labels = [f"person{i}" for i in range(identities) for _ in range(perIdentity)]
+    return encodings.astype(np.float32), labels
+
+
+def timePerQuery(search, queries, faces):
+    start = time.perf_counter()
+    for i in range(0, len(queries), faces):
+        search(queries[i:i + faces])
+    return (time.perf_counter() - start) / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report recall and latency of the approximate gallery index against exact search.")
+    parser.add_argument("--gallery", help="Gallery file from scripts/enrollFaces.py; a synthetic gallery is used by default")
+    parser.add_argument("--identities", type=int, default=20000)
+    parser.add_argument("--per-identity", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=600, help="Half of them are enrolled people, half strangers")
+    parser.add_argument("--faces", type=int, default=3, help="Faces searched per call, as in one frame")
+    parser.add_argument("--tolerance", type=float, default=0.6)
+    parser.add_argument("--nlist", type=int, default=0, help="k-means lists (0: about sqrt(gallery size))")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--storage", nargs="+", default=["float16", "int8"])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.gallery:
+        encodings, labels, _ = load_gallery(args.gallery)
+    else:
+        encodings, labels = synthetic_gallery(rng, args.identities, args.per_identity)
+    half = args.queries // 2
+    enrolled = encodings[rng.choice(len(encodings), half)] + rng.normal(0, 0.02, size=(half, 128))
+    strangers = rng.normal(0, 0.075, size=(args.queries - half, 128))
+    queries = np.vstack([enrolled, strangers]).astype(np.float32)
+
+    exact = Gallery(encodings, labels)
+    exactBest, exactDistances = exact.nearest(queries)
+    exactLabels = np.array([labels[i] for i in exactBest])
+    exactKnown = exactDistances <= args.tolerance
+    exactTime = timePerQuery(exact.nearest, queries, args.faces)
+    print(f"{len(encodings)} gallery encodings, {args.queries} queries; exact search "
+          f"{exactTime * 1e3:.3f} ms per face, {exact.nbytes / 1e6:.1f} MB")
+    print(f"{'storage':>8} {'nlist':>6} {'nprobe':>6} {'build s':>8} {'MB':>7} {'ms/face':>8} {'speedup':>8} "
+          f"{'recall@1':>9} {'same verdict':>13}")
+    for storage in args.storage:
+        start = time.perf_counter()
+        index = IvfGallery.build(encodings, labels, nlist=args.nlist, storage=storage)
+        buildTime = time.perf_counter() - start
+        for nprobe in args.nprobe:
+            best, distances = index.nearest(queries, nprobe=nprobe)
+            found = np.array([labels[i] if i >= 0 else None for i in best])
+            # Recall counts matches to the same person as the exact nearest entry
+            recall = float(np.mean(found[:half] == exactLabels[:half]))
+            agreement = float(np.mean((distances <= args.tolerance) == exactKnown))
+            queryTime = timePerQuery(lambda q: index.nearest(q, nprobe=nprobe), queries, args.faces)
+            print(f"{storage:>8} {len(index.centroids):>6} {nprobe:>6} {buildTime:>8.2f} {index.nbytes / 1e6:>7.1f} "
+                  f"{queryTime * 1e3:>8.3f} {exactTime / queryTime:>7.1f}x {recall:>9.3f} {agreement:>13.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import argparse
+import time
+
+import numpy as np
+from face_recognition import compare_faces
+from src.agents.faceRecognition import FaceRecognition
+
+
+def timeCall(fn, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-face compare_faces matching with batched gallery matching.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000, 50000])
+    parser.add_argument("--faces", type=int, default=3, help="Faces per frame")
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    unknown = list(rng.normal(0, 0.09, size=(args.faces, 128)))
+    print(f"{'gallery':>8} {'loop (ms)':>10} {'batched (ms)':>13} {'speedup':>8}")
+    for size in args.sizes:
+        knownList = list(rng.normal(0, 0.09, size=(size, 128)))
+        labels = [f"person{i}" for i in range(size)]
+        faceRecognition = FaceRecognition(known_faces=knownList, known_labels=labels)
+
+        def currentPath():
+            return [any(compare_faces(knownList, encoding, tolerance=0.6)) for encoding in unknown]
+
+        loop = timeCall(currentPath, args.repeats)
+        batched = timeCall(lambda: faceRecognition.match_encodings(unknown), args.repeats)
+        print(f"{size:>8} {loop * 1e3:>10.3f} {batched * 1e3:>13.3f} {loop / batched:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+"""
+Replay recorded fixtures through GuardAgent and measure the whole guard pipeline offline.
+
+Speech synthesis, speech recognition and the LLM are replaced by stand-ins with configurable
+latencies (the null speech backend, the transcript recognizer and the fake conversation model),
+so no webcam, microphone or API key is needed. Each scenario runs in a fresh process so that
+its peak memory is measured on its own.
+
+The manifest is a YAML file:
+
+    standIns:
+      ttsSecondsPerChar: 0.04      # speaking time per character
+      asrSeconds: 0.4              # recognition time per utterance
+      llmFirstChunkSeconds: 0.8    # time to the first generated chunk
+      llmChunkSeconds: 0.05        # time between later chunks
+      responseTimeoutSeconds: 3.0  # how long the agent waits for an answer
+    scenarios:
+      - name: intruder-hallway
+        camera: {source: video, path: fixtures/intruder.mp4}
+        audio: fixtures/intruder    # WAV files with x.txt transcripts; omit for silence
+        trustedFaces: data/trustedFaces
+        expect: alert               # alert | trusted | escalated | none
+        config: {tracking: {verdictTimeout: 2.0}}   # optional overrides of config.yaml
+
+Without a manifest a single synthetic scenario is run. Results are written as JSON with
+--output; --compare prints the change against a previous results file.
+"""
+import argparse
+import copy
+import json
+import logging
+import multiprocessing
+import platform
+import resource
+import subprocess
+import tempfile
+import time
+import wave
+from pathlib import Path
+
+import numpy as np
+
+from src.utils import load_config, setup_logging
+
+STAND_INS = {
+    "ttsSecondsPerChar": 0.04,
+    "asrSeconds": 0.4,
+    "llmFirstChunkSeconds": 0.8,
+    "llmChunkSeconds": 0.05,
+    "responseTimeoutSeconds": 3.0,
+}
+
+SYNTHETIC_SCENARIO = {
+    "name": "synthetic",
+    "camera": {"source": "synthetic", "fps": 15.0, "frames": 150},
+    "expect": "none",
+}
+
+
+def merge(base, overrides):
+    """Recursively merge overrides into a copy of base."""
+    merged = copy.deepcopy(base)
+    for key, value in (overrides or {}).items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge(merged[key], value)
+        else:
+            merged[key] = copy.deepcopy(value)
+    return merged
+
+
+def write_silence(path, seconds=1.0, sampleRate=16000):
+    with wave.open(str(path), "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sampleRate)
+        wav.writeframes(b"\0\0" * int(seconds * sampleRate))
+    return path
+
+
+def scenario_config(config, scenario, standIns, workDir):
+    """Configuration for one scenario: its camera, audio and trusted faces, with stand-ins for speech and the LLM."""
+    config = copy.deepcopy(config)
+    config.pop("cameras", None)
+    config["camera"] = dict(scenario["camera"], readTimeout=config.get("camera", {}).get("readTimeout", 2.0))
+    if scenario.get("trustedFaces"):
+        config.setdefault("paths", {})["trustedFaces"] = scenario["trustedFaces"]
+        config["paths"].pop("encodingCache", None)
+    config["speech"] = {"backend": "null", "secondsPerChar": standIns["ttsSecondsPerChar"]}
+    config["audio"] = dict(
+        config.get("audio", {}),
+        source="wav",
+        path=scenario.get("audio") or str(write_silence(Path(workDir) / "silence.wav")),
+        realtime=True,
+        loop=False,
+        recognizer="transcript",
+        transcriptDelaySeconds=standIns["asrSeconds"],
+        responseTimeout=standIns["responseTimeoutSeconds"],
+    )
+    conversationConfig = config.setdefault("conversation", {})
+    conversationConfig["backend"] = "fake"
+    conversationConfig["fake"] = dict(
+        conversationConfig.get("fake", {}),
+        firstChunkSeconds=standIns["llmFirstChunkSeconds"],
+        chunkSeconds=standIns["llmChunkSeconds"],
+    )
+    return merge(config, scenario.get("config"))
+
+
+def timed(function, samples):
+    """Wrap a function so that each call's duration is appended to samples."""
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            samples.append(time.perf_counter() - start)
+    return wrapper
+
+
+def timed_stream(stream, firstChunk, total):
+    """Wrap a model's stream() to record the time to its first chunk and to its end."""
+    def wrapper(prompt):
+        start = time.perf_counter()
+        first = True
+        for chunk in stream(prompt):
+            if first:
+                firstChunk.append(time.perf_counter() - start)
+                first = False
+            yield chunk
+        total.append(time.perf_counter() - start)
+    return wrapper
+
+
+def percentiles(samples):
+    if not samples:
+        return {"count": 0}
+    values = np.asarray(samples, dtype=np.float64) * 1e3
+    return {
+        "count": len(values),
+        "p50Ms": float(np.percentile(values, 50)),
+        "p95Ms": float(np.percentile(values, 95)),
+        "p99Ms": float(np.percentile(values, 99)),
+        "maxMs": float(values.max()),
+    }
+
+
+def outcome(transitions, granted):
+    targets = {transition.target.name for transition in transitions}
+    if "ALERTED" in targets:
+        return "alert"
+    if granted:
+        return "trusted"
+    if "LEVEL1" in targets:
+        return "escalated"
+    return "none"
+
+
+def run_scenario(config, scenario, standIns):
+    """Run one scenario in this process and return its measurements."""
+    from src.agents.guardAgent import GuardAgent
+    from src.agents.speechRecognition import get_recognizer, get_speech_worker
+
+    with tempfile.TemporaryDirectory() as workDir:
+        config = scenario_config(config, scenario, standIns, workDir)
+        stages = {name: [] for name in ("asr", "tts", "llmFirstChunk", "llm", "grantAccess",
+                                        "level1Response", "level2Response")}
+        granted = []
+        startup = time.perf_counter()
+        agent = GuardAgent(config)
+        agent.waitUntilReady()
+        startupSeconds = time.perf_counter() - startup
+
+        backend = get_speech_worker().backend
+        backend.say = timed(backend.say, stages["tts"])
+        recognizer = get_recognizer()
+        recognizer.recognize = timed(recognizer.recognize, stages["asr"])
+        model = agent.conversationAgent.model
+        model.stream = timed_stream(model.stream, stages["llmFirstChunk"], stages["llm"])
+        grantAccess = timed(agent.grantAccess, stages["grantAccess"])
+
+        def grantAccessRecorded(message):
+            granted.append(message)
+            return grantAccess(message)
+
+        agent.grantAccess = grantAccessRecorded
+        agent.level1Response = timed(agent.level1Response, stages["level1Response"])
+        agent.level2Response = timed(agent.level2Response, stages["level2Response"])
+
+        usageBefore = resource.getrusage(resource.RUSAGE_SELF)
+        childrenBefore = resource.getrusage(resource.RUSAGE_CHILDREN)
+        start = time.perf_counter()
+        agent.activate_guard()
+        if agent.guardMode:
+            agent.deactivate_guard()
+        get_speech_worker().wait_idle(timeout=30.0)
+        wallSeconds = time.perf_counter() - start
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    cpuSeconds = (usage.ru_utime + usage.ru_stime - usageBefore.ru_utime - usageBefore.ru_stime
+                  + children.ru_utime + children.ru_stime - childrenBefore.ru_utime - childrenBefore.ru_stime)
+    for faceRecognition in agent.galleries.values():
+        for stage in faceRecognition.STAGES:
+            stages.setdefault(stage, []).extend(faceRecognition.timingSamples[stage])
+    streams = agent.scheduler.stats()
+    framesRead = sum(stream.feed.stats().get("framesRead", 0) for stream in agent.streams)
+    recognitions = sum(stats["recognitions"] for stats in streams)
+    captureLatencies = [latency for stream in agent.streams for latency in stream.latencies]
+
+    transitions = agent.transitions.recent(len(agent.transitions.transitions))
+    detected = next((t for t in transitions if t.target.name == "LEVEL1"), None)
+    alerted = next((t for t in transitions if t.target.name == "ALERTED"), None)
+    result = outcome(transitions, granted)
+    expected = scenario.get("expect")
+    return {
+        "name": scenario["name"],
+        "expected": expected,
+        "outcome": result,
+        "passed": expected is None or expected == result,
+        "startupSeconds": startupSeconds,
+        "wallSeconds": wallSeconds,
+        "framesRead": framesRead,
+        "recognitions": recognitions,
+        "framesPerSecond": framesRead / wallSeconds if wallSeconds else 0.0,
+        "recognitionsPerSecond": recognitions / wallSeconds if wallSeconds else 0.0,
+        "framesDropped": sum(stats["framesDropped"] for stats in streams),
+        "captureToResult": percentiles(captureLatencies),
+        "stages": {name: percentiles(samples) for name, samples in stages.items()},
+        "transitions": agent.transitions.stats(),
+        "detectionToAlertSeconds": alerted.at - detected.evidenceAt if detected and alerted else None,
+        "cpuSeconds": cpuSeconds,
+        "cpuUtilization": cpuSeconds / wallSeconds if wallSeconds else 0.0,
+        # ru_maxrss is in kilobytes on Linux
+        "peakRssMegabytes": max(usage.ru_maxrss, children.ru_maxrss) / 1024,
+    }
+
+
+def run_isolated(config, scenario, standIns):
+    """Run a scenario in a fresh process, so module state and peak memory do not carry over."""
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1, initializer=setup_logging, initargs=(config.get("paths", {}).get("logDir", "logs"),
+                                                              logging.WARNING)) as pool:
+        return pool.apply(run_scenario, (config, scenario, standIns))
+
+
+def git_commit():
+    """Commit the code under test was checked out at, marked -dirty when it has local changes."""
+    repo = Path(__file__).resolve().parent.parent
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=repo, capture_output=True, text=True, check=True)
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=repo,
+                               capture_output=True, text=True)
+        return commit.stdout.strip() + ("-dirty" if dirty.stdout.strip() else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+COLUMNS = (
+    ("frames/s", "{:.1f}", lambda scenario: scenario["framesPerSecond"]),
+    ("p95 capture ms", "{:.1f}", lambda scenario: scenario["captureToResult"].get("p95Ms")),
+    ("detect to alert s", "{:.2f}", lambda scenario: scenario["detectionToAlertSeconds"]),
+    ("CPU %", "{:.0f}", lambda scenario: scenario["cpuUtilization"] * 100),
+    ("peak RSS MB", "{:.0f}", lambda scenario: scenario["peakRssMegabytes"]),
+)
+
+
+def print_results(results, baseline=None):
+    """Print a summary per scenario, with the change from the baseline run in brackets, then per-stage latencies."""
+    previous = {scenario["name"]: scenario for scenario in (baseline or {}).get("scenarios", [])}
+    print(f"{'scenario':<24} {'outcome':>10} " + " ".join(f"{title:>24}" for title, _, _ in COLUMNS))
+    for scenario in results["scenarios"]:
+        cells = []
+        for _, form, value in COLUMNS:
+            current = value(scenario)
+            cell = form.format(current) if current is not None else "-"
+            old = value(previous[scenario["name"]]) if scenario["name"] in previous else None
+            if current is not None and old:
+                cell += f" ({(current - old) / old * 100:+.0f}%)"
+            cells.append(f"{cell:>24}")
+        outcome = scenario["outcome"] + ("" if scenario["passed"] else " (!)")
+        print(f"{scenario['name']:<24} {outcome:>10} " + " ".join(cells))
+    print()
+    print(f"{'scenario':<24} {'stage':<16} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for scenario in results["scenarios"]:
+        for stage, stats in scenario["stages"].items():
+            if stats["count"]:
+                print(f"{scenario['name']:<24} {stage:<16} {stats['count']:>6} {stats['p50Ms']:>9.1f} "
+                      f"{stats['p95Ms']:>9.1f} {stats['p99Ms']:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay fixtures through the guard pipeline and report its performance.")
+    parser.add_argument("--config", default="config.yaml")
+    parser.add_argument("--manifest", help="YAML file listing the scenarios and stand-in latencies")
+    parser.add_argument("--scenarios", nargs="+", help="Run only these scenarios")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Results JSON of an earlier run to compare against")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    setup_logging(log_dir=config.get("paths", {}).get("logDir", "logs"), logLevel=logging.WARNING)
+    manifest = load_config(args.manifest) if args.manifest else {"scenarios": [SYNTHETIC_SCENARIO]}
+    standIns = dict(STAND_INS, **(manifest.get("standIns") or {}))
+    scenarios = [s for s in manifest.get("scenarios", []) if not args.scenarios or s["name"] in args.scenarios]
+    if not scenarios:
+        raise SystemExit("No scenarios to run.")
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "host": platform.node(),
+        "python": platform.python_version(),
+        "cpuCount": multiprocessing.cpu_count(),
+        "standIns": standIns,
+        "scenarios": [],
+    }
+    for scenario in scenarios:
+        print(f"Running {scenario['name']}...")
+        results["scenarios"].append(run_isolated(config, scenario, standIns))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        print(f"Compared with {baseline.get('commit')} ({baseline.get('timestamp')})")
+    print_results(results, baseline)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+        print(f"Results written to {args.output}")
+    if not all(scenario["passed"] for scenario in results["scenarios"]):
+        raise SystemExit("Some scenarios did not reach their expected outcome.")
+
+
+if __name__ == "__main__":
+    main()
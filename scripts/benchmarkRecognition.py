@@ -0,0 +1,52 @@
+import argparse
+import itertools
+import logging
+
+from src.utils import load_config, setup_logging
+from src.agents.faceRecognition import FaceRecognition
+from src.agents.frameSource import create_frame_source
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report per-stage recognition timings for detector settings.")
+    parser.add_argument("--config", default="config.yaml")
+    parser.add_argument("--source", default="images", choices=["camera", "video", "images", "synthetic"])
+    parser.add_argument("--path", help="Video file, image directory or still image to read frames from")
+    parser.add_argument("--frames", type=int, default=30, help="Frames to process per setting")
+    parser.add_argument("--scales", type=float, nargs="+", default=[1.0, 0.5, 0.25])
+    parser.add_argument("--models", nargs="+", default=["hog"], help="Detector models to try (hog, cnn)")
+    parser.add_argument("--landmarks", nargs="+", default=["small"], help="Landmark models to try (small, large)")
+    parser.add_argument("--jitters", type=int, nargs="+", default=[1])
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    setup_logging(log_dir=config.get("paths", {}).get("logDir", "logs"), logLevel=logging.WARNING)
+    trustedFacesDir = config.get("paths", {}).get("trustedFaces", "data/trustedFaces")
+
+    source = create_frame_source({"source": args.source, "path": args.path, "fps": None, "loop": True, "realtime": False})
+    frames = []
+    with source:
+        while len(frames) < args.frames:
+            frame = source.read(timeout=5.0)
+            if frame is None:
+                break
+            frames.append(frame.image)
+    if not frames:
+        raise SystemExit("No frames could be read from the source.")
+
+    print(f"{'scale':>5} {'model':>5} {'landmarks':>9} {'jitters':>7} {'faces':>6} "
+          + " ".join(f"{stage + ' ms':>10}" for stage in FaceRecognition.STAGES) + f" {'total ms':>9}")
+    for scale, model, landmarks, jitters in itertools.product(args.scales, args.models, args.landmarks, args.jitters):
+        recognitionConfig = dict(config.get("recognition", {}), detectionScale=scale, detectionModel=model,
+                                 landmarkModel=landmarks, numJitters=jitters)
+        faceRecognition = FaceRecognition.from_config(recognitionConfig)
+        faceRecognition.add_known_face(trustedFacesDir)
+        faces = sum(len(faceRecognition.identify_faces(image)) for image in frames)
+        means = faceRecognition.mean_timings()
+        print(f"{scale:>5} {model:>5} {landmarks:>9} {jitters:>7} {faces / len(frames):>6.2f} "
+              + " ".join(f"{means[stage] * 1e3:>10.2f}" for stage in FaceRecognition.STAGES)
+              + f" {sum(means.values()) * 1e3:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import argparse
+import logging
+import time
+
+from src.utils import load_config, setup_logging
+from src.agents.frameBus import RecognitionPool
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure recognition throughput for different worker counts.")
+    parser.add_argument("--config", default="config.yaml")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--seconds", type=float, default=10.0, help="Measurement time per worker count")
+    parser.add_argument("--image", help="Still image (e.g. a face photo) repeated as every frame")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    setup_logging(log_dir=config.get("paths", {}).get("logDir", "logs"), logLevel=logging.WARNING)
+    cameraConfig = {"source": "synthetic", "fps": None, "path": args.image}
+    motionConfig = dict(config.get("motion", {}), enabled=False)
+
+    baseline = None
+    print(f"{'workers':>7} {'frames/s':>9} {'scaling':>8} {'p50 latency ms':>15}")
+    for workers in args.workers:
+        benchConfig = dict(config, motion=motionConfig,
+                           frameBus=dict(config.get("frameBus", {}), workers=workers, slots=workers * 2))
+        pool = RecognitionPool(benchConfig, cameraConfig=cameraConfig).start()
+        try:
+            # Let the workers settle before measuring
+            time.sleep(1.0)
+            while pool.get_result(timeout=0) is not None:
+                pass
+            latencies = []
+            deadline = time.monotonic() + args.seconds
+            while time.monotonic() < deadline:
+                result = pool.get_result(timeout=1.0)
+                if result is not None:
+                    latencies.append(result.latency)
+        finally:
+            pool.stop()
+        rate = len(latencies) / args.seconds
+        baseline = baseline or rate / workers
+        latencies.sort()
+        p50 = latencies[len(latencies) // 2] * 1e3 if latencies else float("nan")
+        print(f"{workers:>7} {rate:>9.1f} {rate / baseline:>7.2f}x {p50:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
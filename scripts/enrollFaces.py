@@ -0,0 +1,54 @@
+import argparse
+import logging
+import sys
+import time
+
+from src.utils import load_config, setup_logging
+from src.agents.enrollment import enroll
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Encode a directory tree with one subfolder per person into a gallery file.")
+    parser.add_argument("root", help="Directory with one subfolder of photos per person")
+    parser.add_argument("--output", required=True, help="Gallery file to write (.npz); use it as paths.trustedFaces")
+    parser.add_argument("--config", default="config.yaml")
+    parser.add_argument("--workers", type=int, help="Encoding processes (default: one per core)")
+    parser.add_argument("--dedupe-distance", type=float, default=0.1,
+                        help="Encodings of one person closer than this are kept once")
+    parser.add_argument("--max-per-person", type=int, default=0,
+                        help="Keep at most this many of the most diverse encodings per person (0: all)")
+    parser.add_argument("--max-image-side", type=int, default=1024,
+                        help="Downscale photos so that their longer side is at most this many pixels (0: never)")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    setup_logging(log_dir=config.get("paths", {}).get("logDir", "logs"), logLevel=logging.WARNING)
+    start = time.perf_counter()
+
+    def progress(done, total):
+        if done == total or done % 10 == 0:
+            rate = done / max(time.perf_counter() - start, 1e-9)
+            eta = (total - done) / rate if rate else 0.0
+            sys.stderr.write(f"\r{done}/{total} images, {rate:.1f} images/s, {eta:.0f} s left ")
+            sys.stderr.flush()
+
+    stats = enroll(
+        args.root,
+        args.output,
+        recognitionConfig=config.get("recognition", {}),
+        workers=args.workers,
+        dedupeDistance=args.dedupe_distance,
+        maxPerPerson=args.max_per_person,
+        maxImageSide=args.max_image_side,
+        progress=progress,
+    )
+    sys.stderr.write("\n")
+    print(f"{stats['people']} people from {stats['images']} images in {stats['seconds']:.1f} s "
+          f"({stats['images'] / max(stats['seconds'], 1e-9):.1f} images/s)")
+    print(f"{stats['encoded']} faces encoded, {stats['kept']} encodings kept after deduplication; "
+          f"{stats['noFace']} without a face, {stats['multipleFaces']} with several faces, {stats['failed']} failed")
+    print(f"Gallery written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from urllib.parse import urlencode
+
+from src.guardDaemon import ControlClient
+from src.utils import load_config
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Control a running guard daemon (scripts/guardDaemon.py).")
+    parser.add_argument("--config", default="config.yaml")
+    parser.add_argument("--socket", help="Unix socket of the daemon (default: control.socketPath)")
+    parser.add_argument("--port", type=int, help="Use the TCP endpoint on this port instead of the socket")
+    commands = parser.add_subparsers(dest="action", required=True)
+    commands.add_parser("state", help="Print guard mode, warm-up progress, camera and gallery state")
+    commands.add_parser("activate", help="Start guarding")
+    commands.add_parser("deactivate", help="Stop guarding")
+    commands.add_parser("metrics", help="Print the metrics in Prometheus text format")
+    commands.add_parser("shutdown", help="Stop the daemon")
+    say = commands.add_parser("say", help="Carry out a command phrase, as if it had been spoken")
+    say.add_argument("text", nargs="+")
+    enroll = commands.add_parser("enroll", help="Add a trusted face from a photo")
+    enroll.add_argument("name")
+    enroll.add_argument("image", help="Photo showing the person's face")
+    enroll.add_argument("--camera", help="Camera whose gallery receives the face (default: paths.trustedFaces)")
+    args = parser.parse_args()
+
+    controlConfig = dict(load_config(args.config).get("control", {}))
+    if args.socket:
+        controlConfig["socketPath"] = args.socket
+    if args.port:
+        controlConfig.update(port=args.port, socketPath=None)
+    client = ControlClient.from_config(controlConfig)
+
+    if args.action == "state":
+        request = ("GET", "/state", b"")
+    elif args.action == "metrics":
+        request = ("GET", "/metrics", b"")
+    elif args.action == "say":
+        request = ("POST", "/command", " ".join(args.text).encode())
+    elif args.action == "enroll":
+        query = urlencode({"name": args.name, **({"camera": args.camera} if args.camera else {})})
+        request = ("POST", f"/enroll?{query}", Path(args.image).read_bytes())
+    else:
+        request = ("POST", f"/{args.action}", b"")
+    start = time.perf_counter()
+    status, reply = client.request(*request)
+    elapsed = time.perf_counter() - start
+    client.close()
+    print(reply if isinstance(reply, str) else json.dumps(reply, indent=2))
+    print(f"{status} in {elapsed * 1e3:.2f} ms", file=sys.stderr)
+    sys.exit(0 if status == 200 else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+import argparse
+import logging
+from pathlib import Path
+
+from src.startup import StartupProfiler
+from src.utils import load_config, setup_logging
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the room guard as a long-lived daemon controlled through a local API and by voice.")
+    parser.add_argument("--config", default="config.yaml")
+    parser.add_argument("--activate", action="store_true", help="Start guarding right away")
+    parser.add_argument("--no-voice", action="store_true", help="Do not listen for voice commands")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    setup_logging(log_dir=config.get("paths", {}).get("logDir", "logs"), logLevel=logging.INFO)
+    logger = logging.getLogger(__name__)
+
+    trustedFacesDir = config.get("paths", {}).get("trustedFaces", "data/trustedFaces")
+    if not trustedFacesDir.endswith(".npz"):
+        Path(trustedFacesDir).mkdir(parents=True, exist_ok=True)
+    logger.info(f"Trusted faces: {trustedFacesDir}")
+
+    from src.agents.guardAgent import GuardAgent
+    from src.agents.speechRecognition import speak
+    from src.guardDaemon import GuardDaemon
+
+    controlConfig = config.get("control", {})
+    agent = GuardAgent(config, profiler=StartupProfiler())
+    daemon = GuardDaemon(agent, voice=controlConfig.get("voice", True) and not args.no_voice,
+                         shutdownMinScore=controlConfig.get("shutdownMinScore", 95.0))
+    speak("Guard agent initialized.")
+    daemon.run(controlConfig, activate=args.activate)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,27 @@
+import argparse
 import logging
 import os
 
 from pathlib import Path
+from src.startup import StartupProfiler
 from src.utils import load_config, setup_logging
-from src.agents.speechRecognition import listenAudio, speak
-from src.agents.conversationAgent import ConversationAgent
-from src.agents.guardAgent import GuardAgent
 
 def main():
+    parser = argparse.ArgumentParser(description="Voice-controlled room guard.")
+    parser.add_argument("--config", default="config.yaml")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="Report import and initialization time per component, then exit")
+    args = parser.parse_args()
+
+    # Imported here so that --profile-startup can time them
+    profiler = StartupProfiler()
+    with profiler.step("import src.agents.speechRecognition"):
+        from src.agents.speechRecognition import listenAudio, speak
+    with profiler.step("import src.agents.guardAgent"):
+        from src.agents.guardAgent import GuardAgent
+
     # Load configuration
-    config = load_config("config.yaml")
+    config = load_config(args.config)
 
     # Setup logging
     logDir = config.get("paths", {}).get("logDir", "logs")
@@ -23,24 +35,30 @@ def main():
 
     # # Initialize and run the guard agent
     # from guardAgent import GuardAgent  # Import here to avoid circular imports
-    agent = GuardAgent(config)
+    with profiler.step("GuardAgent()"):
+        agent = GuardAgent(config, profiler=profiler)
     # agent.run()
     speak("Guard agent initialized.")
+    if args.profile_startup:
+        agent.waitUntilReady()
+        print(profiler.report())
+        return
     while True:
         text = listenAudio()
         if text:
             logger.info(f"Recognized speech: {text}")
-            if text in config.get("commands", {}).get("activationCommand", []):
+            command = agent.commandMatcher.match(text)
+            if command.intent == "activationCommand":
                 logger.info("Activating guard mode.")
                 speak("Activating guard mode.")
                 agent.activate_guard()
-            elif text in config.get("commands", {}).get("deactivationCommand", []):
+            elif command.intent == "deactivationCommand":
                 logger.info("Deactivating guard mode.")
                 speak("Deactivating guard mode.")
                 agent.deactivate_guard()
-            elif text in config.get("commands", {}).get("shutdownCommand", []):
+            elif command.intent == "shutdownCommand":
                 logger.info("Shutting down the system.")
-                speak("Shutting down. Goodbye!")
+                speak("Shutting down. Goodbye!", wait=True)
                 break
             else:
                 speak("Command not recognized. Please try again.")
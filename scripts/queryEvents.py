@@ -0,0 +1,113 @@
+import argparse
+import json
+import os
+import re
+import time
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+
+from src.eventJournal import read_events
+from src.utils import load_config
+
+DURATION = re.compile(r"^(\d+(?:\.\d+)?)([smhd])$")
+UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_since(text):
+    """Seconds since the epoch for "30m"-style durations before now or ISO timestamps."""
+    match = DURATION.match(text)
+    if match:
+        return time.time() - float(match.group(1)) * UNITS[match.group(2)]
+    return datetime.fromisoformat(text).timestamp()
+
+
+def matches(event, args, since):
+    if since is not None and event.get("time", 0) < since:
+        return False
+    if args.event and event.get("event") not in args.event:
+        return False
+    if args.camera and event.get("camera") != args.camera:
+        return False
+    return True
+
+
+def format_event(event, raw):
+    if raw:
+        return json.dumps(event)
+    fields = " ".join(f"{key}={json.dumps(value)}" for key, value in event.items() if key not in ("time", "event", "camera"))
+    stamp = datetime.fromtimestamp(event.get("time", 0)).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+    camera = f" [{event['camera']}]" if "camera" in event else ""
+    return f"{stamp} {event.get('event', '?')}{camera} {fields}"
+
+
+def follow(path, args, since):
+    """Print events appended to the journal from now on until interrupted, reopening it after rotation."""
+    file = open(path, "rb") if path.exists() else None
+    if file is not None:
+        file.seek(0, 2)
+    inode = os.fstat(file.fileno()).st_ino if file is not None else None
+    try:
+        while True:
+            line = file.readline() if file is not None else b""
+            if line.endswith(b"\n"):
+                print_line(line, args, since)
+                continue
+            if line:
+                # Partial line: read it again once it is complete
+                file.seek(-len(line), 1)
+            try:
+                current = path.stat().st_ino
+            except FileNotFoundError:
+                current = None
+            if current is not None and current != inode:
+                # Rotated: the rest of the old file was read above, continue with the new one
+                if file is not None:
+                    file.close()
+                file, inode = open(path, "rb"), current
+                continue
+            time.sleep(0.2)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if file is not None:
+            file.close()
+
+
+def print_line(line, args, since):
+    try:
+        event = json.loads(line)
+    except json.JSONDecodeError:
+        return
+    if matches(event, args, since):
+        print(format_event(event, args.json), flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query or follow the guard event journal.")
+    parser.add_argument("--config", default="config.yaml")
+    parser.add_argument("--journal", help="Journal file (default: journal.path from the config)")
+    parser.add_argument("--event", nargs="+", help="Only these event types, e.g. transition faceVerdict llmReply")
+    parser.add_argument("--camera", help="Only events of this camera")
+    parser.add_argument("--since", help="Only events after this: a duration like 30m, 2h, 1d, or an ISO timestamp")
+    parser.add_argument("--last", type=int, help="Only the last N matching events")
+    parser.add_argument("--follow", "-f", action="store_true", help="Keep printing new events as they are written")
+    parser.add_argument("--json", action="store_true", help="Print events as JSON lines")
+    args = parser.parse_args()
+
+    journalPath = args.journal
+    if journalPath is None:
+        journalPath = load_config(args.config).get("journal", {}).get("path", "logs/events.jsonl")
+    since = parse_since(args.since) if args.since else None
+
+    events = (event for event in read_events(journalPath) if matches(event, args, since))
+    if args.last is not None:
+        events = deque(events, maxlen=args.last)
+    for event in events:
+        print(format_event(event, args.json))
+    if args.follow:
+        follow(Path(journalPath), args, since)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,585 @@
+import json
+import logging
+import queue
+import threading
+import time
+import wave
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_WIDTH = 2  # 16-bit PCM
+
+
+@dataclass
+class AudioChunk:
+    """Mono 16-bit samples with the capture time (time.monotonic) of their last sample."""
+    samples: np.ndarray
+    timestamp: float
+    origin: Optional[str] = None
+
+
+@dataclass
+class AudioSegment:
+    """One utterance cut out of the audio stream by voice-activity detection."""
+    pcm: bytes
+    sampleRate: int
+    startedAt: float
+    endedAt: float
+    origins: Tuple[str, ...] = field(default_factory=tuple)
+
+    @property
+    def duration(self) -> float:
+        return len(self.pcm) / (SAMPLE_WIDTH * self.sampleRate)
+
+    def to_audio_data(self):
+        """The segment as a speech_recognition AudioData."""
+        import speech_recognition as sr
+        return sr.AudioData(self.pcm, self.sampleRate, SAMPLE_WIDTH)
+
+
+class AudioSource:
+    def __init__(self, sampleRate: int = 16000, frameMs: int = 30, bufferSeconds: float = 10.0, live: bool = True):
+        """
+        Base class for audio sources read on a background thread into a ring buffer of frames.
+
+        Subclasses implement _open, _read and _close. When the consumer falls behind, the
+        oldest frames are overwritten and counted as overruns.
+
+        :param sampleRate: Sample rate in Hz.
+        :param frameMs: Length of each frame in milliseconds.
+        :param bufferSeconds: Amount of audio kept in the ring buffer.
+        :param live: Live sources retry on read failures; others end when _read returns None.
+        """
+        self.sampleRate = sampleRate
+        self.frameMs = frameMs
+        self.live = live
+        self._buffer = deque(maxlen=max(1, int(bufferSeconds * 1000 / frameMs)))
+        self._condition = threading.Condition()
+        self._thread = None
+        self._running = threading.Event()
+        self.exhausted = False
+        self.framesRead = 0
+        self.overruns = 0
+
+    @property
+    def frameSamples(self) -> int:
+        return self.sampleRate * self.frameMs // 1000
+
+    def _open(self) -> None:
+        pass
+
+    def _read(self) -> Optional[AudioChunk]:
+        raise NotImplementedError
+
+    def _close(self) -> None:
+        pass
+
+    def start(self) -> "AudioSource":
+        """Open the source and start the background reader. Calling it again is a no-op."""
+        if self._running.is_set():
+            return self
+        self._open()
+        self.exhausted = False
+        self._running.set()
+        self._thread = threading.Thread(target=self._run, name=type(self).__name__, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._running.clear()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2.0)
+        self._thread = None
+        with self._condition:
+            self._condition.notify_all()
+
+    def _run(self) -> None:
+        failures = 0
+        try:
+            while self._running.is_set():
+                chunk = self._read()
+                if chunk is None:
+                    if not self.live:
+                        break
+                    failures += 1
+                    if failures >= 30:
+                        logger.warning(f"{type(self).__name__}: {failures} consecutive read failures, reopening")
+                        self._close()
+                        self._open()
+                        failures = 0
+                    time.sleep(0.01)
+                    continue
+                failures = 0
+                with self._condition:
+                    if len(self._buffer) == self._buffer.maxlen:
+                        self.overruns += 1
+                    self._buffer.append(chunk)
+                    self.framesRead += 1
+                    self._condition.notify_all()
+        except Exception as e:
+            logger.error(f"{type(self).__name__} reader failed: {e}")
+        finally:
+            self._close()
+            with self._condition:
+                self.exhausted = True
+                self._running.clear()
+                self._condition.notify_all()
+
+    def read(self, timeout: Optional[float] = 1.0) -> Optional[AudioChunk]:
+        """
+        Return the oldest buffered frame.
+
+        :param timeout: Seconds to wait for a frame; None waits indefinitely.
+        :return: The frame, or None on timeout or when the source has ended.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._buffer or not self._running.is_set(), timeout=timeout)
+            return self._buffer.popleft() if self._buffer else None
+
+
+class MicrophoneAudioSource(AudioSource):
+    def __init__(self, deviceIndex: Optional[int] = None, **kwargs):
+        """
+        Microphone source that keeps the input device open for its whole lifetime.
+
+        :param deviceIndex: PyAudio input device index; None uses the default device.
+        """
+        super().__init__(live=True, **kwargs)
+        self.deviceIndex = deviceIndex
+        self._audio = None
+        self._stream = None
+
+    def _open(self) -> None:
+        import pyaudio
+        self._audio = pyaudio.PyAudio()
+        self._stream = self._audio.open(
+            format=pyaudio.paInt16,
+            channels=1,
+            rate=self.sampleRate,
+            input=True,
+            input_device_index=self.deviceIndex,
+            frames_per_buffer=self.frameSamples,
+        )
+        logger.info(f"Microphone opened at {self.sampleRate} Hz.")
+
+    def _read(self) -> Optional[AudioChunk]:
+        try:
+            data = self._stream.read(self.frameSamples, exception_on_overflow=False)
+        except OSError as e:
+            logger.warning(f"Microphone read failed: {e}")
+            return None
+        return AudioChunk(np.frombuffer(data, dtype=np.int16), time.monotonic())
+
+    def _close(self) -> None:
+        if self._stream is not None:
+            self._stream.stop_stream()
+            self._stream.close()
+            self._stream = None
+        if self._audio is not None:
+            self._audio.terminate()
+            self._audio = None
+
+
+class WavAudioSource(AudioSource):
+    def __init__(self, path: str, realtime: bool = True, loop: bool = False, gapSeconds: float = 1.0, **kwargs):
+        """
+        Source replaying 16-bit WAV files, for driving the agent from recorded fixtures.
+
+        The sample rate is taken from the first file; files with another rate are skipped.
+        Silence is inserted after each file so that every file ends an utterance.
+
+        :param path: A WAV file or a directory of WAV files played in name order.
+        :param realtime: Pace frames at their real duration instead of reading flat out.
+        :param loop: Restart from the first file after the last one.
+        :param gapSeconds: Silence inserted after each file.
+        """
+        super().__init__(live=False, **kwargs)
+        self.path = Path(path)
+        self.realtime = realtime
+        self.loop = loop
+        self.gapSeconds = gapSeconds
+        self.files: List[Path] = []
+        if self.path.is_dir():
+            self.files = sorted(p for p in self.path.iterdir() if p.suffix.lower() == ".wav")
+        elif self.path.exists():
+            self.files = [self.path]
+        if not self.files:
+            raise RuntimeError(f"No WAV files found at {path}")
+        with wave.open(str(self.files[0]), "rb") as wav:
+            self.sampleRate = wav.getframerate()
+        self._position = 0
+        self._samples = np.zeros(0, dtype=np.int16)
+        self._offset = 0
+        self._origin = None
+        self._nextTick = 0.0
+
+    def _open(self) -> None:
+        self._position = 0
+        self._samples = np.zeros(0, dtype=np.int16)
+        self._offset = 0
+        self._nextTick = time.monotonic()
+
+    def _load_next(self) -> bool:
+        while True:
+            if self._position >= len(self.files):
+                if not self.loop:
+                    return False
+                self._position = 0
+            path = self.files[self._position]
+            self._position += 1
+            try:
+                with wave.open(str(path), "rb") as wav:
+                    if wav.getsampwidth() != SAMPLE_WIDTH or wav.getframerate() != self.sampleRate:
+                        logger.warning(f"Skipping {path}: expected 16-bit audio at {self.sampleRate} Hz")
+                        continue
+                    samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+                    samples = samples.reshape(-1, wav.getnchannels()).mean(axis=1).astype(np.int16)
+            except (wave.Error, EOFError, OSError) as e:
+                logger.warning(f"Skipping unreadable WAV file {path}: {e}")
+                continue
+            gap = np.zeros(int(self.gapSeconds * self.sampleRate), dtype=np.int16)
+            self._samples = np.concatenate([samples, gap])
+            self._offset = 0
+            self._origin = str(path)
+            return True
+
+    def _read(self) -> Optional[AudioChunk]:
+        if self._offset >= len(self._samples) and not self._load_next():
+            return None
+        samples = self._samples[self._offset:self._offset + self.frameSamples]
+        self._offset += len(samples)
+        if self.realtime:
+            self._nextTick += len(samples) / self.sampleRate
+            delay = self._nextTick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        return AudioChunk(samples, time.monotonic(), self._origin)
+
+
+class EnergyVad:
+    def __init__(self, margin: float = 3.0, minRms: float = 300.0, adaptRate: float = 0.05):
+        """
+        Voice-activity detector comparing frame energy with an adaptive noise floor.
+
+        :param margin: A frame is speech when its RMS exceeds the noise floor times this factor.
+        :param minRms: RMS below which a frame is never speech.
+        :param adaptRate: Rate at which the noise floor follows non-speech frames.
+        """
+        self.margin = margin
+        self.minRms = minRms
+        self.adaptRate = adaptRate
+        self.noiseFloor = None
+
+    def is_speech(self, samples: np.ndarray, sampleRate: int) -> bool:
+        rms = float(np.sqrt(np.mean(np.square(samples, dtype=np.float64)))) if len(samples) else 0.0
+        if self.noiseFloor is None:
+            self.noiseFloor = rms
+        speech = rms > max(self.minRms, self.noiseFloor * self.margin)
+        if not speech:
+            self.noiseFloor += self.adaptRate * (rms - self.noiseFloor)
+        return speech
+
+
+class WebRtcVad:
+    def __init__(self, aggressiveness: int = 2):
+        """
+        Voice-activity detector backed by the webrtcvad package. Frames must be 10, 20 or
+        30 ms long at 8, 16, 32 or 48 kHz.
+
+        :param aggressiveness: 0 (least) to 3 (most aggressive in filtering out non-speech).
+        """
+        import webrtcvad
+        self.vad = webrtcvad.Vad(aggressiveness)
+
+    def is_speech(self, samples: np.ndarray, sampleRate: int) -> bool:
+        try:
+            return self.vad.is_speech(samples.tobytes(), sampleRate)
+        except Exception:
+            # Short trailing frame of a fixture file
+            return False
+
+
+class GoogleRecognizer:
+    def __init__(self, language: str = "en-US"):
+        """Google Web Speech recognizer (needs network access)."""
+        import speech_recognition as sr
+        self._sr = sr
+        self.language = language
+        self.recognizer = sr.Recognizer()
+
+    def recognize(self, segment: AudioSegment) -> Optional[str]:
+        sr = self._sr
+        try:
+            return self.recognizer.recognize_google(segment.to_audio_data(), language=self.language)
+        except sr.UnknownValueError:
+            return None
+        except sr.RequestError as e:
+            raise RuntimeError(e) from e
+
+
+class VoskRecognizer:
+    def __init__(self, modelPath: str = "models/vosk"):
+        """
+        Offline recognizer backed by a Vosk model directory.
+
+        :param modelPath: Path of the unpacked Vosk model.
+        """
+        import vosk
+        self._vosk = vosk
+        self.model = vosk.Model(modelPath)
+
+    def recognize(self, segment: AudioSegment) -> Optional[str]:
+        recognizer = self._vosk.KaldiRecognizer(self.model, segment.sampleRate)
+        recognizer.AcceptWaveform(segment.pcm)
+        return json.loads(recognizer.FinalResult()).get("text") or None
+
+
+class TranscriptRecognizer:
+    def __init__(self, delaySeconds: float = 0.0):
+        """
+        Recognizer for fixture runs: returns the transcript stored next to the WAV file(s)
+        the segment was cut from (greeting.wav -> greeting.txt).
+
+        :param delaySeconds: Simulated recognition time, to stand in for a real recognizer in benchmarks.
+        """
+        self.delaySeconds = delaySeconds
+        self._cache: Dict[str, Optional[str]] = {}
+
+    def _transcript(self, origin: str) -> Optional[str]:
+        if origin not in self._cache:
+            path = Path(origin).with_suffix(".txt")
+            self._cache[origin] = path.read_text().strip() if path.exists() else None
+        return self._cache[origin]
+
+    def recognize(self, segment: AudioSegment) -> Optional[str]:
+        if self.delaySeconds > 0:
+            time.sleep(self.delaySeconds)
+        transcripts = [t for t in (self._transcript(origin) for origin in segment.origins) if t]
+        return " ".join(transcripts) or None
+
+
+class AudioStream:
+    def __init__(self, source: AudioSource, vad=None, preRollSeconds: float = 0.3, silenceSeconds: float = 0.6,
+                 minSpeechSeconds: float = 0.25, maxSpeechSeconds: float = 10.0, queueSize: int = 8,
+                 suppress: Optional[Callable[[float, float], bool]] = None):
+        """
+        Always-on capture that cuts the audio of a source into utterance segments.
+
+        A segment starts after a few consecutive speech frames (including preRollSeconds of
+        audio before them) and ends after silenceSeconds without speech or at maxSpeechSeconds.
+        Completed segments are queued; when the queue is full the oldest one is dropped.
+
+        :param source: Audio source; it is started with the stream.
+        :param vad: Voice-activity detector; defaults to EnergyVad.
+        :param preRollSeconds: Audio kept in front of the first speech frame.
+        :param silenceSeconds: Silence that ends an utterance.
+        :param minSpeechSeconds: Shorter segments are discarded as noise.
+        :param maxSpeechSeconds: Longer utterances are cut into several segments.
+        :param queueSize: Number of completed segments kept.
+        :param suppress: Callable(startedAt, endedAt) returning True for segments to drop,
+            e.g. ones that overlap our own speech output.
+        """
+        self.source = source
+        self.vad = vad if vad is not None else EnergyVad()
+        frameSeconds = source.frameMs / 1000
+        self.preRollFrames = max(1, int(preRollSeconds / frameSeconds))
+        self.silenceFrames = max(1, int(silenceSeconds / frameSeconds))
+        self.startFrames = 2
+        self.minSpeechSeconds = minSpeechSeconds
+        self.maxSpeechFrames = max(1, int(maxSpeechSeconds / frameSeconds))
+        self.suppress = suppress
+        self._segments: "queue.Queue[AudioSegment]" = queue.Queue(maxsize=max(1, queueSize))
+        self._thread = None
+        self._running = threading.Event()
+        self.segmentsEmitted = 0
+        self.segmentsDropped = 0
+        self.segmentsSuppressed = 0
+
+    @property
+    def exhausted(self) -> bool:
+        return self.source.exhausted and self._segments.empty() and not self._running.is_set()
+
+    def start(self) -> "AudioStream":
+        if self._running.is_set():
+            return self
+        self.source.start()
+        self._running.set()
+        self._thread = threading.Thread(target=self._run, name="AudioStream", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._running.clear()
+        self.source.stop()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2.0)
+        self._thread = None
+
+    def _run(self) -> None:
+        preRoll = deque(maxlen=self.preRollFrames)
+        speech: List[AudioChunk] = []
+        voiced = 0
+        silent = 0
+        try:
+            while self._running.is_set():
+                chunk = self.source.read(timeout=0.5)
+                if chunk is None:
+                    if self.source.exhausted:
+                        break
+                    continue
+                isSpeech = self.vad.is_speech(chunk.samples, self.source.sampleRate)
+                if not speech:
+                    preRoll.append(chunk)
+                    voiced = voiced + 1 if isSpeech else 0
+                    if voiced >= self.startFrames:
+                        speech = list(preRoll)
+                        preRoll.clear()
+                        silent = 0
+                    continue
+                speech.append(chunk)
+                silent = 0 if isSpeech else silent + 1
+                if silent >= self.silenceFrames or len(speech) >= self.maxSpeechFrames:
+                    self._emit(speech[:len(speech) - silent])
+                    speech = []
+                    voiced = 0
+            if speech:
+                self._emit(speech)
+        finally:
+            self._running.clear()
+
+    def _emit(self, chunks: List[AudioChunk]) -> None:
+        sampleRate = self.source.sampleRate
+        samples = np.concatenate([chunk.samples for chunk in chunks])
+        endedAt = chunks[-1].timestamp
+        startedAt = endedAt - len(samples) / sampleRate
+        segment = AudioSegment(
+            pcm=samples.astype(np.int16).tobytes(),
+            sampleRate=sampleRate,
+            startedAt=startedAt,
+            endedAt=endedAt,
+            origins=tuple(dict.fromkeys(chunk.origin for chunk in chunks if chunk.origin)),
+        )
+        if segment.duration < self.minSpeechSeconds:
+            return
+        if self.suppress is not None and self.suppress(startedAt, endedAt):
+            self.segmentsSuppressed += 1
+            logger.debug(f"Dropped {segment.duration:.2f} s segment overlapping speech output.")
+            return
+        while True:
+            try:
+                self._segments.put_nowait(segment)
+                break
+            except queue.Full:
+                try:
+                    self._segments.get_nowait()
+                    self.segmentsDropped += 1
+                except queue.Empty:
+                    pass
+        self.segmentsEmitted += 1
+
+    def next_segment(self, timeout: Optional[float] = None, since: Optional[float] = None) -> Optional[AudioSegment]:
+        """
+        Return the oldest queued utterance.
+
+        :param timeout: Seconds to wait for one; None waits indefinitely.
+        :param since: Discard utterances that ended before this time.monotonic() timestamp.
+        :return: The segment, or None on timeout or when the source has ended.
+        """
+        if self._thread is None and not self.source.exhausted:
+            self.start()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                # Wake up periodically to notice the end of a finite source
+                segment = self._segments.get(timeout=0.5 if remaining is None else min(0.5, remaining))
+            except queue.Empty:
+                if self.exhausted or (deadline is not None and time.monotonic() >= deadline):
+                    return None
+                continue
+            if since is None or segment.endedAt >= since:
+                return segment
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "framesRead": self.source.framesRead,
+            "overruns": self.source.overruns,
+            "segmentsEmitted": self.segmentsEmitted,
+            "segmentsDropped": self.segmentsDropped,
+            "segmentsSuppressed": self.segmentsSuppressed,
+        }
+
+
+def create_vad(audioConfig: Dict[str, Any]):
+    """Build the voice-activity detector named by audio.vad, falling back to EnergyVad."""
+    if audioConfig.get("vad", "energy") == "webrtc":
+        try:
+            return WebRtcVad(audioConfig.get("vadAggressiveness", 2))
+        except ImportError:
+            logger.warning("webrtcvad is not installed; using the energy-based detector.")
+    return EnergyVad(
+        margin=audioConfig.get("energyMargin", 3.0),
+        minRms=audioConfig.get("minRms", 300.0),
+    )
+
+
+def create_audio_stream(audioConfig: Optional[Dict[str, Any]] = None,
+                        suppress: Optional[Callable[[float, float], bool]] = None) -> AudioStream:
+    """
+    Build an audio stream from the audio configuration section.
+
+    :param audioConfig: Mapping with "source" (microphone or wav) plus capture and VAD options.
+    :param suppress: Callable(startedAt, endedAt) returning True for segments to drop.
+    :return: The stream; it is started on first next_segment().
+    """
+    audioConfig = audioConfig or {}
+    kind = audioConfig.get("source", "microphone")
+    common = {
+        "frameMs": audioConfig.get("frameMs", 30),
+        "bufferSeconds": audioConfig.get("bufferSeconds", 10.0),
+    }
+    if kind == "microphone":
+        source = MicrophoneAudioSource(
+            deviceIndex=audioConfig.get("deviceIndex"),
+            sampleRate=audioConfig.get("sampleRate", 16000),
+            **common,
+        )
+    elif kind == "wav":
+        source = WavAudioSource(
+            audioConfig["path"],
+            realtime=audioConfig.get("realtime", True),
+            loop=audioConfig.get("loop", False),
+            gapSeconds=audioConfig.get("gapSeconds", 1.0),
+            **common,
+        )
+    else:
+        raise ValueError(f"Unknown audio source type: {kind}")
+    return AudioStream(
+        source,
+        vad=create_vad(audioConfig),
+        preRollSeconds=audioConfig.get("preRollSeconds", 0.3),
+        silenceSeconds=audioConfig.get("silenceSeconds", 0.6),
+        minSpeechSeconds=audioConfig.get("minSpeechSeconds", 0.25),
+        maxSpeechSeconds=audioConfig.get("maxSpeechSeconds", 10.0),
+        queueSize=audioConfig.get("queueSize", 8),
+        suppress=suppress,
+    )
+
+
+def create_recognizer(audioConfig: Optional[Dict[str, Any]] = None):
+    """Build the speech recognizer named by audio.recognizer (google, vosk or transcript)."""
+    audioConfig = audioConfig or {}
+    kind = audioConfig.get("recognizer", "google")
+    if kind == "google":
+        return GoogleRecognizer(language=audioConfig.get("language", "en-US"))
+    if kind == "vosk":
+        return VoskRecognizer(audioConfig.get("voskModel", "models/vosk"))
+    if kind == "transcript":
+        return TranscriptRecognizer(delaySeconds=audioConfig.get("transcriptDelaySeconds", 0.0))
+    raise ValueError(f"Unknown speech recognizer: {kind}")
@@ -0,0 +1,128 @@
+import logging
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+from rapidfuzz import fuzz, process
+from rapidfuzz.utils import default_process
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class IntentMatch:
+    """Best intent for an utterance, with its score and lead over the runner-up intent (0-100)."""
+    intent: Optional[str]
+    score: float
+    margin: float
+    phrase: Optional[str] = None
+
+    @property
+    def matched(self) -> bool:
+        return self.intent is not None
+
+
+def normalize(text: str) -> str:
+    """Lower-case, strip punctuation and collapse whitespace."""
+    return " ".join(default_process(text or "").split())
+
+
+class CommandMatcher:
+    def __init__(self, intents: Dict[str, Sequence[str]], threshold: float = 75.0, minMargin: float = 5.0,
+                 scorer: str = "token_sort_ratio", cacheSize: int = 256, minLengthRatio: float = 0.6,
+                 exactWords: bool = True):
+        """
+        Fuzzy matcher mapping utterances to intents.
+
+        Phrases are normalized once; each utterance is scored against every phrase of every
+        intent in a single rapidfuzz cdist call, and recent utterances are answered from an
+        LRU cache. An utterance equal to a configured phrase matches its intent directly.
+
+        The default scorer compares whole utterances. Scorers with a partial-ratio branch, such
+        as WRatio, give 90 to any utterance containing a one-word phrase, so that "please do not
+        stop" would deactivate guarding. One-word phrases only match exactly, as a word one edit
+        away from a short command is usually another word ("quiet" for "quit", "top" for "stop"),
+        and phrases whose length differs too much from the utterance's are not scored.
+
+        :param intents: Mapping of intent name to its phrases.
+        :param threshold: Minimum score for an intent to match.
+        :param minMargin: Minimum lead of the best intent over the runner-up, so that
+            ambiguous utterances are rejected.
+        :param scorer: Name of the rapidfuzz.fuzz scorer; prefer one comparing whole strings.
+        :param cacheSize: Number of recent utterances whose result is cached.
+        :param minLengthRatio: Smallest ratio of the shorter to the longer of an utterance and a
+            phrase for the phrase to be scored.
+        :param exactWords: Whether one-word phrases only match exactly.
+        """
+        self.threshold = threshold
+        self.minMargin = minMargin
+        self.scorer = getattr(fuzz, scorer)
+        self.minLengthRatio = minLengthRatio
+        self.intents = []
+        self.phrases = []
+        self.exact = {}
+        offsets = []
+        for intent, phrases in intents.items():
+            normalized = list(dict.fromkeys(p for p in (normalize(phrase) for phrase in phrases or []) if p))
+            if not normalized:
+                continue
+            self.intents.append(intent)
+            offsets.append(len(self.phrases))
+            self.phrases.extend(normalized)
+            for phrase in normalized:
+                self.exact.setdefault(phrase, intent)
+        # Phrases of one intent are contiguous, starting at its offset
+        self.offsets = np.array(offsets, dtype=np.intp)
+        self.lengths = np.array([len(phrase) for phrase in self.phrases], dtype=np.float32)
+        self.fuzzy = np.array([" " in phrase or not exactWords for phrase in self.phrases], dtype=bool)
+        self._match = lru_cache(maxsize=cacheSize)(self._match_normalized)
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "CommandMatcher":
+        """Build a matcher for the commands section, tuned by the commandMatching section."""
+        matchingConfig = config.get("commandMatching", {})
+        return cls(
+            config.get("commands", {}),
+            threshold=matchingConfig.get("threshold", 75.0),
+            minMargin=matchingConfig.get("minMargin", 5.0),
+            scorer=matchingConfig.get("scorer", "token_sort_ratio"),
+            cacheSize=matchingConfig.get("cacheSize", 256),
+            minLengthRatio=matchingConfig.get("minLengthRatio", 0.6),
+        )
+
+    def match(self, text: Optional[str]) -> IntentMatch:
+        """
+        Find the intent of an utterance.
+
+        :param text: The utterance.
+        :return: IntentMatch; its intent is None when no intent passes the threshold and margin.
+        """
+        return self._match(normalize(text))
+
+    def _match_normalized(self, text: str) -> IntentMatch:
+        if not text or not self.phrases:
+            return IntentMatch(None, 0.0, 0.0)
+        if text in self.exact:
+            # A configured phrase always selects its own intent, however close other intents are
+            return IntentMatch(self.exact[text], 100.0, 100.0, text)
+        # Scores below the cutoff cannot change the decision: the best intent needs the threshold,
+        # and a runner-up below threshold - minMargin never narrows the margin enough to matter.
+        cutoff = max(0.0, self.threshold - self.minMargin)
+        scores = process.cdist([text], self.phrases, scorer=self.scorer, dtype=np.float32,
+                               score_cutoff=cutoff, workers=-1)[0]
+        lengthRatio = np.minimum(self.lengths, len(text)) / np.maximum(self.lengths, len(text))
+        scores[~self.fuzzy | (lengthRatio < self.minLengthRatio)] = 0.0
+        perIntent = np.maximum.reduceat(scores, self.offsets)
+        order = np.argsort(perIntent)[::-1]
+        best = int(order[0])
+        score = float(perIntent[best])
+        margin = score - float(perIntent[order[1]]) if len(order) > 1 else score
+        end = self.offsets[best + 1] if best + 1 < len(self.offsets) else len(self.phrases)
+        phrase = self.phrases[self.offsets[best] + int(np.argmax(scores[self.offsets[best]:end]))] if score > 0 else None
+        intent = self.intents[best] if score >= self.threshold and margin >= self.minMargin else None
+        logger.debug(f"Command match for '{text}': {self.intents[best]} via '{phrase}' ({score:.0f}, margin {margin:.0f})")
+        return IntentMatch(intent, score, margin, phrase)
+
+    def cache_info(self):
+        return self._match.cache_info()
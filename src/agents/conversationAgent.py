@@ -1,35 +1,327 @@
 import logging
-from google.generativeai import GenerativeModel
-import google.generativeai as genai
+import queue
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from src.metrics import get_metrics
 from src.utils import load_api_key
-from dotenv import load_dotenv
 import os
-load_dotenv()
+from typing import Iterable, Iterator, List, Optional
 
 logger = logging.getLogger(__name__)
 
+# End of a sentence: terminal punctuation, optional closing quotes or brackets, then whitespace
+SENTENCE_END = re.compile(r"(?<=[.!?])[\"')\]]*\s+")
+
+
+def iter_sentences(chunks: Iterable[str]) -> Iterator[str]:
+    """
+    Regroup streamed text chunks into sentences, yielding each as soon as it is complete.
+
+    :param chunks: Text chunks in generation order.
+    :return: Iterator of stripped sentences; trailing text without punctuation comes last.
+    """
+    buffer = ""
+    for chunk in chunks:
+        buffer += chunk
+        start = 0
+        for match in SENTENCE_END.finditer(buffer):
+            sentence = buffer[start:match.end()].strip()
+            if sentence:
+                yield sentence
+            start = match.end()
+        buffer = buffer[start:]
+    if buffer.strip():
+        yield buffer.strip()
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Lower-case a prompt and drop punctuation and repeated whitespace, for use as a cache key."""
+    return " ".join(re.sub(r"[^\w\s]", " ", prompt.lower()).split())
+
+
+class ResponseCache:
+    def __init__(self, maxEntries: int = 64, ttlSeconds: float = 600.0):
+        """
+        Thread-safe cache of complete responses keyed by normalized prompt, dropping entries
+        after ttlSeconds and the least recently used one beyond maxEntries.
+        """
+        self.maxEntries = maxEntries
+        self.ttlSeconds = ttlSeconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, prompt: str) -> Optional[str]:
+        key = normalize_prompt(prompt)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, prompt: str, response: str) -> None:
+        key = normalize_prompt(prompt)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttlSeconds, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxEntries:
+                self._entries.popitem(last=False)
+
+
+class PendingResponse:
+    def __init__(self, agent: "ConversationAgent", prompt: str, executor: ThreadPoolExecutor):
+        """
+        Response generated in the background, split into sentences as it streams in.
+
+        Iterating yields each sentence as soon as it is complete, waiting for more until
+        generation finishes. cancel() abandons it.
+
+        :param agent: Agent generating the response.
+        :param prompt: Prompt text.
+        :param executor: Executor running the generation.
+        """
+        self.prompt = prompt
+        self.sentences: List[str] = []
+        self.finished = False
+        self.timedOut = False
+        self._agent = agent
+        self._cancel = threading.Event()
+        self._condition = threading.Condition()
+        self.future = executor.submit(self._run)
+
+    def _run(self) -> None:
+        try:
+            for sentence in iter_sentences(self._agent.stream_response(self.prompt, cancel=self._cancel)):
+                with self._condition:
+                    self.sentences.append(sentence)
+                    self._condition.notify_all()
+        except TimeoutError as e:
+            # The unfinished sentence is dropped
+            logger.warning(e)
+            self.timedOut = True
+        finally:
+            with self._condition:
+                self.finished = True
+                self._condition.notify_all()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def cancel(self) -> None:
+        self._cancel.set()
+
+    def __iter__(self) -> Iterator[str]:
+        index = 0
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: index < len(self.sentences) or self.finished)
+                if index >= len(self.sentences):
+                    return
+                sentence = self.sentences[index]
+            index += 1
+            yield sentence
+
+
+class GeminiModel:
+    def __init__(self, modelName: str):
+        """Gemini backend; the API key is read from the API_KEY environment variable."""
+        import google.generativeai as genai
+        genai.configure(api_key=os.getenv("API_KEY"))
+        self.model = genai.GenerativeModel(modelName)
+
+    def generate(self, prompt: str) -> str:
+        return self.model.generate_content(prompt).text
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        for chunk in self.model.generate_content(prompt, stream=True):
+            if chunk.text:
+                yield chunk.text
+
+
+class FakeModel:
+    def __init__(self, response: str, firstChunkSeconds: float = 0.5, chunkSeconds: float = 0.05, chunkChars: int = 12):
+        """
+        Offline stand-in for the LLM that replies with fixed text at a simulated speed.
+
+        :param response: Text returned for every prompt.
+        :param firstChunkSeconds: Delay before the first chunk.
+        :param chunkSeconds: Delay between later chunks.
+        :param chunkChars: Characters per chunk.
+        """
+        self.response = response
+        self.firstChunkSeconds = firstChunkSeconds
+        self.chunkSeconds = chunkSeconds
+        self.chunkChars = max(1, chunkChars)
+
+    def generate(self, prompt: str) -> str:
+        return "".join(self.stream(prompt))
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        time.sleep(self.firstChunkSeconds)
+        for i in range(0, len(self.response), self.chunkChars):
+            if i:
+                time.sleep(self.chunkSeconds)
+            yield self.response[i:i + self.chunkChars]
+
+
 class ConversationAgent:
+    FALLBACK_RESPONSE = "I'm sorry, I couldn't process that."
+
     def __init__(self, config):
-        genai.configure(api_key=os.getenv("API_KEY"))
+        conversationConfig = config.get("conversation", {})
+        self.deadlineSeconds = conversationConfig.get("deadlineSeconds", 15.0)
+        cacheConfig = conversationConfig.get("cache", {})
+        self.cache = None
+        if cacheConfig.get("enabled", True):
+            self.cache = ResponseCache(
+                maxEntries=cacheConfig.get("maxEntries", 64),
+                ttlSeconds=cacheConfig.get("ttlSeconds", 600.0),
+            )
+        self.executor = ThreadPoolExecutor(max_workers=conversationConfig.get("workers", 2),
+                                           thread_name_prefix="ConversationAgent")
+        self.conversationConfig = conversationConfig
+        # The LLM client is created on first use or by warm_up()
+        self._model = None
+        self._modelLock = threading.Lock()
+
+    def _create_model(self):
+        if self.conversationConfig.get("backend", "gemini") == "fake":
+            fakeConfig = self.conversationConfig.get("fake", {})
+            return FakeModel(
+                fakeConfig.get("response", "Leave the room immediately. The authorities will be contacted if you do not comply."),
+                firstChunkSeconds=fakeConfig.get("firstChunkSeconds", 0.5),
+                chunkSeconds=fakeConfig.get("chunkSeconds", 0.05),
+                chunkChars=fakeConfig.get("chunkChars", 12),
+            )
+        from dotenv import load_dotenv
+        load_dotenv()
         model_name = os.getenv("MODEL_NAME", "gemini-2.5-flash")
-        self.model = GenerativeModel(model_name)
+        return GeminiModel(model_name)
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._modelLock:
+                if self._model is None:
+                    self._model = self._create_model()
+        return self._model
+
+    def warm_up(self) -> None:
+        """Create the LLM client ahead of the first request."""
+        self.model
 
     def generate_response(self, prompt):
+        metrics = get_metrics()
+        cached = self.cache.get(prompt) if self.cache is not None else None
+        if cached is not None:
+            metrics.inc("llm_requests_total", result="cached")
+            return cached
+        start = time.perf_counter()
         try:
-            # response = self.model.generate_text(
-            #     model=self.model,
-            #     prompt=prompt,
-            #     max_output_tokens=256,
-            #     temperature=0.7,
-            #     top_p=0.95,
-            #     top_k=40,
-            #     stop_sequences=["\n"]
-            # )
-            # logger.debug(f"Generated response: {response.text}")
-            response = self.model.generate_content(prompt)
-            logger.debug(f"Generated response: {response.text}")
-            return response.text
+            response = self.model.generate(prompt)
+            logger.debug(f"Generated response: {response}")
+            metrics.observe("llm_response_seconds", time.perf_counter() - start)
+            metrics.inc("llm_requests_total", result="generated")
+            if self.cache is not None:
+                self.cache.put(prompt, response)
+            return response
         except Exception as e:
             logger.error(f"Failed to generate response: {e}")
-            return "I'm sorry, I couldn't process that."
+            metrics.inc("llm_requests_total", result="error")
+            return self.FALLBACK_RESPONSE
+
+    def stream_response(self, prompt: str, deadline: Optional[float] = None,
+                        cancel: Optional[threading.Event] = None) -> Iterator[str]:
+        """
+        Stream the response to a prompt as text chunks.
+
+        Generation runs on a background thread, so the deadline and cancellation are honoured
+        even while the backend is blocked waiting for the next chunk. Cached responses are
+        returned as a single chunk; complete responses are added to the cache.
+
+        :param prompt: Prompt text.
+        :param deadline: Seconds allowed for the whole response; None uses conversation.deadlineSeconds.
+        :param cancel: Event that stops the stream when set.
+        :return: Iterator of text chunks; it ends early on error or cancellation.
+        :raises TimeoutError: When the deadline passes before the response is complete.
+        """
+        metrics = get_metrics()
+        cached = self.cache.get(prompt) if self.cache is not None else None
+        if cached is not None:
+            metrics.inc("llm_requests_total", result="cached")
+            yield cached
+            return
+        deadline = time.monotonic() + (self.deadlineSeconds if deadline is None else deadline)
+        cancel = cancel or threading.Event()
+        stop = threading.Event()
+        chunks = queue.Queue()
+        done = object()
+        failed = object()
+
+        def produce():
+            try:
+                for chunk in self.model.stream(prompt):
+                    if stop.is_set() or cancel.is_set():
+                        break
+                    chunks.put(chunk)
+            except Exception as e:
+                logger.error(f"Failed to generate response: {e}")
+                chunks.put(failed)
+            finally:
+                chunks.put(done)
+
+        threading.Thread(target=produce, name="ConversationStream", daemon=True).start()
+        start = time.monotonic()
+        parts = []
+        result = "cancelled"
+        try:
+            while not cancel.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    result = "timeout"
+                    raise TimeoutError("Response generation hit its deadline.")
+                try:
+                    chunk = chunks.get(timeout=min(remaining, 0.1))
+                except queue.Empty:
+                    continue
+                if chunk is failed:
+                    parts = None
+                    continue
+                if chunk is done:
+                    if parts is None:
+                        result = "error"
+                    elif not cancel.is_set():
+                        result = "generated"
+                        metrics.observe("llm_response_seconds", time.monotonic() - start)
+                        if parts and self.cache is not None:
+                            self.cache.put(prompt, "".join(parts))
+                    break
+                if parts is not None:
+                    if not parts:
+                        logger.debug(f"First response chunk after {time.monotonic() - start:.2f} s")
+                        metrics.observe("llm_first_chunk_seconds", time.monotonic() - start)
+                    parts.append(chunk)
+                yield chunk
+        finally:
+            # Tells the producer to stop at its next chunk
+            stop.set()
+            metrics.inc("llm_requests_total", result=result)
+
+    def start_response(self, prompt: str) -> PendingResponse:
+        """
+        Start generating a response in the background, e.g. speculatively before it is known
+        to be needed.
 
+        :param prompt: Prompt text.
+        :return: PendingResponse to iterate over or cancel.
+        """
+        return PendingResponse(self, prompt, self.executor)
@@ -0,0 +1,159 @@
+import hashlib
+import logging
+import os
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+STORE_VERSION = 1
+ENCODING_SIZE = 128
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class EncodingEntry:
+    """A cached encoding for one gallery image."""
+    path: str
+    size: int
+    mtimeNs: int
+    digest: str
+    encoding: Optional[np.ndarray]
+
+
+def file_digest(path: Path, chunkSize: int = 1 << 20) -> str:
+    """Return the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunkSize), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def list_gallery_images(galleryPath: str) -> List[Path]:
+    """Return the image files of a trusted-faces gallery in a stable order."""
+    return sorted(p for p in Path(galleryPath).glob('*') if p.is_file() and p.suffix.lower() in IMAGE_SUFFIXES)
+
+
+class EncodingStore:
+    def __init__(self, storePath: str, params: str = ""):
+        """
+        Persistent store of face encodings keyed by image path, size, mtime and content hash.
+
+        :param storePath: Path of the .npz file holding the encodings.
+        :param params: Description of the encoder settings; a store written with different
+            settings is discarded instead of reused.
+        """
+        self.storePath = Path(storePath)
+        self.params = params
+        self.stats = {"reused": 0, "rehashed": 0, "encoded": 0, "evicted": 0}
+
+    def load(self) -> Dict[str, EncodingEntry]:
+        """
+        Load the entries from disk.
+
+        :return: Mapping of relative image path to entry; empty if the store is missing,
+            unreadable, from another version or written with other encoder settings.
+        """
+        if not self.storePath.exists():
+            return {}
+        try:
+            with np.load(self.storePath, allow_pickle=False) as data:
+                if int(data["version"]) != STORE_VERSION or str(data["params"]) != self.params:
+                    logger.info(f"Discarding encoding store {self.storePath} written with other settings")
+                    return {}
+                entries = {}
+                for i, path in enumerate(data["paths"]):
+                    encoding = data["encodings"][i] if data["hasFace"][i] else None
+                    entries[str(path)] = EncodingEntry(
+                        path=str(path),
+                        size=int(data["sizes"][i]),
+                        mtimeNs=int(data["mtimes"][i]),
+                        digest=str(data["digests"][i]),
+                        encoding=encoding,
+                    )
+                return entries
+        except Exception as e:
+            logger.warning(f"Failed to read encoding store {self.storePath}: {e}")
+            return {}
+
+    def save(self, entries: List[EncodingEntry]) -> None:
+        """
+        Atomically write the entries to disk.
+
+        :param entries: Entries to persist.
+        """
+        encodings = np.zeros((len(entries), ENCODING_SIZE), dtype=np.float32)
+        for i, entry in enumerate(entries):
+            if entry.encoding is not None:
+                encodings[i] = entry.encoding
+        self.storePath.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmpPath = tempfile.mkstemp(dir=self.storePath.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                np.savez(
+                    file,
+                    version=np.int64(STORE_VERSION),
+                    params=np.str_(self.params),
+                    paths=np.array([e.path for e in entries], dtype=np.str_),
+                    sizes=np.array([e.size for e in entries], dtype=np.int64),
+                    mtimes=np.array([e.mtimeNs for e in entries], dtype=np.int64),
+                    digests=np.array([e.digest for e in entries], dtype=np.str_),
+                    hasFace=np.array([e.encoding is not None for e in entries], dtype=bool),
+                    encodings=encodings,
+                )
+            os.replace(tmpPath, self.storePath)
+        except Exception:
+            os.unlink(tmpPath)
+            raise
+
+    def sync(self, galleryPath: str, encoder: Callable[[Path], Optional[np.ndarray]]) -> List[EncodingEntry]:
+        """
+        Bring the store up to date with the images in a gallery directory.
+
+        Images whose size and mtime are unchanged are reused without being read. Images
+        with a new mtime are hashed, and only re-encoded when their contents changed.
+        Entries for deleted images are evicted.
+
+        :param galleryPath: Directory containing the trusted-face images.
+        :param encoder: Callable returning the encoding of an image file, or None if no face is found.
+        :return: Up-to-date entries in gallery order.
+        """
+        self.stats = {"reused": 0, "rehashed": 0, "encoded": 0, "evicted": 0}
+        cached = self.load()
+        byDigest = {entry.digest: entry for entry in cached.values()}
+        root = Path(galleryPath)
+        entries = []
+        changed = False
+        for image in list_gallery_images(galleryPath):
+            relPath = image.relative_to(root).as_posix()
+            stat = image.stat()
+            entry = cached.pop(relPath, None)
+            if entry is not None and entry.size == stat.st_size and entry.mtimeNs == stat.st_mtime_ns:
+                self.stats["reused"] += 1
+                entries.append(entry)
+                continue
+
+            digest = file_digest(image)
+            previous = entry if entry is not None and entry.digest == digest else byDigest.get(digest)
+            if previous is not None:
+                self.stats["rehashed"] += 1
+                encoding = previous.encoding
+            else:
+                self.stats["encoded"] += 1
+                encoding = encoder(image)
+            entries.append(EncodingEntry(relPath, stat.st_size, stat.st_mtime_ns, digest, encoding))
+            changed = True
+
+        self.stats["evicted"] = len(cached)
+        if changed or cached or not self.storePath.exists():
+            self.save(entries)
+        logger.info(
+            f"Encoding store {self.storePath}: {self.stats['reused']} reused, "
+            f"{self.stats['rehashed']} rehashed, {self.stats['encoded']} encoded, {self.stats['evicted']} evicted"
+        )
+        return entries
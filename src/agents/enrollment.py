@@ -0,0 +1,236 @@
+import logging
+import multiprocessing
+import os
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from src.agents.encodingStore import ENCODING_SIZE, IMAGE_SUFFIXES
+
+GALLERY_VERSION = 1
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class EnrolledImage:
+    """Result of encoding one enrollment image."""
+    person: str
+    path: str
+    encoding: Optional[np.ndarray]
+    faces: int
+    error: Optional[str] = None
+
+
+def list_enrollment_images(root: str) -> List[Tuple[str, Path]]:
+    """
+    List the images of an enrollment tree with one subfolder per person.
+
+    :param root: Directory whose subfolders are named after the people in them; images
+        directly in the root are enrolled under their file name.
+    :return: (person, image path) pairs in a stable order.
+    """
+    rootPath = Path(root)
+    images = []
+    for path in sorted(rootPath.rglob("*")):
+        if not path.is_file() or path.suffix.lower() not in IMAGE_SUFFIXES:
+            continue
+        relative = path.relative_to(rootPath)
+        person = relative.parts[0] if len(relative.parts) > 1 else path.stem
+        images.append((person, path))
+    return images
+
+
+_encoder = None
+_maxImageSide = None
+
+
+def _init_worker(recognitionConfig: Dict[str, Any], maxImageSide: int) -> None:
+    global _encoder, _maxImageSide
+    from src.agents.faceRecognition import FaceRecognition
+    # Images are downscaled to maxImageSide here, so the detector runs at full resolution
+    _encoder = FaceRecognition.from_config(dict(recognitionConfig, detectionScale=1.0))
+    _maxImageSide = maxImageSide
+
+
+def _encode(task: Tuple[str, str]) -> EnrolledImage:
+    """Encode the largest face of one image; runs in a pool worker."""
+    person, path = task
+    try:
+        image = cv2.imread(path, cv2.IMREAD_COLOR)
+        if image is None:
+            return EnrolledImage(person, path, None, 0, "unreadable image")
+        scale = _maxImageSide / max(image.shape[:2]) if _maxImageSide else 1.0
+        if scale < 1:
+            image = cv2.resize(image, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        rgbImage = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        boxes = _encoder.detect_faces(rgbImage)
+        if not boxes:
+            return EnrolledImage(person, path, None, 0)
+        # Photos of a person may include bystanders: the largest face is taken to be theirs
+        largest = max(boxes, key=lambda box: (box[2] - box[0]) * (box[1] - box[3]))
+        encoding = _encoder.encode_faces(rgbImage, [largest])[0]
+        return EnrolledImage(person, path, np.asarray(encoding, dtype=np.float32), len(boxes))
+    except Exception as e:
+        return EnrolledImage(person, path, None, 0, str(e))
+
+
+def encode_images(images: Sequence[Tuple[str, Path]], recognitionConfig: Optional[Dict[str, Any]] = None,
+                  workers: Optional[int] = None, maxImageSide: int = 1024, chunkSize: int = 4) -> Iterator[EnrolledImage]:
+    """
+    Encode enrollment images on a pool of processes, one dlib instance per core.
+
+    :param images: (person, image path) pairs.
+    :param recognitionConfig: Recognition section of the configuration (detector and encoder settings).
+    :param workers: Number of processes; None uses every core.
+    :param maxImageSide: Images are downscaled so that their longer side is at most this many
+        pixels before detection; 0 keeps full resolution.
+    :param chunkSize: Images handed to a worker at a time.
+    :return: Iterator of results in completion order.
+    """
+    tasks = [(person, str(path)) for person, path in images]
+    workers = workers or os.cpu_count() or 1
+    initargs = (recognitionConfig or {}, maxImageSide)
+    if workers == 1:
+        _init_worker(*initargs)
+        yield from map(_encode, tasks)
+        return
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(workers, initializer=_init_worker, initargs=initargs) as pool:
+        yield from pool.imap_unordered(_encode, tasks, chunksize=chunkSize)
+
+
+def select_encodings(encodings: np.ndarray, dedupeDistance: float = 0.1, maxEncodings: int = 0) -> np.ndarray:
+    """
+    Choose the encodings kept for one person.
+
+    Encodings closer than dedupeDistance to one already kept add nothing and are dropped.
+    When maxEncodings is set, the most diverse ones are kept: each next encoding is the
+    one farthest from all those already chosen.
+
+    :param encodings: (N, 128) encodings of one person.
+    :param dedupeDistance: Euclidean distance below which two encodings count as duplicates.
+    :param maxEncodings: Maximum number of encodings kept; 0 keeps all distinct ones.
+    :return: Indices of the kept encodings, in selection order.
+    """
+    if len(encodings) == 0:
+        return np.empty(0, dtype=np.intp)
+    # The encoding closest to the person's mean is the most typical one and goes first
+    first = int(np.argmin(np.linalg.norm(encodings - encodings.mean(axis=0), axis=1)))
+    chosen = [first]
+    nearest = np.linalg.norm(encodings - encodings[first], axis=1)
+    limit = maxEncodings or len(encodings)
+    while len(chosen) < limit:
+        candidate = int(np.argmax(nearest))
+        if nearest[candidate] < dedupeDistance:
+            break
+        chosen.append(candidate)
+        nearest = np.minimum(nearest, np.linalg.norm(encodings - encodings[candidate], axis=1))
+    return np.array(chosen, dtype=np.intp)
+
+
+def enroll(root: str, outputPath: str, recognitionConfig: Optional[Dict[str, Any]] = None,
+           workers: Optional[int] = None, dedupeDistance: float = 0.1, maxPerPerson: int = 0,
+           maxImageSide: int = 1024, progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+    """
+    Encode an enrollment tree and write the resulting gallery file.
+
+    :param root: Directory with one subfolder per person.
+    :param outputPath: Gallery file (.npz) to write.
+    :param recognitionConfig: Recognition section of the configuration.
+    :param workers: Number of encoding processes; None uses every core.
+    :param dedupeDistance: Distance below which encodings of one person are duplicates.
+    :param maxPerPerson: Maximum encodings kept per person; 0 keeps all distinct ones.
+    :param maxImageSide: Longest image side used for detection, in pixels; 0 keeps full resolution.
+    :param progress: Callable(done, total) called after each image.
+    :return: Counts of images, faces and kept encodings, and the elapsed time.
+    """
+    recognitionConfig = recognitionConfig or {}
+    images = list_enrollment_images(root)
+    start = time.perf_counter()
+    byPerson: Dict[str, List[Tuple[str, np.ndarray]]] = {}
+    stats = {"images": len(images), "noFace": 0, "multipleFaces": 0, "failed": 0}
+    for done, result in enumerate(encode_images(images, recognitionConfig, workers, maxImageSide), start=1):
+        if result.error is not None:
+            stats["failed"] += 1
+            logger.warning(f"Failed to encode {result.path}: {result.error}")
+        elif result.encoding is None:
+            stats["noFace"] += 1
+            logger.warning(f"No faces found in {result.path}")
+        else:
+            if result.faces > 1:
+                stats["multipleFaces"] += 1
+                logger.info(f"{result.faces} faces in {result.path}, enrolled the largest as {result.person}")
+            relative = Path(result.path).relative_to(root).as_posix()
+            byPerson.setdefault(result.person, []).append((relative, result.encoding))
+        if progress is not None:
+            progress(done, len(images))
+
+    labels, sources, encodings = [], [], []
+    for person in sorted(byPerson):
+        # Completion order varies between runs; sorting keeps the gallery file reproducible
+        entries = sorted(byPerson[person], key=lambda entry: entry[0])
+        personEncodings = np.stack([encoding for _, encoding in entries])
+        for index in select_encodings(personEncodings, dedupeDistance, maxPerPerson):
+            labels.append(person)
+            sources.append(entries[index][0])
+            encodings.append(personEncodings[index])
+    from src.agents.faceRecognition import FaceRecognition
+    params = FaceRecognition.from_config(recognitionConfig).encoder_params
+    save_gallery(outputPath, np.array(encodings, dtype=np.float32).reshape(-1, ENCODING_SIZE), labels, sources, params)
+    stats.update(people=len(byPerson), encoded=sum(len(e) for e in byPerson.values()), kept=len(labels),
+                 seconds=time.perf_counter() - start)
+    return stats
+
+
+def save_gallery(path: str, encodings: np.ndarray, labels: Sequence[str], sources: Sequence[str], params: str = "") -> None:
+    """
+    Atomically write a gallery file: float16 encodings with one label and source image each.
+
+    float16 halves the file size; the rounding error (about 1e-4 per component) is far
+    below the matching tolerance.
+    """
+    names = sorted(set(labels))
+    index = {name: i for i, name in enumerate(names)}
+    outputPath = Path(path)
+    outputPath.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmpPath = tempfile.mkstemp(dir=outputPath.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            np.savez_compressed(
+                file,
+                version=np.int64(GALLERY_VERSION),
+                params=np.str_(params),
+                names=np.array(names, dtype=np.str_),
+                labelIndex=np.array([index[label] for label in labels], dtype=np.int32),
+                sources=np.array(list(sources), dtype=np.str_),
+                encodings=np.asarray(encodings, dtype=np.float16),
+            )
+        os.replace(tmpPath, outputPath)
+    except Exception:
+        os.unlink(tmpPath)
+        raise
+
+
+def load_gallery(path: str) -> Tuple[np.ndarray, List[str], str]:
+    """
+    Read a gallery file written by save_gallery.
+
+    :param path: Gallery file.
+    :return: (N, 128) float32 encodings, their labels and the encoder settings they were made with.
+    """
+    with np.load(path, allow_pickle=False) as data:
+        if int(data["version"]) != GALLERY_VERSION:
+            raise ValueError(f"Unsupported gallery file version {int(data['version'])} in {path}")
+        names = [str(name) for name in data["names"]]
+        labels = [names[i] for i in data["labelIndex"]]
+        return data["encodings"].astype(np.float32), labels, str(data["params"])
+
+
+def is_gallery_file(path: str) -> bool:
+    return Path(path).suffix.lower() == ".npz" and Path(path).is_file()
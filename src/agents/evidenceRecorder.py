@@ -0,0 +1,271 @@
+import json
+import logging
+import math
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+Box = Tuple[int, int, int, int]
+
+
+@dataclass
+class Incident:
+    """An open recording: frames from start to end (time.monotonic) go into one clip."""
+    name: str
+    start: float
+    end: float
+    events: List[Dict[str, Any]] = field(default_factory=list)
+    crops: List[Tuple[float, List[Box]]] = field(default_factory=list)
+
+
+class EvidenceRecorder:
+    def __init__(self, name: str, outputDir: str, preRollSeconds: float = 5.0, postRollSeconds: float = 5.0,
+                 fps: float = 10.0, maxWidth: int = 640, maxMegabytes: float = 64.0, codec: str = "mp4v",
+                 saveCrops: bool = True):
+        """
+        Keeps the last seconds of a camera in a fixed in-memory ring and, on an event, writes the
+        pre-roll plus a post-roll window to a video file with crops of the faces involved.
+
+        The ring is one preallocated uint8 array, sized on the first frame: frames are downscaled
+        to maxWidth, kept at up to fps, and the number of slots is capped so that the ring never
+        exceeds maxMegabytes. Adding a frame copies it into its slot without allocating. Video
+        encoding and file writes happen on a background thread, which reads frames out of the
+        ring as they arrive; frames it falls too far behind on are counted as dropped.
+
+        :param name: Camera name, used in file names.
+        :param outputDir: Directory receiving one folder per incident.
+        :param preRollSeconds: Seconds recorded before an event.
+        :param postRollSeconds: Seconds recorded after the last event of an incident.
+        :param fps: Maximum recorded frame rate.
+        :param maxWidth: Frames wider than this are downscaled before being kept.
+        :param maxMegabytes: Upper bound of the ring's memory.
+        :param codec: FourCC of the video codec.
+        :param saveCrops: Whether to save the faces involved as JPEG files.
+        """
+        self.name = name
+        self.outputDir = Path(outputDir)
+        self.preRollSeconds = preRollSeconds
+        self.postRollSeconds = postRollSeconds
+        self.fps = fps
+        self.maxWidth = maxWidth
+        self.maxBytes = int(maxMegabytes * 1024 * 1024)
+        self.codec = codec
+        self.saveCrops = saveCrops
+        self.frames: Optional[np.ndarray] = None
+        self.timestamps: Optional[np.ndarray] = None
+        self.scale = 1.0
+        # Sequence number of the next frame; frame n lives in slot n % slots
+        self.written = 0
+        self.dropped = 0
+        self.incidents = 0
+        self._nextDue = float("-inf")
+        self._condition = threading.Condition()
+        self._incident: Optional[Incident] = None
+        self._running = False
+        self._thread = None
+
+    @classmethod
+    def from_config(cls, name: str, evidenceConfig: Optional[Dict[str, Any]] = None) -> "EvidenceRecorder":
+        evidenceConfig = evidenceConfig or {}
+        return cls(
+            name,
+            evidenceConfig.get("dir", "data/evidence"),
+            preRollSeconds=evidenceConfig.get("preRollSeconds", 5.0),
+            postRollSeconds=evidenceConfig.get("postRollSeconds", 5.0),
+            fps=evidenceConfig.get("fps", 10.0),
+            maxWidth=evidenceConfig.get("maxWidth", 640),
+            maxMegabytes=evidenceConfig.get("maxMegabytes", 64.0),
+            codec=evidenceConfig.get("codec", "mp4v"),
+            saveCrops=evidenceConfig.get("saveCrops", True),
+        )
+
+    @property
+    def slots(self) -> int:
+        return 0 if self.frames is None else len(self.frames)
+
+    def _allocate(self, image: np.ndarray) -> None:
+        height, width = image.shape[:2]
+        self.scale = min(1.0, self.maxWidth / width) if self.maxWidth else 1.0
+        shape = (max(1, round(height * self.scale)), max(1, round(width * self.scale))) + image.shape[2:]
+        frameBytes = int(np.prod(shape))
+        wanted = math.ceil((self.preRollSeconds + self.postRollSeconds) * self.fps) + 1
+        slots = max(2, min(wanted, self.maxBytes // frameBytes))
+        if slots < wanted:
+            logger.warning(f"Evidence ring of {self.name} holds {slots / self.fps:.1f} s instead of "
+                           f"{wanted / self.fps:.1f} s within {self.maxBytes / 1048576:.0f} MB")
+        self.frames = np.zeros((slots,) + shape, dtype=np.uint8)
+        self.timestamps = np.full(slots, -np.inf)
+        logger.info(f"Evidence ring of {self.name}: {slots} frames of {shape[1]}x{shape[0]}, "
+                    f"{self.frames.nbytes / 1048576:.1f} MB")
+
+    def add(self, image: np.ndarray, timestamp: float) -> None:
+        """Keep a captured frame; called on the capture thread, so it only copies into the ring."""
+        with self._condition:
+            if self.frames is None:
+                self._allocate(image)
+            elif image.shape[2:] != self.frames.shape[3:]:
+                return
+            # Keep frames on a 1 / fps grid, so the clip plays back at the recorded speed
+            interval = 1.0 / self.fps
+            if timestamp < self._nextDue - 0.1 * interval:
+                return
+            self._nextDue = max(self._nextDue + interval, timestamp)
+            slot = self.written % self.slots
+            height, width = self.frames.shape[1:3]
+            if image.shape[:2] == (height, width):
+                np.copyto(self.frames[slot], image)
+            else:
+                cv2.resize(image, (width, height), dst=self.frames[slot], interpolation=cv2.INTER_AREA)
+            self.timestamps[slot] = timestamp
+            self.written += 1
+            self._condition.notify_all()
+
+    def trigger(self, event: str, boxes: Sequence[Box] = (), timestamp: Optional[float] = None,
+                details: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Record an event: opens an incident covering the pre-roll, or extends the open one.
+
+        :param event: Event name, e.g. "unknown-face".
+        :param boxes: Face boxes (top, right, bottom, left) in capture coordinates to crop.
+        :param timestamp: Capture time of the frame showing the event; defaults to now.
+        :param details: Extra data stored with the event in incident.json.
+        """
+        timestamp = time.monotonic() if timestamp is None else timestamp
+        with self._condition:
+            if self._incident is None:
+                stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                self._incident = Incident(f"{stamp}_{self.name}_{event}", timestamp - self.preRollSeconds,
+                                          timestamp + self.postRollSeconds)
+                self.incidents += 1
+            incident = self._incident
+            incident.end = max(incident.end, timestamp + self.postRollSeconds)
+            incident.events.append(dict(details or {}, event=event, at=time.time()))
+            if self.saveCrops and boxes:
+                incident.crops.append((timestamp, list(boxes)))
+            self._condition.notify_all()
+        logger.info(f"Recording evidence of {event} on {self.name}")
+
+    def start(self) -> "EvidenceRecorder":
+        with self._condition:
+            if self._running:
+                return self
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name=f"EvidenceWriter-{self.name}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Stop the writer; an open incident is closed with the frames recorded so far."""
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._incident is not None or not self._running)
+                if self._incident is None:
+                    return
+                incident = self._incident
+            try:
+                self._write(incident)
+            except Exception as e:
+                logger.error(f"Failed to write evidence {incident.name}: {e}")
+            with self._condition:
+                self._close(incident)
+
+    def _next_frame(self, sequence: int, incident: Incident, scratch: np.ndarray) -> Tuple[int, Optional[float]]:
+        """
+        Copy the first frame at or after sequence that falls in the incident into scratch.
+
+        :return: The sequence number after it and its timestamp, or None once the incident has ended.
+        """
+        with self._condition:
+            while True:
+                if sequence < self.written - self.slots:
+                    # The capture thread has overwritten these frames
+                    self.dropped += self.written - self.slots - sequence
+                    sequence = self.written - self.slots
+                if sequence < self.written:
+                    timestamp = float(self.timestamps[sequence % self.slots])
+                    if timestamp > incident.end:
+                        self._close(incident)
+                        return sequence, None
+                    np.copyto(scratch, self.frames[sequence % self.slots])
+                    return sequence + 1, timestamp
+                if not self._running or time.monotonic() > incident.end:
+                    self._close(incident)
+                    return sequence, None
+                self._condition.wait(timeout=0.2)
+
+    def _close(self, incident: Incident) -> None:
+        # Called with the lock held; later events open a new incident
+        if self._incident is incident:
+            self._incident = None
+
+    def _write(self, incident: Incident) -> None:
+        with self._condition:
+            # Oldest frame still in the ring within the pre-roll
+            sequence = max(0, self.written - self.slots)
+            while sequence < self.written and self.timestamps[sequence % self.slots] < incident.start:
+                sequence += 1
+            shape = self.frames.shape[1:] if self.frames is not None else None
+            droppedBefore = self.dropped
+        if shape is None:
+            return
+        folder = self.outputDir / incident.name
+        folder.mkdir(parents=True, exist_ok=True)
+        scratch = np.empty(shape, dtype=np.uint8)
+        writer = cv2.VideoWriter(str(folder / "clip.mp4"), cv2.VideoWriter_fourcc(*self.codec), self.fps,
+                                 (shape[1], shape[0]))
+        frames, first, last, cropped = 0, None, None, 0
+        try:
+            while True:
+                sequence, timestamp = self._next_frame(sequence, incident, scratch)
+                if timestamp is None:
+                    break
+                writer.write(scratch)
+                frames += 1
+                first = timestamp if first is None else first
+                last = timestamp
+                with self._condition:
+                    pending = [crop for crop in incident.crops if crop[0] <= timestamp]
+                    incident.crops = [crop for crop in incident.crops if crop[0] > timestamp]
+                for _, boxes in pending:
+                    cropped += self._save_crops(folder, scratch, boxes, cropped)
+        finally:
+            writer.release()
+        with self._condition:
+            events = list(incident.events)
+        summary = {
+            "camera": self.name,
+            "events": events,
+            "frames": frames,
+            "seconds": (last - first) if frames else 0.0,
+            "faceCrops": cropped,
+            "droppedFrames": self.dropped - droppedBefore,
+        }
+        (folder / "incident.json").write_text(json.dumps(summary, indent=2))
+        logger.info(f"Evidence {incident.name}: {frames} frames, {cropped} face crops written to {folder}")
+
+    def _save_crops(self, folder: Path, image: np.ndarray, boxes: Sequence[Box], start: int) -> int:
+        saved = 0
+        height, width = image.shape[:2]
+        for top, right, bottom, left in boxes:
+            top, bottom = max(0, int(top * self.scale)), min(height, int(bottom * self.scale))
+            left, right = max(0, int(left * self.scale)), min(width, int(right * self.scale))
+            if bottom > top and right > left:
+                cv2.imwrite(str(folder / f"face_{start + saved:03d}.jpg"), image[top:bottom, left:right])
+                saved += 1
+        return saved
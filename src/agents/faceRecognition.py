@@ -1,53 +1,302 @@
 import logging
-from typing import List, Optional
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
 from PIL import Image
-from face_recognition import load_image_file, face_encodings, compare_faces, face_locations
 import numpy as np
 from pathlib import Path
 import cv2
+from src.agents.encodingStore import EncodingStore
+from src.agents.enrollment import is_gallery_file, load_gallery
+from src.agents.galleryIndex import Gallery, build_index
+from src.metrics import get_metrics
+
+
+def _face_recognition():
+    """Import face_recognition on first use; importing it loads the dlib models."""
+    import face_recognition
+    return face_recognition
+
+
+@dataclass(frozen=True)
+class FaceMatch:
+    """Best gallery match for one detected face."""
+    label: Optional[str]
+    distance: float
+    isKnown: bool
+    location: Optional[Tuple[int, int, int, int]] = None
+
 
 class FaceRecognition:
-    def __init__(self, known_faces: Optional[List[np.ndarray]] = None, tolerance: float = 0.6):
+    STAGES = ("convert", "detect", "encode", "match")
+
+    def __init__(self, known_faces: Optional[List[np.ndarray]] = None, tolerance: float = 0.6,
+                 known_labels: Optional[List[str]] = None, detectionScale: float = 1.0,
+                 detectionModel: str = "hog", upsample: int = 1, numJitters: int = 1,
+                 landmarkModel: str = "small", indexConfig: Optional[Dict[str, Any]] = None):
         """
         Initialize the FaceRecognition with known faces and a tolerance level.
 
         :param known_faces: List of known face encodings.
         :param tolerance: Tolerance for face comparison.
+        :param known_labels: Identity label for each known face encoding.
+        :param detectionScale: Factor frames are downscaled by before face detection.
+        :param detectionModel: Face detector, "hog" (CPU) or "cnn" (accurate, needs a GPU to be fast).
+        :param upsample: Number of times the detector upsamples the image to find small faces.
+        :param numJitters: Number of re-samplings averaged when encoding a face.
+        :param landmarkModel: Landmark model used for encoding alignment, "small" or "large".
+        :param indexConfig: Gallery index settings (see galleryIndex.build_index); exact search by default.
         """
-        self.known_faces = known_faces if known_faces is not None else []
+        if not 0 < detectionScale <= 1:
+            raise ValueError(f"detectionScale must be in (0, 1], got {detectionScale}")
+        self.indexConfig = indexConfig or {}
+        self.gallery = build_index(Gallery(known_faces, known_labels), self.indexConfig)
+        # Serializes gallery updates; matching reads self.gallery once and never waits
+        self._galleryLock = threading.Lock()
         self.tolerance = tolerance
+        self.detectionScale = detectionScale
+        self.detectionModel = detectionModel
+        self.upsample = upsample
+        self.numJitters = numJitters
+        self.landmarkModel = landmarkModel
+        self.lastTimings = dict.fromkeys(self.STAGES, 0.0)
+        self.totalTimings = dict.fromkeys(self.STAGES, 0.0)
+        # Recent per-stage durations, for percentiles
+        self.timingSamples = {stage: deque(maxlen=2048) for stage in self.STAGES}
+        self.framesProcessed = 0
         self.logger = logging.getLogger(__name__)
 
-    def add_known_face(self, trustedFacesPath: str):
+    @classmethod
+    def from_config(cls, recognitionConfig: Optional[Dict[str, Any]] = None) -> "FaceRecognition":
+        """
+        Create a FaceRecognition from the recognition section of the configuration.
+
+        :param recognitionConfig: Mapping of constructor keyword arguments.
+        """
+        recognitionConfig = recognitionConfig or {}
+        return cls(
+            tolerance=recognitionConfig.get("tolerance", 0.6),
+            detectionScale=recognitionConfig.get("detectionScale", 1.0),
+            detectionModel=recognitionConfig.get("detectionModel", "hog"),
+            upsample=recognitionConfig.get("upsample", 1),
+            numJitters=recognitionConfig.get("numJitters", 1),
+            landmarkModel=recognitionConfig.get("landmarkModel", "small"),
+            indexConfig=recognitionConfig.get("index"),
+        )
+
+    @property
+    def encoder_params(self) -> str:
+        """Encoder settings that change the value of an encoding, used to key the encoding store."""
+        return f"numJitters={self.numJitters};landmarkModel={self.landmarkModel}"
+
+    def warm_up(self) -> None:
+        """Load the detection and encoding models by running them once on a blank image."""
+        blank = np.zeros((64, 64, 3), dtype=np.uint8)
+        self.detect_faces(blank)
+        self.encode_faces(blank, [(8, 56, 56, 8)])
+
+    @property
+    def known_faces(self) -> np.ndarray:
+        """Known face encodings as an (N, 128) float32 matrix."""
+        return self.gallery.encodings
+
+    def add_known_face(self, trustedFacesPath: str, cachePath: Optional[str] = None):
+        """
+        Add known faces from the images in a directory, or from a gallery file written by
+        scripts/enrollFaces.py.
+
+        :param trustedFacesPath: Path to the directory containing the trusted face images,
+            or to a .npz gallery file.
+        :param cachePath: Optional path of a persistent encoding store. Unchanged images are
+            loaded from it instead of being re-encoded.
+        """
+        encodings, labels = [], []
+        if is_gallery_file(trustedFacesPath):
+            encodings, labels, params = load_gallery(trustedFacesPath)
+            if params != self.encoder_params:
+                self.logger.warning(f"Gallery {trustedFacesPath} was encoded with {params}, not {self.encoder_params}")
+        elif cachePath:
+            store = EncodingStore(cachePath, params=self.encoder_params)
+            for entry in store.sync(trustedFacesPath, self.encode_image_file):
+                if entry.encoding is not None:
+                    encodings.append(entry.encoding)
+                    labels.append(Path(entry.path).stem)
+        else:
+            for image in Path(trustedFacesPath).glob('*'):
+                encoding = self.encode_image_file(image)
+                if encoding is not None:
+                    encodings.append(encoding)
+                    labels.append(image.stem)
+                    # self.logger.info(f"Added known face {image} from {trustedFacesPath}")
+        self.gallery = build_index(self.gallery.extended(encodings, labels), self.indexConfig)
+
+    def replace_known_faces(self, labels: Iterable[str], encodings: Sequence[np.ndarray], newLabels: Sequence[str]) -> None:
+        """
+        Replace the known faces of some labels. The new gallery is built aside and swapped in
+        with one assignment, so a concurrent match sees either the old or the new gallery.
+
+        :param labels: Labels whose encodings are removed.
+        :param encodings: Encodings added in their place.
+        :param newLabels: Label of each added encoding.
+        """
+        with self._galleryLock:
+            self.gallery = build_index(self.gallery.removed(labels).extended(encodings, newLabels), self.indexConfig)
+
+    def encode_image_file(self, imagePath: Path) -> Optional[np.ndarray]:
+        """
+        Encode the first face found in an image file.
+
+        :param imagePath: Path to the image file.
+        :return: The face encoding, or None if no face is found.
+        """
+        image = _face_recognition().load_image_file(str(imagePath))
+        encodings = _face_recognition().face_encodings(image, num_jitters=self.numJitters, model=self.landmarkModel)
+        if encodings:
+            return encodings[0]
+        self.logger.warning(f"No faces found in {imagePath}")
+        return None
+
+    def detect_faces(self, rgbImage: np.ndarray) -> List[Tuple[int, int, int, int]]:
         """
-        Add a known face from an image file.
+        Detect faces on a downscaled copy of an image and map the boxes back to full resolution.
 
-        :param trustedFacesPath: Path to the image file containing the face.
+        :param rgbImage: RGB image.
+        :return: Face boxes as (top, right, bottom, left) in full-resolution coordinates.
         """
-        for image in Path(trustedFacesPath).glob('*'):
-            image = load_image_file(str(image))
-            encodings = face_encodings(image)
-            if encodings:
-                self.known_faces.append(encodings[0])
-                # self.logger.info(f"Added known face {image} from {trustedFacesPath}")
-            else:
-                self.logger.warning(f"No faces found in {trustedFacesPath}")
+        scale = self.detectionScale
+        small = rgbImage if scale == 1 else cv2.resize(rgbImage, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        boxes = _face_recognition().face_locations(small, number_of_times_to_upsample=self.upsample, model=self.detectionModel)
+        if scale == 1:
+            return boxes
+        height, width = rgbImage.shape[:2]
+        return [
+            (
+                max(0, int(round(top / scale))),
+                min(width, int(round(right / scale))),
+                min(height, int(round(bottom / scale))),
+                max(0, int(round(left / scale))),
+            )
+            for top, right, bottom, left in boxes
+        ]
+
+    def encode_faces(self, rgbImage: np.ndarray, boxes: Sequence[Tuple[int, int, int, int]]) -> List[np.ndarray]:
+        """
+        Encode only the given face regions of a full-resolution image.
+
+        :param rgbImage: RGB image.
+        :param boxes: Face boxes as (top, right, bottom, left).
+        :return: One 128-D encoding per box.
+        """
+        if not boxes:
+            return []
+        return _face_recognition().face_encodings(rgbImage, known_face_locations=list(boxes), num_jitters=self.numJitters, model=self.landmarkModel)
+
+    def match_encodings(self, unknownEncodings: Sequence[np.ndarray],
+                        locations: Optional[Sequence[Tuple[int, int, int, int]]] = None) -> List[FaceMatch]:
+        """
+        Match face encodings against the gallery in a single batched distance computation.
+
+        :param unknownEncodings: Face encodings to identify.
+        :param locations: Optional face box for each encoding, copied into the results.
+        :return: Best identity label and distance for each encoding.
+        """
+        if len(unknownEncodings) == 0:
+            return []
+        gallery = self.gallery
+        best, distances = gallery.nearest(np.asarray(unknownEncodings))
+        locations = locations if locations is not None else [None] * len(best)
+        return [
+            FaceMatch(
+                label=gallery.labels[index] if index >= 0 else None,
+                distance=float(distance),
+                isKnown=bool(distance <= self.tolerance),
+                location=location,
+            )
+            for index, distance, location in zip(best, distances, locations)
+        ]
+
+    def detect(self, image: cv2.Mat, bgr: bool = True,
+               region: Optional[Tuple[int, int, int, int]] = None) -> Tuple[np.ndarray, List[Tuple[int, int, int, int]]]:
+        """
+        Run the convert and detect stages on a frame.
+
+        :param image: The image to find faces in.
+        :param bgr: Whether the image is in OpenCV BGR channel order.
+        :param region: Optional (top, right, bottom, left) area to search; face boxes are
+            still returned in whole-image coordinates.
+        :return: The RGB image and the detected face boxes.
+        """
+        start = time.perf_counter()
+        rgbImage = cv2.cvtColor(image, cv2.COLOR_BGR2RGB) if bgr else image
+        now = time.perf_counter()
+        self._record("convert", now - start)
+
+        if region is None:
+            boxes = self.detect_faces(rgbImage)
+        else:
+            top, right, bottom, left = region
+            crop = rgbImage[top:bottom, left:right]
+            boxes = self.detect_faces(crop) if crop.size else []
+            boxes = [(t + top, r + left, b + top, l + left) for t, r, b, l in boxes]
+        self._record("detect", time.perf_counter() - now)
+        self.framesProcessed += 1
+        return rgbImage, boxes
+
+    def identify_boxes(self, rgbImage: np.ndarray, boxes: Sequence[Tuple[int, int, int, int]]) -> List[FaceMatch]:
+        """
+        Run the encode and match stages for the given face boxes.
+
+        :param rgbImage: RGB image returned by detect().
+        :param boxes: Face boxes as (top, right, bottom, left).
+        :return: Best gallery match for each box.
+        """
+        start = time.perf_counter()
+        encodings = self.encode_faces(rgbImage, boxes)
+        now = time.perf_counter()
+        self._record("encode", now - start)
+        matches = self.match_encodings(encodings, boxes)
+        self._record("match", time.perf_counter() - now)
+        return matches
+
+    def _record(self, stage: str, duration: float) -> None:
+        self.lastTimings[stage] = duration
+        self.totalTimings[stage] += duration
+        self.timingSamples[stage].append(duration)
+        get_metrics().observe("recognition_stage_seconds", duration, stage=stage)
+
+    def identify_faces(self, image: cv2.Mat, bgr: bool = True,
+                       region: Optional[Tuple[int, int, int, int]] = None) -> List[FaceMatch]:
+        """
+        Identify faces in the given image: convert, detect downscaled, encode the face regions, match.
+
+        Per-stage durations in seconds are kept in lastTimings and timingSamples and accumulated
+        in totalTimings.
+
+        :param image: The image to identify faces in.
+        :param bgr: Whether the image is in OpenCV BGR channel order.
+        :param region: Optional (top, right, bottom, left) area to search; face boxes are
+            still returned in whole-image coordinates.
+        :return: Best gallery match for each detected face.
+        """
+        rgbImage, boxes = self.detect(image, bgr=bgr, region=region)
+        return self.identify_boxes(rgbImage, boxes)
+
+    def mean_timings(self) -> Dict[str, float]:
+        """Mean per-stage duration in seconds per processed frame, including frames whose faces were not encoded."""
+        count = max(1, self.framesProcessed)
+        return {stage: total / count for stage, total in self.totalTimings.items()}
 
-    def recognize_faces(self, image: cv2.Mat) -> List[bool]:
+    def recognize_faces(self, image: cv2.Mat, region: Optional[Tuple[int, int, int, int]] = None) -> List[bool]:
         """
         Recognize faces in the given image.
 
         :param image: The image to recognize faces in.
+        :param region: Optional (top, right, bottom, left) area to search.
         :return: List of booleans indicating if each detected face matches a known face.
         """
-        unknown_encodings = face_encodings(image)
-        
-        results = []
-        for unknown_encoding in unknown_encodings:
-            matches = compare_faces(self.known_faces, unknown_encoding, tolerance=self.tolerance)
-            results.append(any(matches))
-        
-        return results
+        return [match.isKnown for match in self.identify_faces(image, region=region)]
 
     def get_face_locations(self, image_path: str) -> List[tuple]:
         """
@@ -56,6 +305,6 @@ class FaceRecognition:
         :param image_path: Path to the image file to find face locations in.
         :return: List of tuples representing the locations of detected faces.
         """
-        image = load_image_file(image_path)
-        locations = face_locations(image)
-        return locations
\ No newline at end of file
+        image = _face_recognition().load_image_file(image_path)
+        locations = _face_recognition().face_locations(image)
+        return locations
@@ -0,0 +1,185 @@
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.agents.faceRecognition import FaceRecognition
+
+logger = logging.getLogger(__name__)
+
+Box = Tuple[int, int, int, int]
+
+
+@dataclass
+class Track:
+    """A face followed across frames together with its last identity verdict."""
+    trackId: int
+    box: Box
+    firstSeen: float
+    lastSeen: float
+    label: Optional[str] = None
+    distance: float = float("inf")
+    isKnown: Optional[bool] = None
+    lastVerified: float = float("-inf")
+    verifications: int = 0
+    hits: int = 1
+
+
+def iou_matrix(boxesA: Sequence[Box], boxesB: Sequence[Box]) -> np.ndarray:
+    """
+    Intersection over union of every pair of (top, right, bottom, left) boxes.
+
+    :return: Array of shape (len(boxesA), len(boxesB)).
+    """
+    if len(boxesA) == 0 or len(boxesB) == 0:
+        return np.zeros((len(boxesA), len(boxesB)), dtype=np.float32)
+    a = np.asarray(boxesA, dtype=np.float32)[:, np.newaxis, :]
+    b = np.asarray(boxesB, dtype=np.float32)[np.newaxis, :, :]
+    height = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    width = np.clip(np.minimum(a[..., 1], b[..., 1]) - np.maximum(a[..., 3], b[..., 3]), 0, None)
+    intersection = height * width
+    areaA = (a[..., 2] - a[..., 0]) * (a[..., 1] - a[..., 3])
+    areaB = (b[..., 2] - b[..., 0]) * (b[..., 1] - b[..., 3])
+    return intersection / np.maximum(areaA + areaB - intersection, 1e-6)
+
+
+class FaceTracker:
+    def __init__(self, faceRecognition: FaceRecognition, iouThreshold: float = 0.3,
+                 ttlSeconds: float = 1.0, reverifySeconds: float = 5.0):
+        """
+        IoU tracker that caches each face's identity so it is only re-encoded periodically.
+
+        Every frame still runs face detection, but detected boxes are associated with existing
+        tracks; only new tracks and tracks whose verdict is older than reverifySeconds are
+        encoded and matched against the gallery.
+
+        :param faceRecognition: Recognizer providing the detect and identify stages.
+        :param iouThreshold: Minimum overlap for a detection to continue a track.
+        :param ttlSeconds: Time a track survives without a matching detection.
+        :param reverifySeconds: Maximum age of a track's identity verdict.
+        """
+        self.faceRecognition = faceRecognition
+        self.iouThreshold = iouThreshold
+        self.ttlSeconds = ttlSeconds
+        self.reverifySeconds = reverifySeconds
+        self.tracks: List[Track] = []
+        self._nextId = 0
+        self.facesEncoded = 0
+        self.encodingsSkipped = 0
+
+    @classmethod
+    def from_config(cls, faceRecognition: FaceRecognition, trackingConfig: Optional[Dict[str, Any]] = None) -> "FaceTracker":
+        """
+        Create a FaceTracker from the tracking section of the configuration.
+
+        :param faceRecognition: Recognizer providing the detect and identify stages.
+        :param trackingConfig: Mapping with iouThreshold, ttlSeconds and reverifySeconds.
+        """
+        trackingConfig = trackingConfig or {}
+        return cls(
+            faceRecognition,
+            iouThreshold=trackingConfig.get("iouThreshold", 0.3),
+            ttlSeconds=trackingConfig.get("ttlSeconds", 1.0),
+            reverifySeconds=trackingConfig.get("reverifySeconds", 5.0),
+        )
+
+    def reset(self) -> None:
+        """Drop all tracks so every face is verified again on the next update."""
+        self.tracks = []
+
+    def _associate(self, boxes: Sequence[Box]) -> Dict[int, Track]:
+        overlaps = iou_matrix([track.box for track in self.tracks], boxes)
+        assigned = {}
+        usedTracks = set()
+        # Greedy assignment, highest overlap first
+        for flat in np.argsort(overlaps, axis=None)[::-1]:
+            trackIndex, boxIndex = np.unravel_index(flat, overlaps.shape)
+            if overlaps[trackIndex, boxIndex] < self.iouThreshold:
+                break
+            if trackIndex in usedTracks or boxIndex in assigned:
+                continue
+            usedTracks.add(trackIndex)
+            assigned[int(boxIndex)] = self.tracks[trackIndex]
+        return assigned
+
+    def update(self, image: np.ndarray, region: Optional[Box] = None, bgr: bool = True,
+               now: Optional[float] = None) -> List[Track]:
+        """
+        Detect faces in a frame, update the tracks and verify the ones that need it.
+
+        :param image: The frame.
+        :param region: Optional (top, right, bottom, left) area to search.
+        :param bgr: Whether the image is in OpenCV BGR channel order.
+        :param now: Timestamp of the frame; defaults to time.monotonic().
+        :return: All live tracks.
+        """
+        now = time.monotonic() if now is None else now
+        rgbImage, boxes = self.faceRecognition.detect(image, bgr=bgr, region=region)
+        assigned = self._associate(boxes)
+
+        toVerify = []
+        for boxIndex, box in enumerate(boxes):
+            track = assigned.get(boxIndex)
+            if track is None:
+                track = Track(self._nextId, box, firstSeen=now, lastSeen=now)
+                self._nextId += 1
+                self.tracks.append(track)
+            else:
+                track.box = box
+                track.lastSeen = now
+                track.hits += 1
+            if track.isKnown is None or now - track.lastVerified >= self.reverifySeconds:
+                toVerify.append(track)
+
+        if toVerify:
+            matches = self.faceRecognition.identify_boxes(rgbImage, [track.box for track in toVerify])
+            for track, match in zip(toVerify, matches):
+                track.label = match.label
+                track.distance = match.distance
+                track.isKnown = match.isKnown
+                track.lastVerified = now
+                track.verifications += 1
+        self.facesEncoded += len(toVerify)
+        self.encodingsSkipped += len(boxes) - len(toVerify)
+
+        self.tracks = [track for track in self.tracks if now - track.lastSeen <= self.ttlSeconds]
+        return list(self.tracks)
+
+    def ingest(self, matches: Sequence[Any], now: Optional[float] = None) -> List[Track]:
+        """
+        Update the tracks from faces that were already identified elsewhere (e.g. by recognition workers).
+
+        :param matches: FaceMatch results carrying a location.
+        :param now: Timestamp of the frame the matches come from; defaults to time.monotonic().
+        :return: All live tracks.
+        """
+        now = time.monotonic() if now is None else now
+        assigned = self._associate([match.location for match in matches])
+        for boxIndex, match in enumerate(matches):
+            track = assigned.get(boxIndex)
+            if track is None:
+                track = Track(self._nextId, match.location, firstSeen=now, lastSeen=now)
+                self._nextId += 1
+                self.tracks.append(track)
+            else:
+                track.box = match.location
+                track.lastSeen = now
+                track.hits += 1
+            track.label = match.label
+            track.distance = match.distance
+            track.isKnown = match.isKnown
+            track.lastVerified = now
+            track.verifications += 1
+        self.facesEncoded += len(matches)
+        self.tracks = [track for track in self.tracks if now - track.lastSeen <= self.ttlSeconds]
+        return list(self.tracks)
+
+    def stats(self) -> Dict[str, int]:
+        """Number of live tracks, faces encoded and encodings avoided by the identity cache."""
+        return {
+            "tracks": len(self.tracks),
+            "facesEncoded": self.facesEncoded,
+            "encodingsSkipped": self.encodingsSkipped,
+        }
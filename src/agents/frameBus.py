@@ -0,0 +1,392 @@
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RecognitionResult:
+    """Recognition output for one published frame."""
+    frameIndex: int
+    timestamp: float
+    matches: List[Any]
+    workerId: int
+    latency: float
+
+
+class SharedFrameRing:
+    def __init__(self, shape: Tuple[int, ...], slots: int = 8, name: Optional[str] = None):
+        """
+        Fixed number of uint8 frame slots in one multiprocessing.shared_memory block.
+
+        Slots are handed between processes by index, so frames are never pickled. The
+        process that creates the ring (name=None) owns it and must call unlink().
+
+        :param shape: Shape of every frame, e.g. (480, 640, 3).
+        :param slots: Number of frame slots.
+        :param name: Name of an existing ring to attach to.
+        """
+        self.shape = tuple(shape)
+        self.slots = slots
+        self.frameBytes = int(np.prod(self.shape))
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=self.frameBytes * slots)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.frames = np.ndarray((slots,) + self.shape, dtype=np.uint8, buffer=self.shm.buf)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def write(self, slot: int, image: np.ndarray) -> Tuple[float, int, int]:
+        """
+        Copy a frame into a slot. A frame of another shape is scaled to fit and letterboxed,
+        keeping its aspect ratio, so faces are not distorted before they are encoded.
+
+        :return: Scale and the top and left offsets mapping frame coordinates into the slot.
+        """
+        if image.shape == self.shape:
+            np.copyto(self.frames[slot], image)
+            return 1.0, 0, 0
+        height, width = self.shape[:2]
+        scale = min(height / image.shape[0], width / image.shape[1])
+        scaledHeight = min(height, max(1, round(image.shape[0] * scale)))
+        scaledWidth = min(width, max(1, round(image.shape[1] * scale)))
+        top, left = (height - scaledHeight) // 2, (width - scaledWidth) // 2
+        target = self.frames[slot]
+        target.fill(0)
+        target[top:top + scaledHeight, left:left + scaledWidth] = cv2.resize(image, (scaledWidth, scaledHeight))
+        return scale, top, left
+
+    def view(self, slot: int) -> np.ndarray:
+        """Zero-copy view of the frame in a slot."""
+        return self.frames[slot]
+
+    def close(self) -> None:
+        del self.frames
+        self.shm.close()
+
+    def unlink(self) -> None:
+        if self.owner:
+            self.shm.unlink()
+
+
+def _capture_main(cameraConfig, motionConfig, ringName, shape, slots, freeSlots, tasks, stopEvent, gateEnabled, counters,
+                  paced, credits):
+    """Capture process: read frames, gate them on motion and publish them into free ring slots."""
+    from src.agents.frameSource import create_frame_source
+    from src.agents.motionDetector import MotionDetector
+
+    ring = SharedFrameRing(shape, slots, name=ringName)
+    source = create_frame_source(cameraConfig)
+    motionDetector = MotionDetector.from_config(motionConfig)
+    try:
+        source.start()
+        while not stopEvent.is_set():
+            frame = source.read(timeout=0.5)
+            if frame is None:
+                if source.exhausted:
+                    break
+                continue
+            region = None
+            if gateEnabled.value:
+                motion = motionDetector.update(frame.image)
+                if not motion.active:
+                    with counters["gated"].get_lock():
+                        counters["gated"].value += 1
+                    continue
+                region = motion.region
+            if paced.value and not credits.acquire(block=False):
+                # Every recognition the consumer has allowed for is in flight
+                with counters["throttled"].get_lock():
+                    counters["throttled"].value += 1
+                continue
+            try:
+                slot = freeSlots.get_nowait()
+            except queue.Empty:
+                if paced.value:
+                    credits.release()
+                with counters["dropped"].get_lock():
+                    counters["dropped"].value += 1
+                continue
+            scale, offsetTop, offsetLeft = ring.write(slot, frame.image)
+            if region is not None and frame.image.shape != ring.shape:
+                top, right, bottom, left = region
+                region = (int(top * scale) + offsetTop, int(right * scale) + offsetLeft,
+                          int(bottom * scale) + offsetTop, int(left * scale) + offsetLeft)
+            tasks.put((slot, frame.index, frame.timestamp, region))
+            with counters["published"].get_lock():
+                counters["published"].value += 1
+    except Exception as e:
+        logger.error(f"Capture process failed: {e}")
+    finally:
+        source.stop()
+        ring.close()
+        stopEvent.set()
+
+
+def _put_latest(results, result, counters, paced, credits) -> None:
+    """Queue a result, dropping the oldest queued ones while the consumer is behind."""
+    while True:
+        try:
+            results.put_nowait(result)
+            return
+        except queue.Full:
+            pass
+        try:
+            results.get_nowait()
+        except queue.Empty:
+            continue
+        with counters["resultsDropped"].get_lock():
+            counters["resultsDropped"].value += 1
+        if paced.value:
+            # A dropped result will never be consumed, so it gives its recognition back
+            credits.release()
+
+
+def _worker_main(workerId, recognitionConfig, trustedFacesPath, cachePath, ringName, shape, slots, freeSlots, tasks, results,
+                 counters, paced, credits):
+    """Recognition worker: load the models and gallery once, then recognize frames in place in the ring."""
+    from src.agents.faceRecognition import FaceRecognition
+
+    faceRecognition = FaceRecognition.from_config(recognitionConfig)
+    if trustedFacesPath:
+        faceRecognition.add_known_face(trustedFacesPath, cachePath=cachePath)
+    ring = SharedFrameRing(shape, slots, name=ringName)
+    results.put(("ready", workerId))
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            slot, frameIndex, timestamp, region = task
+            try:
+                matches = faceRecognition.identify_faces(ring.view(slot), region=region)
+            except Exception as e:
+                logger.error(f"Worker {workerId} failed on frame {frameIndex}: {e}")
+                matches = []
+            finally:
+                freeSlots.put(slot)
+            _put_latest(results, RecognitionResult(frameIndex, timestamp, matches, workerId, time.monotonic() - timestamp),
+                        counters, paced, credits)
+    finally:
+        ring.close()
+
+
+class RecognitionPool:
+    def __init__(self, config: Dict[str, Any], trustedFacesPath: Optional[str] = None,
+                 cameraConfig: Optional[Dict[str, Any]] = None, cachePath: Optional[str] = None):
+        """
+        Capture process plus a pool of recognition worker processes sharing a frame ring.
+
+        The capture process writes frames into free slots of a SharedFrameRing and queues
+        only the slot index. Each worker holds its own dlib models and gallery, recognizes
+        the frame in place and returns the slot. When every slot is busy new frames are
+        dropped, and when the consumer falls behind by more than resultQueueSize results the
+        oldest are dropped, so results always describe recent frames. A collector thread moves
+        results into the consuming process and sets the waiters, so a consumer of several pools
+        and frame sources can wait on one event.
+
+        A paced pool only publishes a frame for each result consumed, with one frame per worker
+        to start with, so its recognitions cost no more CPU than its consumer allows; the
+        FrameScheduler paces pools to enforce its recognition budget.
+
+        :param config: Full configuration; uses the frameBus, recognition, motion and paths sections.
+        :param trustedFacesPath: Trusted faces directory; defaults to paths.trustedFaces.
+        :param cameraConfig: Frame source configuration; defaults to the camera section.
+        :param cachePath: Encoding store of the gallery; defaults to paths.encodingCache when
+            trustedFacesPath is not given.
+        """
+        busConfig = config.get("frameBus", {})
+        self.workers = busConfig.get("workers", max(1, multiprocessing.cpu_count() - 1))
+        self.slots = busConfig.get("slots", self.workers * 2)
+        self.resultQueueSize = max(self.workers, busConfig.get("resultQueueSize", self.slots))
+        self.shape = tuple(busConfig.get("frameShape", (480, 640, 3)))
+        self.cameraConfig = cameraConfig if cameraConfig is not None else config.get("camera", {})
+        self.motionConfig = config.get("motion", {})
+        self.recognitionConfig = config.get("recognition", {})
+        self.trustedFacesPath = trustedFacesPath or config.get("paths", {}).get("trustedFaces")
+        self.cachePath = cachePath if trustedFacesPath else config.get("paths", {}).get("encodingCache")
+        self._context = multiprocessing.get_context("spawn")
+        self._processes = []
+        self.ring = None
+        self.processed = 0
+        self.startedAt = None
+        # Set before start()
+        self.paced = False
+        # Set whenever a result arrives or capture ends
+        self.waiters: List[threading.Event] = []
+        self._received = deque(maxlen=self.resultQueueSize)
+        self._condition = threading.Condition()
+        self._collecting = threading.Event()
+        self._collector = None
+
+    @property
+    def running(self) -> bool:
+        return bool(self._processes)
+
+    @property
+    def exhausted(self) -> bool:
+        """True once the capture process has stopped and every result has been consumed."""
+        with self._condition:
+            received = bool(self._received)
+        return self.running and self._stopEvent.is_set() and self._results.empty() and not received
+
+    def _signal(self) -> None:
+        for waiter in self.waiters:
+            waiter.set()
+
+    def _release_credit(self) -> None:
+        if self.paced:
+            self._credits.release()
+
+    def _collect(self) -> None:
+        captureEnded = False
+        while self._collecting.is_set():
+            try:
+                result = self._results.get(timeout=0.2)
+            except queue.Empty:
+                if self._stopEvent.is_set() and not captureEnded:
+                    captureEnded = True
+                    self._signal()
+                continue
+            with self._condition:
+                if len(self._received) == self._received.maxlen:
+                    with self._counters["resultsDropped"].get_lock():
+                        self._counters["resultsDropped"].value += 1
+                    self._release_credit()
+                self._received.append(result)
+                self._condition.notify_all()
+            self._signal()
+
+    def start(self, readyTimeout: float = 120.0) -> "RecognitionPool":
+        """Start the capture and worker processes and wait until every worker has loaded its gallery."""
+        if self.running:
+            return self
+        ctx = self._context
+        self.ring = SharedFrameRing(self.shape, self.slots)
+        self._freeSlots = ctx.Queue()
+        for slot in range(self.slots):
+            self._freeSlots.put(slot)
+        self._tasks = ctx.Queue(maxsize=self.slots)
+        # Also carries the workers' ready messages, so it holds at least one per worker
+        self._results = ctx.Queue(maxsize=self.resultQueueSize)
+        self._stopEvent = ctx.Event()
+        self._gateEnabled = ctx.Value("b", 1)
+        self._counters = {key: ctx.Value("q", 0) for key in ("published", "dropped", "gated", "throttled", "resultsDropped")}
+        self._paced = ctx.Value("b", 1 if self.paced else 0)
+        self._credits = ctx.Semaphore(self.workers)
+
+        for workerId in range(self.workers):
+            process = ctx.Process(
+                target=_worker_main,
+                args=(workerId, self.recognitionConfig, self.trustedFacesPath, self.cachePath,
+                      self.ring.name, self.shape, self.slots, self._freeSlots, self._tasks, self._results,
+                      self._counters, self._paced, self._credits),
+                daemon=True,
+            )
+            process.start()
+            self._processes.append(process)
+        ready = 0
+        deadline = time.monotonic() + readyTimeout
+        while ready < self.workers:
+            try:
+                message = self._results.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                self.stop()
+                raise RuntimeError(f"Only {ready} of {self.workers} recognition workers started")
+            if isinstance(message, tuple) and message[0] == "ready":
+                ready += 1
+
+        capture = ctx.Process(
+            target=_capture_main,
+            args=(self.cameraConfig, self.motionConfig, self.ring.name, self.shape, self.slots,
+                  self._freeSlots, self._tasks, self._stopEvent, self._gateEnabled, self._counters,
+                  self._paced, self._credits),
+            daemon=True,
+        )
+        capture.start()
+        self._processes.append(capture)
+        self._received.clear()
+        self._collecting.set()
+        self._collector = threading.Thread(target=self._collect, name="RecognitionResults", daemon=True)
+        self._collector.start()
+        self.startedAt = time.monotonic()
+        self.processed = 0
+        logger.info(f"Recognition pool started with {self.workers} workers and {self.slots} frame slots.")
+        return self
+
+    def stop(self) -> None:
+        """Stop all processes and release the shared frame ring."""
+        if not self.running:
+            return
+        self._stopEvent.set()
+        for _ in range(self.workers):
+            try:
+                self._tasks.put(None, timeout=1.0)
+            except queue.Full:
+                break
+        for process in self._processes:
+            process.join(timeout=3.0)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
+        self._collecting.clear()
+        if self._collector is not None:
+            self._collector.join(timeout=1.0)
+            self._collector = None
+        self.ring.close()
+        self.ring.unlink()
+        self.ring = None
+        with self._condition:
+            self._condition.notify_all()
+        self._signal()
+
+    def set_motion_gate(self, enabled: bool) -> None:
+        """Enable or bypass the motion gate in the capture process."""
+        self._gateEnabled.value = 1 if enabled else 0
+
+    def pending(self) -> bool:
+        """Whether a recognition result is waiting to be consumed."""
+        with self._condition:
+            return self.running and bool(self._received)
+
+    def get_result(self, timeout: Optional[float] = 1.0) -> Optional[RecognitionResult]:
+        """
+        Return the next recognition result; a paced pool may then publish another frame.
+
+        :param timeout: Seconds to wait; None waits indefinitely.
+        :return: The result, or None on timeout.
+        """
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._received or not self.running, timeout=timeout):
+                return None
+            if not self._received:
+                return None
+            result = self._received.popleft()
+        self._release_credit()
+        self.processed += 1
+        return result
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Frames published, dropped for lack of a free slot, gated on motion, held back by pacing
+        and processed, results dropped unread, and throughput.
+        """
+        elapsed = time.monotonic() - self.startedAt if self.startedAt else 0.0
+        stats = {key: value.value for key, value in self._counters.items()} if self.running else {}
+        stats["processed"] = self.processed
+        stats["framesPerSecond"] = self.processed / elapsed if elapsed else 0.0
+        return stats
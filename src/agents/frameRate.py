@@ -0,0 +1,136 @@
+import logging
+import os
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveFrameRate:
+    def __init__(self, idleFps: float = 1.0, watchFps: float = 4.0, activeFps: float = 10.0,
+                 escalatedFps: Optional[float] = None, holdSeconds: float = 5.0):
+        """
+        Picks a camera's capture rate from what is happening in front of it.
+
+        A static scene is sampled at watchFps while guarding, which is enough for the motion
+        gate to notice someone walking in, and at idleFps otherwise. Motion raises the rate to
+        activeFps and an escalation to escalatedFps at once; the rate only drops back after
+        holdSeconds without either.
+
+        :param idleFps: Rate for a static scene when guard mode is off.
+        :param watchFps: Rate for a static scene while guarding.
+        :param activeFps: Rate while there is motion.
+        :param escalatedFps: Rate during an escalation; None reads as fast as the camera delivers.
+        :param holdSeconds: Seconds the higher rate is kept after the last motion or escalation.
+        """
+        self.idleFps = idleFps
+        self.watchFps = watchFps
+        self.activeFps = activeFps
+        self.escalatedFps = escalatedFps
+        self.holdSeconds = holdSeconds
+        self.fps: Optional[float] = watchFps
+        self._activeUntil = float("-inf")
+        self._escalatedUntil = float("-inf")
+        self.changes = 0
+
+    @classmethod
+    def from_config(cls, frameRateConfig: Optional[Dict[str, Any]] = None) -> Optional["AdaptiveFrameRate"]:
+        """
+        Create an AdaptiveFrameRate from the frameRate section of the configuration.
+
+        idleFps is not read: the guard streams only capture while guard mode is on.
+
+        :return: None when adaptive capture is disabled.
+        """
+        frameRateConfig = frameRateConfig or {}
+        if not frameRateConfig.get("enabled", False):
+            return None
+        return cls(
+            watchFps=frameRateConfig.get("watchFps", 4.0),
+            activeFps=frameRateConfig.get("activeFps", 10.0),
+            # 0 in the configuration means as fast as the camera delivers
+            escalatedFps=frameRateConfig.get("escalatedFps") or None,
+            holdSeconds=frameRateConfig.get("holdSeconds", 5.0),
+        )
+
+    def update(self, active: bool, escalating: bool = False, guarding: bool = True,
+               now: Optional[float] = None) -> Optional[float]:
+        """
+        Report the current activity and get the capture rate to use.
+
+        :param active: Whether the last frame showed motion.
+        :param escalating: Whether an escalation is in progress.
+        :param guarding: Whether guard mode is on.
+        :param now: time.monotonic() of the observation; defaults to now.
+        :return: Frames per second, or None for as fast as possible.
+        """
+        now = time.monotonic() if now is None else now
+        if escalating:
+            self._escalatedUntil = now + self.holdSeconds
+        if active:
+            self._activeUntil = now + self.holdSeconds
+        if now <= self._escalatedUntil:
+            fps = self.escalatedFps
+        elif now <= self._activeUntil:
+            fps = self.activeFps
+        else:
+            fps = self.watchFps if guarding else self.idleFps
+        if fps != self.fps:
+            logger.debug(f"Capture rate {self.fps} -> {fps} fps")
+            self.fps = fps
+            self.changes += 1
+        return fps
+
+
+class CpuBudget:
+    def __init__(self, percent: float, minInterval: float = 2.0, cpuCount: Optional[int] = None):
+        """
+        Keeps the agent's CPU use under a share of the machine by delaying recognitions.
+
+        The whole process is measured, capture, audio and speech included, with a token bucket
+        in CPU seconds: it refills at percent / 100 x cores per wall-clock second, holds at most
+        one second of that, and every CPU second the process spends is taken out of it. While
+        the bucket is in debt the next recognition waits, but never for more than minInterval
+        after the previous one, so a camera is not left unwatched by background load.
+
+        :param percent: Budget as a percentage of all cores, e.g. 50 on a 4-core box is 2 cores.
+        :param minInterval: Longest wait between two recognitions in seconds.
+        :param cpuCount: Number of cores; defaults to os.cpu_count().
+        """
+        self.percent = percent
+        self.cores = cpuCount or os.cpu_count() or 1
+        self.rate = percent / 100.0 * self.cores
+        self.minInterval = minInterval
+        self.credit = self.rate
+        self.throttledSeconds = 0.0
+        self._lastWall = self._usageWall = time.monotonic()
+        self._lastCpu = self._usageCpu = time.process_time()
+        self._lastService = float("-inf")
+
+    def _refill(self) -> None:
+        wall, cpu = time.monotonic(), time.process_time()
+        self.credit = min(self.rate, self.credit + (wall - self._lastWall) * self.rate - (cpu - self._lastCpu))
+        self._lastWall, self._lastCpu = wall, cpu
+
+    def delay(self) -> float:
+        """Seconds the next recognition has to wait to stay within the budget."""
+        self._refill()
+        if self.credit >= 0:
+            return 0.0
+        wait = -self.credit / self.rate
+        return max(0.0, min(wait, self._lastService + self.minInterval - time.monotonic()))
+
+    def wait(self) -> None:
+        """Sleep until the next recognition fits the budget, then count it as started."""
+        delay = self.delay()
+        if delay > 0:
+            time.sleep(delay)
+            self.throttledSeconds += delay
+        self._lastService = time.monotonic()
+
+    def usage(self) -> float:
+        """CPU use since the previous call as a percentage of all cores."""
+        wall, cpu = time.monotonic(), time.process_time()
+        used = (cpu - self._usageCpu) / max(1e-9, wall - self._usageWall) / self.cores * 100.0
+        self._usageWall, self._usageCpu = wall, cpu
+        return used
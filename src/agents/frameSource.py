@@ -0,0 +1,403 @@
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from src.agents.encodingStore import IMAGE_SUFFIXES
+from src.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Frame:
+    """A captured frame with its capture time (time.monotonic) and sequence index."""
+    image: np.ndarray
+    timestamp: float
+    index: int
+
+
+class FrameSource:
+    def __init__(self, fps: Optional[float] = None, bufferSize: int = 2, live: bool = True):
+        """
+        Base class for frame sources read on a background thread into a small ring buffer.
+
+        Subclasses implement _open, _grab and _close. Consumers call read(), which always
+        returns the newest frame not yet delivered; frames overwritten in between are
+        counted as dropped.
+
+        :param fps: Maximum read rate. None reads as fast as the backend delivers.
+        :param bufferSize: Number of recent frames kept in the ring buffer.
+        :param live: Live sources retry on read failures; others end when _grab returns None.
+        """
+        self.fps = fps
+        self.live = live
+        self.maxFailures = 30
+        self._buffer = deque(maxlen=max(1, bufferSize))
+        self._condition = threading.Condition()
+        self._thread = None
+        self._running = threading.Event()
+        # Set to cut short the wait between two reads, after a rate change or on stop
+        self._wake = threading.Event()
+        self.exhausted = False
+        self.framesRead = 0
+        self.framesDelivered = 0
+        self.readFailures = 0
+        self._lastDelivered = -1
+        # Called with (image, timestamp) for every captured frame, on the reader thread
+        self.listeners: List[Callable[[np.ndarray, float], None]] = []
+        # Set whenever a frame is buffered or the source ends, so consumers of several sources can wait on one event
+        self.waiters: List[threading.Event] = []
+
+    def _open(self) -> None:
+        pass
+
+    def _grab(self) -> Optional[np.ndarray]:
+        raise NotImplementedError
+
+    def _close(self) -> None:
+        pass
+
+    @property
+    def framesDropped(self) -> int:
+        """Frames captured but never delivered because a newer frame was read first."""
+        return self._lastDelivered + 1 - self.framesDelivered
+
+    @property
+    def running(self) -> bool:
+        return self._running.is_set()
+
+    def start(self) -> "FrameSource":
+        """Open the source and start the background reader. Calling it again is a no-op."""
+        if self._running.is_set():
+            return self
+        self._open()
+        self.exhausted = False
+        self._wake.clear()
+        self._running.set()
+        self._thread = threading.Thread(target=self._run, name=type(self).__name__, daemon=True)
+        self._thread.start()
+        return self
+
+    def set_fps(self, fps: Optional[float]) -> None:
+        """Change the read rate; takes effect at once, even while the reader waits for the next frame."""
+        if fps != self.fps:
+            self.fps = fps
+            self._wake.set()
+
+    def stop(self) -> None:
+        """Stop the background reader and release the source."""
+        self._running.clear()
+        self._wake.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2.0)
+        self._thread = None
+        with self._condition:
+            self._condition.notify_all()
+        self._signal()
+
+    def _signal(self) -> None:
+        for waiter in self.waiters:
+            waiter.set()
+
+    def __enter__(self) -> "FrameSource":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _run(self) -> None:
+        nextTick = time.monotonic()
+        failures = 0
+        try:
+            while self._running.is_set():
+                grabStart = time.perf_counter()
+                image = self._grab()
+                if image is None:
+                    if not self.live:
+                        break
+                    failures += 1
+                    self.readFailures += 1
+                    if failures >= self.maxFailures:
+                        logger.warning(f"{type(self).__name__}: {failures} consecutive read failures, reopening")
+                        self._close()
+                        self._open()
+                        failures = 0
+                    time.sleep(0.01)
+                    continue
+                failures = 0
+                metrics = get_metrics()
+                metrics.observe("frame_capture_seconds", time.perf_counter() - grabStart, source=type(self).__name__)
+                metrics.inc("frames_captured_total", source=type(self).__name__)
+                frame = Frame(image, time.monotonic(), self.framesRead)
+                with self._condition:
+                    self._buffer.append(frame)
+                    self.framesRead += 1
+                    self._condition.notify_all()
+                self._signal()
+                for listener in self.listeners:
+                    try:
+                        listener(frame.image, frame.timestamp)
+                    except Exception as e:
+                        # A failing consumer, e.g. the evidence recorder, must not stop capture
+                        logger.error(f"{type(self).__name__}: frame listener failed: {e}")
+                interval = 1.0 / self.fps if self.fps else 0.0
+                if interval:
+                    nextTick = max(nextTick + interval, time.monotonic() - interval)
+                    delay = nextTick - time.monotonic()
+                    if delay > 0 and self._wake.wait(delay):
+                        # A new rate counts from now, not from the end of the old interval
+                        nextTick = time.monotonic()
+                self._wake.clear()
+        except Exception as e:
+            logger.error(f"{type(self).__name__} reader failed: {e}")
+        finally:
+            self._close()
+            with self._condition:
+                self.exhausted = True
+                self._running.clear()
+                self._condition.notify_all()
+            self._signal()
+
+    def read(self, timeout: Optional[float] = 1.0) -> Optional[Frame]:
+        """
+        Return the newest frame that has not been delivered yet.
+
+        :param timeout: Seconds to wait for a new frame; None waits indefinitely.
+        :return: The frame, or None on timeout or when the source has ended.
+        """
+        if self._thread is None and not self.exhausted:
+            self.start()
+        with self._condition:
+            ready = self._condition.wait_for(
+                lambda: (self._buffer and self._buffer[-1].index > self._lastDelivered) or not self._running.is_set(),
+                timeout=timeout,
+            )
+            if not ready or not self._buffer or self._buffer[-1].index <= self._lastDelivered:
+                return None
+            frame = self._buffer[-1]
+            self._lastDelivered = frame.index
+            self.framesDelivered += 1
+            return frame
+
+    def pending(self) -> bool:
+        """Whether a frame newer than the last delivered one is buffered."""
+        with self._condition:
+            return bool(self._buffer) and self._buffer[-1].index > self._lastDelivered
+
+    def latest(self) -> Optional[Frame]:
+        """Return the newest buffered frame without waiting or marking it delivered."""
+        with self._condition:
+            return self._buffer[-1] if self._buffer else None
+
+    def stats(self) -> Dict[str, int]:
+        """Counters describing how many frames were read, delivered and dropped."""
+        return {
+            "framesRead": self.framesRead,
+            "framesDelivered": self.framesDelivered,
+            "framesDropped": self.framesDropped,
+            "readFailures": self.readFailures,
+        }
+
+
+class CameraFrameSource(FrameSource):
+    def __init__(self, index: int = 0, width: Optional[int] = None, height: Optional[int] = None, **kwargs):
+        """
+        Webcam source that keeps the device open for its whole lifetime.
+
+        :param index: OpenCV camera index.
+        :param width: Optional requested capture width.
+        :param height: Optional requested capture height.
+        """
+        super().__init__(live=True, **kwargs)
+        self.index = index
+        self.width = width
+        self.height = height
+        self.cap = None
+
+    def _open(self) -> None:
+        self.cap = cv2.VideoCapture(self.index)
+        if not self.cap.isOpened():
+            raise RuntimeError(f"Cannot open camera index {self.index}")
+        # Keep the driver queue short so frames are not stale when read.
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        if self.width:
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+        if self.height:
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+        logger.info(f"Camera {self.index} opened.")
+
+    def _grab(self) -> Optional[np.ndarray]:
+        ret, frame = self.cap.read()
+        return frame if ret else None
+
+    def _close(self) -> None:
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+
+class VideoFileFrameSource(FrameSource):
+    def __init__(self, path: str, loop: bool = False, fps: Optional[float] = None, realtime: bool = True, **kwargs):
+        """
+        Video file source.
+
+        :param path: Path to the video file.
+        :param loop: Restart from the beginning at the end of the file.
+        :param fps: Playback rate; defaults to the file's own frame rate.
+        :param realtime: Pace frames at the playback rate instead of reading flat out.
+        """
+        super().__init__(fps=fps, live=False, **kwargs)
+        self.path = path
+        self.loop = loop
+        self.realtime = realtime
+        self.cap = None
+
+    def _open(self) -> None:
+        self.cap = cv2.VideoCapture(self.path)
+        if not self.cap.isOpened():
+            raise RuntimeError(f"Cannot open video file {self.path}")
+        if self.fps is None and self.realtime:
+            self.fps = self.cap.get(cv2.CAP_PROP_FPS) or None
+        elif not self.realtime:
+            self.fps = None
+
+    def _grab(self) -> Optional[np.ndarray]:
+        ret, frame = self.cap.read()
+        if not ret and self.loop:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.cap.read()
+        return frame if ret else None
+
+    def _close(self) -> None:
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+
+class ImageDirectoryFrameSource(FrameSource):
+    def __init__(self, path: str, loop: bool = False, fps: Optional[float] = 5.0, **kwargs):
+        """
+        Source replaying the images of a directory in name order.
+
+        :param path: Directory containing the images.
+        :param loop: Restart from the first image after the last one.
+        :param fps: Playback rate; None reads flat out.
+        """
+        super().__init__(fps=fps, live=False, **kwargs)
+        self.path = path
+        self.loop = loop
+        self.images = []
+        self._position = 0
+
+    def _open(self) -> None:
+        self.images = sorted(p for p in Path(self.path).iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+        if not self.images:
+            raise RuntimeError(f"No images found in {self.path}")
+        self._position = 0
+
+    def _grab(self) -> Optional[np.ndarray]:
+        while True:
+            if self._position >= len(self.images):
+                if not self.loop:
+                    return None
+                self._position = 0
+            image = cv2.imread(str(self.images[self._position]))
+            self._position += 1
+            if image is not None:
+                return image
+            logger.warning(f"Skipping unreadable image {self.images[self._position - 1]}")
+
+
+class SyntheticFrameSource(FrameSource):
+    def __init__(self, width: int = 640, height: int = 480, fps: Optional[float] = 15.0,
+                 frames: Optional[int] = None, imagePath: Optional[str] = None, **kwargs):
+        """
+        Generated frames for headless runs: a still image or a plain background with a moving square.
+
+        :param width: Frame width.
+        :param height: Frame height.
+        :param fps: Generation rate; None generates flat out.
+        :param frames: Number of frames before the source ends; None never ends.
+        :param imagePath: Optional image repeated as every frame (e.g. a face photo).
+        """
+        super().__init__(fps=fps, live=False, **kwargs)
+        self.width = width
+        self.height = height
+        self.frames = frames
+        self.imagePath = imagePath
+        self._background = None
+        self._generated = 0
+
+    def _open(self) -> None:
+        self._generated = 0
+        if self.imagePath:
+            self._background = cv2.imread(self.imagePath)
+            if self._background is None:
+                raise RuntimeError(f"Cannot read image {self.imagePath}")
+        else:
+            self._background = np.full((self.height, self.width, 3), 96, dtype=np.uint8)
+
+    def _grab(self) -> Optional[np.ndarray]:
+        if self.frames is not None and self._generated >= self.frames:
+            return None
+        frame = self._background.copy()
+        if not self.imagePath:
+            height, width = frame.shape[:2]
+            size = max(8, min(height, width) // 8)
+            x = (self._generated * 4) % max(1, width - size)
+            y = height // 2 - size // 2
+            frame[y:y + size, x:x + size] = 255
+        self._generated += 1
+        return frame
+
+
+def create_frame_source(sourceConfig: Optional[Dict[str, Any]] = None) -> FrameSource:
+    """
+    Build a frame source from a camera configuration section.
+
+    :param sourceConfig: Mapping with "source" (camera, video, images or synthetic) and backend options.
+    :return: The frame source; it is started on first read().
+    """
+    sourceConfig = dict(sourceConfig or {})
+    kind = sourceConfig.pop("source", "camera")
+    common = {"bufferSize": sourceConfig.pop("bufferSize", 2)}
+    if kind == "camera":
+        return CameraFrameSource(
+            index=sourceConfig.get("index", 0),
+            width=sourceConfig.get("width"),
+            height=sourceConfig.get("height"),
+            fps=sourceConfig.get("fps"),
+            **common,
+        )
+    if kind == "video":
+        return VideoFileFrameSource(
+            sourceConfig["path"],
+            loop=sourceConfig.get("loop", False),
+            fps=sourceConfig.get("fps"),
+            realtime=sourceConfig.get("realtime", True),
+            **common,
+        )
+    if kind == "images":
+        return ImageDirectoryFrameSource(
+            sourceConfig["path"],
+            loop=sourceConfig.get("loop", False),
+            fps=sourceConfig.get("fps", 5.0),
+            **common,
+        )
+    if kind == "synthetic":
+        return SyntheticFrameSource(
+            width=sourceConfig.get("width", 640),
+            height=sourceConfig.get("height", 480),
+            fps=sourceConfig.get("fps", 15.0),
+            frames=sourceConfig.get("frames"),
+            imagePath=sourceConfig.get("path"),
+            **common,
+        )
+    raise ValueError(f"Unknown frame source type: {kind}")
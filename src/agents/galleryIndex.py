@@ -0,0 +1,306 @@
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.agents.encodingStore import ENCODING_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+def _as_matrix(encodings) -> np.ndarray:
+    if encodings is None or len(encodings) == 0:
+        return np.empty((0, ENCODING_SIZE), dtype=np.float32)
+    return np.ascontiguousarray(np.asarray(encodings, dtype=np.float32).reshape(-1, ENCODING_SIZE))
+
+
+def _no_match(count: int) -> Tuple[np.ndarray, np.ndarray]:
+    return np.full(count, -1, dtype=np.intp), np.full(count, np.inf, dtype=np.float32)
+
+
+class Gallery:
+    def __init__(self, encodings: Optional[np.ndarray] = None, labels: Optional[Sequence[str]] = None):
+        """
+        Immutable gallery of known face encodings stored as one contiguous float32 matrix,
+        searched exhaustively.
+
+        :param encodings: Array-like of shape (N, 128).
+        :param labels: Identity label for each encoding.
+        """
+        self.encodings = _as_matrix(encodings)
+        self.squaredNorms = np.einsum("ij,ij->i", self.encodings, self.encodings)
+        self.labels = list(labels) if labels is not None else [None] * len(self.encodings)
+        if len(self.labels) != len(self.encodings):
+            raise ValueError(f"Got {len(self.labels)} labels for {len(self.encodings)} encodings")
+
+    def __len__(self) -> int:
+        return len(self.encodings)
+
+    @property
+    def nbytes(self) -> int:
+        return self.encodings.nbytes + self.squaredNorms.nbytes
+
+    def extended(self, encodings: Sequence[np.ndarray], labels: Sequence[str]) -> "Gallery":
+        """Return a new gallery with extra encodings appended."""
+        if len(encodings) == 0:
+            return self
+        return Gallery(np.vstack([self.encodings, _as_matrix(encodings)]), self.labels + list(labels))
+
+    def removed(self, labels: Iterable[str]) -> "Gallery":
+        """Return a new gallery without the encodings of the given labels."""
+        drop = set(labels)
+        keep = [i for i, label in enumerate(self.labels) if label not in drop]
+        if len(keep) == len(self.labels):
+            return self
+        return Gallery(self.encodings[keep], [self.labels[i] for i in keep])
+
+    def nearest(self, unknownEncodings: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the nearest gallery entry for every unknown encoding in one batched computation.
+
+        Uses |u - g|^2 = |u|^2 + |g|^2 - 2 u.g with the gallery norms precomputed.
+
+        :param unknownEncodings: Array of shape (M, 128).
+        :return: Index of the nearest entry (-1 if the gallery is empty) and its Euclidean distance, each of shape (M,).
+        """
+        unknown = _as_matrix(unknownEncodings)
+        if len(self) == 0 or len(unknown) == 0:
+            return _no_match(len(unknown))
+        scores = self.squaredNorms[np.newaxis, :] - 2.0 * (unknown @ self.encodings.T)
+        best = np.argmin(scores, axis=1)
+        squared = scores[np.arange(len(unknown)), best] + np.einsum("ij,ij->i", unknown, unknown)
+        return best, np.sqrt(np.maximum(squared, 0.0))
+
+
+@dataclass(frozen=True)
+class InvertedList:
+    """Gallery entries assigned to one centroid: quantized residuals and gallery indices."""
+    codes: np.ndarray
+    ids: np.ndarray
+
+
+class IvfGallery:
+    STORAGE = {"float16": np.float16, "int8": np.int8}
+
+    def __init__(self, centroids: np.ndarray, scale: np.ndarray, lists: List[InvertedList], labels: List[str],
+                 storage: str = "int8", nprobe: int = 8, trainedSize: int = 0, nlist: int = 0,
+                 iterations: int = 10):
+        """
+        Immutable inverted-file gallery: entries are partitioned by k-means, and a search only
+        scans the entries of the nprobe centroids nearest to the query.
+
+        Each entry is stored as its residual from its centroid, quantized to float16 or to int8
+        with one scale per dimension, which takes a half or a quarter of the float32 memory.
+        Distances are therefore approximate. Use build() to create one.
+
+        :param centroids: (K, 128) float32 centroids.
+        :param scale: Per-dimension int8 step; ignored for float16.
+        :param lists: One InvertedList per centroid.
+        :param labels: Identity label for each gallery index.
+        :param storage: "float16" or "int8".
+        :param nprobe: Number of lists scanned per query.
+        :param trainedSize: Gallery size the centroids were trained on.
+        :param nlist: Requested number of centroids (0 for about sqrt(N)), kept for retraining.
+        :param iterations: k-means iterations, kept for retraining.
+        """
+        self.centroids = centroids
+        self.centroidNorms = np.einsum("ij,ij->i", centroids, centroids)
+        self.scale = scale
+        self.lists = lists
+        self.labels = labels
+        self.storage = storage
+        self.nprobe = max(1, min(nprobe, len(centroids)))
+        self.trainedSize = trainedSize
+        self.nlist = nlist
+        self.iterations = iterations
+        self._encodings = None
+
+    @classmethod
+    def build(cls, encodings: np.ndarray, labels: Sequence[str], nlist: int = 0, nprobe: int = 8,
+              storage: str = "int8", iterations: int = 10, seed: int = 0) -> "IvfGallery":
+        """
+        Train the centroids with k-means and index the encodings.
+
+        :param encodings: (N, 128) encodings.
+        :param labels: Identity label for each encoding.
+        :param nlist: Number of centroids; 0 uses about sqrt(N).
+        :param nprobe: Number of lists scanned per query.
+        :param storage: "float16" or "int8".
+        :param iterations: k-means iterations.
+        :param seed: Seed for the initial centroids.
+        """
+        if storage not in cls.STORAGE:
+            raise ValueError(f"Unknown gallery storage: {storage}")
+        encodings = _as_matrix(encodings)
+        if len(labels) != len(encodings):
+            raise ValueError(f"Got {len(labels)} labels for {len(encodings)} encodings")
+        clusters = max(1, min(nlist or int(np.sqrt(len(encodings))), len(encodings)))
+        centroids, assignment = kmeans(encodings, clusters, iterations, seed)
+        residuals = encodings - centroids[assignment]
+        # The int8 step covers the largest residual seen in training; later outliers are clipped
+        scale = np.maximum(np.abs(residuals).max(axis=0) if len(residuals) else np.zeros(ENCODING_SIZE), 1e-6) / 127.0
+        gallery = cls(centroids, scale.astype(np.float32), [], list(labels), storage, nprobe, len(encodings),
+                      nlist, iterations)
+        lists = []
+        for centroid in range(len(centroids)):
+            ids = np.flatnonzero(assignment == centroid)
+            lists.append(InvertedList(gallery._quantize(residuals[ids]), ids.astype(np.intp)))
+        gallery.lists = lists
+        return gallery
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    @property
+    def nbytes(self) -> int:
+        return (self.centroids.nbytes + self.scale.nbytes
+                + sum(inverted.codes.nbytes + inverted.ids.nbytes for inverted in self.lists))
+
+    @property
+    def encodings(self) -> np.ndarray:
+        """All entries decoded to an (N, 128) float32 matrix in gallery order."""
+        if self._encodings is None:
+            encodings = np.empty((len(self), ENCODING_SIZE), dtype=np.float32)
+            for centroid, inverted in enumerate(self.lists):
+                encodings[inverted.ids] = self.centroids[centroid] + self._dequantize(inverted.codes)
+            self._encodings = encodings
+        return self._encodings
+
+    def _quantize(self, residuals: np.ndarray) -> np.ndarray:
+        if self.storage == "float16":
+            return residuals.astype(np.float16)
+        return np.clip(np.rint(residuals / self.scale), -127, 127).astype(np.int8)
+
+    def _dequantize(self, codes: np.ndarray) -> np.ndarray:
+        if self.storage == "float16":
+            return codes.astype(np.float32)
+        return codes.astype(np.float32) * self.scale
+
+    def _assign(self, encodings: np.ndarray) -> np.ndarray:
+        scores = self.centroidNorms[np.newaxis, :] - 2.0 * (encodings @ self.centroids.T)
+        return np.argmin(scores, axis=1)
+
+    def extended(self, encodings: Sequence[np.ndarray], labels: Sequence[str]) -> "IvfGallery":
+        """
+        Return a new gallery with extra encodings added to their nearest lists. Only the lists
+        that change are copied; the centroids are retrained once the gallery has doubled since
+        they were trained.
+        """
+        if len(encodings) == 0:
+            return self
+        added = _as_matrix(encodings)
+        if len(self) + len(added) >= 2 * max(self.trainedSize, 1):
+            logger.info(f"Retraining gallery index at {len(self) + len(added)} entries")
+            return IvfGallery.build(np.vstack([self.encodings, added]), self.labels + list(labels),
+                                    nlist=self.nlist, nprobe=self.nprobe, storage=self.storage,
+                                    iterations=self.iterations)
+        assignment = self._assign(added)
+        ids = np.arange(len(self), len(self) + len(added), dtype=np.intp)
+        lists = list(self.lists)
+        for centroid in np.unique(assignment):
+            members = assignment == centroid
+            inverted = lists[centroid]
+            codes = self._quantize(added[members] - self.centroids[centroid])
+            lists[centroid] = InvertedList(np.vstack([inverted.codes, codes]), np.concatenate([inverted.ids, ids[members]]))
+        return IvfGallery(self.centroids, self.scale, lists, self.labels + list(labels),
+                          self.storage, self.nprobe, self.trainedSize, self.nlist, self.iterations)
+
+    def removed(self, labels: Iterable[str]) -> "IvfGallery":
+        """Return a new gallery without the encodings of the given labels; the centroids are kept."""
+        drop = set(labels)
+        keep = np.array([label not in drop for label in self.labels], dtype=bool)
+        if keep.all():
+            return self
+        # Gallery indices stay dense: surviving entries are renumbered in order
+        renumber = np.cumsum(keep) - 1
+        lists = []
+        for inverted in self.lists:
+            kept = keep[inverted.ids]
+            lists.append(InvertedList(inverted.codes[kept], renumber[inverted.ids[kept]]))
+        return IvfGallery(self.centroids, self.scale, lists, [label for label, k in zip(self.labels, keep) if k],
+                          self.storage, self.nprobe, self.trainedSize, self.nlist, self.iterations)
+
+    def nearest(self, unknownEncodings: np.ndarray, nprobe: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the approximate nearest gallery entry for every unknown encoding.
+
+        :param unknownEncodings: Array of shape (M, 128).
+        :param nprobe: Lists scanned per query; None uses the gallery's setting.
+        :return: Index of the nearest entry found (-1 if none) and its approximate Euclidean distance, each of shape (M,).
+        """
+        unknown = _as_matrix(unknownEncodings)
+        best, distances = _no_match(len(unknown))
+        if len(self) == 0 or len(unknown) == 0:
+            return best, distances
+        nprobe = max(1, min(nprobe or self.nprobe, len(self.centroids)))
+        centroidScores = self.centroidNorms[np.newaxis, :] - 2.0 * (unknown @ self.centroids.T)
+        probes = np.argpartition(centroidScores, nprobe - 1, axis=1)[:, :nprobe]
+        for i, query in enumerate(unknown):
+            for centroid in probes[i]:
+                inverted = self.lists[centroid]
+                if not len(inverted.ids):
+                    continue
+                # |q - (c + r)|^2 = |(q - c) - r|^2
+                residual = query - self.centroids[centroid]
+                decoded = self._dequantize(inverted.codes)
+                squared = np.einsum("ij,ij->i", decoded, decoded) - 2.0 * (decoded @ residual) + residual @ residual
+                j = int(np.argmin(squared))
+                distance = np.sqrt(max(float(squared[j]), 0.0))
+                if distance < distances[i]:
+                    best[i], distances[i] = inverted.ids[j], distance
+        return best, distances
+
+
+def kmeans(encodings: np.ndarray, clusters: int, iterations: int = 10, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Lloyd's k-means with centroids initialized from random entries; empty clusters are
+    reseeded with the entries farthest from their centroid.
+
+    :return: (K, 128) centroids and the cluster of each encoding.
+    """
+    rng = np.random.default_rng(seed)
+    centroids = encodings[rng.choice(len(encodings), clusters, replace=False)].copy()
+    norms = np.einsum("ij,ij->i", encodings, encodings)
+    for _ in range(iterations):
+        scores = np.einsum("ij,ij->i", centroids, centroids)[np.newaxis, :] - 2.0 * (encodings @ centroids.T)
+        assignment = np.argmin(scores, axis=1)
+        counts = np.bincount(assignment, minlength=clusters)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, encodings)
+        nonEmpty = counts > 0
+        centroids[nonEmpty] = sums[nonEmpty] / counts[nonEmpty, np.newaxis]
+        empty = np.flatnonzero(~nonEmpty)
+        if len(empty):
+            error = scores[np.arange(len(encodings)), assignment] + norms
+            centroids[empty] = encodings[np.argsort(error)[::-1][:len(empty)]]
+    scores = np.einsum("ij,ij->i", centroids, centroids)[np.newaxis, :] - 2.0 * (encodings @ centroids.T)
+    return centroids, np.argmin(scores, axis=1)
+
+
+def build_index(gallery, indexConfig: Optional[Dict[str, Any]] = None):
+    """
+    Pick the gallery implementation for the recognition.index settings.
+
+    :param gallery: Current gallery.
+    :param indexConfig: Mapping with type (exact, ivf or auto), minSize (auto switches to ivf
+        from this many entries), nlist, nprobe and storage (float16 or int8).
+    :return: The gallery itself, or an IvfGallery built from it.
+    """
+    indexConfig = indexConfig or {}
+    kind = indexConfig.get("type", "exact")
+    if kind not in ("exact", "ivf", "auto"):
+        raise ValueError(f"Unknown gallery index type: {kind}")
+    useIvf = kind == "ivf" or (kind == "auto" and len(gallery) >= indexConfig.get("minSize", 10000))
+    if not useIvf or isinstance(gallery, IvfGallery) or len(gallery) == 0:
+        return gallery
+    index = IvfGallery.build(
+        gallery.encodings,
+        gallery.labels,
+        nlist=indexConfig.get("nlist", 0),
+        nprobe=indexConfig.get("nprobe", 8),
+        storage=indexConfig.get("storage", "int8"),
+    )
+    logger.info(f"Indexed {len(gallery)} gallery entries in {len(index.centroids)} lists "
+                f"({index.storage}, {index.nbytes / 1e6:.1f} MB)")
+    return index
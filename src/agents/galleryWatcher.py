@@ -0,0 +1,288 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.agents.encodingStore import list_gallery_images
+from src.eventJournal import get_journal
+from src.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+# inotify event masks, from <sys/inotify.h>
+IN_ATTRIB = 0x4
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_MOVE_SELF = 0x800
+IN_IGNORED = 0x8000
+WATCH_MASK = (IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_DELETE_SELF | IN_MOVE_SELF)
+EVENT_HEADER = struct.Struct("iIII")
+
+# Size, mtime in ns, and when the file appeared (the later of its mtime and ctime)
+FileState = Tuple[int, int, float]
+
+
+class InotifyWatch:
+    def __init__(self, path: Path):
+        """
+        Change notifications for one directory from Linux inotify, called through libc so that
+        no extra package is needed.
+
+        :param path: Directory to watch.
+        :raises OSError: If inotify is unavailable.
+        """
+        if not sys.platform.startswith("linux"):
+            raise OSError(f"inotify is not available on {sys.platform}")
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch failed for {path}")
+
+    def wait(self, timeout: float) -> bool:
+        """
+        Wait for changes in the directory.
+
+        :return: True if something changed, False on timeout.
+        :raises OSError: Once the directory itself was deleted or moved, which ends the watch.
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return False
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return False
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            _, mask, _, nameLength = EVENT_HEADER.unpack_from(data, offset)
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                raise OSError("the watched directory was removed")
+            offset += EVENT_HEADER.size + nameLength
+        return True
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class GalleryWatcher:
+    def __init__(self, trustedFacesPath: str, encoder: Callable[[Path], Optional[np.ndarray]],
+                 update: Callable[[List[str], List[np.ndarray], List[str]], None], inotify: bool = True,
+                 pollInterval: float = 2.0, settleSeconds: float = 0.5):
+        """
+        Keeps a gallery in step with its trusted-faces directory while the agent runs.
+
+        A background thread waits for changes, with inotify where available and by polling
+        otherwise, and compares the directory with its last scan by size and mtime. Only added
+        or changed images are encoded. The gallery is then updated in one call: the labels (file
+        stems) of every added, changed or deleted image are replaced by the encodings of the
+        images now carrying them.
+
+        :param trustedFacesPath: Directory of trusted-face images, labelled by file stem.
+        :param encoder: Callable returning the encoding of an image file, or None if no face is found.
+        :param update: Callable(labels, encodings, newLabels) replacing the gallery entries of labels
+            by the encodings, e.g. FaceRecognition.replace_known_faces.
+        :param inotify: Whether to use inotify; polling is the fallback.
+        :param pollInterval: Seconds between scans when polling.
+        :param settleSeconds: Seconds the directory must stay unchanged before images are read,
+            so that files still being copied are not encoded half-written.
+        """
+        self.root = Path(trustedFacesPath)
+        self.encoder = encoder
+        self.update = update
+        self.inotify = inotify
+        self.pollInterval = pollInterval
+        self.settleSeconds = settleSeconds
+        self.files: Dict[str, FileState] = {}
+        # Encodings of the images this watcher encoded; the initial gallery was encoded elsewhere
+        self.encodings: Dict[str, Optional[np.ndarray]] = {}
+        self.updates = 0
+        self.lastLatency: Optional[float] = None
+        self._stopping = threading.Event()
+        self._thread = None
+        self._missing = False
+        # Held while scanning, so that adopt() never interleaves with a scan
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, trustedFacesPath: str, faceRecognition,
+                    watchConfig: Optional[Dict[str, Any]] = None) -> "GalleryWatcher":
+        """
+        Create a watcher updating a FaceRecognition from the galleryWatch section of the configuration.
+        """
+        watchConfig = watchConfig or {}
+        return cls(
+            trustedFacesPath,
+            faceRecognition.encode_image_file,
+            faceRecognition.replace_known_faces,
+            inotify=watchConfig.get("inotify", True),
+            pollInterval=watchConfig.get("pollInterval", 2.0),
+            settleSeconds=watchConfig.get("settleSeconds", 0.5),
+        )
+
+    def snapshot(self) -> None:
+        """Remember the directory as it is now; call before the initial gallery is encoded."""
+        self.files = self._list()
+
+    def start(self) -> "GalleryWatcher":
+        if self._thread is None:
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name=f"GalleryWatcher-{self.root.name}", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+            self._thread = None
+
+    def _open_watch(self) -> Optional[InotifyWatch]:
+        if not self.inotify:
+            return None
+        try:
+            return InotifyWatch(self.root)
+        except (OSError, AttributeError) as e:
+            logger.info(f"Polling {self.root} every {self.pollInterval} s: {e}")
+            return None
+
+    def _run(self) -> None:
+        watch = self._open_watch()
+        try:
+            # Catches up with changes made while the initial gallery was encoded
+            self._scan_safely()
+            while not self._stopping.is_set():
+                if watch is None:
+                    if not self._stopping.wait(self.pollInterval):
+                        self._scan_safely()
+                    continue
+                try:
+                    changed = watch.wait(1.0)
+                except OSError as e:
+                    logger.warning(f"Stopped watching {self.root} with inotify ({e}); polling every {self.pollInterval} s")
+                    watch.close()
+                    watch = None
+                    continue
+                if changed:
+                    self._scan_safely()
+        finally:
+            if watch is not None:
+                watch.close()
+
+    def _scan_safely(self) -> None:
+        try:
+            self.scan()
+        except Exception as e:
+            logger.error(f"Failed to update the gallery of {self.root}: {e}")
+
+    def _encode(self, imagePath: Path) -> Optional[np.ndarray]:
+        try:
+            return self.encoder(imagePath)
+        except Exception as e:
+            # Not retried until the file changes again
+            logger.warning(f"Failed to encode {imagePath}: {e}")
+            return None
+
+    def _list(self) -> Dict[str, FileState]:
+        files = {}
+        for image in list_gallery_images(str(self.root)):
+            try:
+                stat = image.stat()
+            except FileNotFoundError:
+                continue
+            files[image.relative_to(self.root).as_posix()] = (stat.st_size, stat.st_mtime_ns,
+                                                              max(stat.st_mtime, stat.st_ctime))
+        return files
+
+    def _differs(self, current: Dict[str, FileState]) -> bool:
+        return current.keys() != self.files.keys() or any(
+            state[:2] != self.files[path][:2] for path, state in current.items())
+
+    def adopt(self, path: str, stat: os.stat_result, encoding: Optional[np.ndarray]) -> None:
+        """
+        Record an image whose encoding was already added to the gallery, so it is not encoded again.
+
+        :param path: Image path relative to the directory.
+        :param stat: File status of the image, which may still be at a temporary path about to be renamed.
+        :param encoding: Its encoding.
+        """
+        with self._lock:
+            self.files[path] = (stat.st_size, stat.st_mtime_ns, max(stat.st_mtime, stat.st_ctime))
+            self.encodings[path] = encoding
+
+    def scan(self) -> bool:
+        """
+        Apply the differences between the directory and its last scan to the gallery.
+
+        :return: Whether the gallery was updated.
+        """
+        with self._lock:
+            return self._scan()
+
+    def _scan(self) -> bool:
+        if not self.root.is_dir():
+            # A directory that is briefly gone, e.g. being replaced, must not empty the gallery
+            if not self._missing:
+                logger.warning(f"Trusted faces directory {self.root} is missing; keeping the current gallery")
+                self._missing = True
+            return False
+        self._missing = False
+        current = self._list()
+        if not self._differs(current):
+            return False
+        while True:
+            if self._stopping.wait(self.settleSeconds):
+                return False
+            settled = self._list()
+            if settled == current:
+                break
+            current = settled
+
+        changed = [path for path, state in current.items() if self.files.get(path, (None, None))[:2] != state[:2]]
+        deleted = [path for path in self.files if path not in current]
+        stems = {Path(path).stem for path in changed + deleted}
+        changedSet = set(changed)
+        encodings, labels = [], []
+        for path in sorted(current):
+            if Path(path).stem not in stems:
+                continue
+            # Images sharing a stem share a label, so unchanged ones are re-read as well
+            if path in changedSet or path not in self.encodings:
+                self.encodings[path] = self._encode(self.root / path)
+            if self.encodings[path] is not None:
+                encodings.append(self.encodings[path])
+                labels.append(Path(path).stem)
+        for path in deleted:
+            self.encodings.pop(path, None)
+        self.update(sorted(stems), encodings, labels)
+        self.files = current
+        self.updates += 1
+
+        matchableAt = time.time()
+        latencies = [matchableAt - current[path][2] for path in changed if self.encodings.get(path) is not None]
+        for latency in latencies:
+            get_metrics().observe("gallery_update_seconds", latency)
+        latency = self.lastLatency = max(latencies, default=None)
+        get_journal().record("galleryUpdated", path=str(self.root), changed=changed, deleted=deleted,
+                             encodings=len(encodings), latencySeconds=latency)
+        latencyText = f", matchable within {latency:.2f} s of appearing" if latency is not None else ""
+        logger.info(f"Gallery {self.root}: {len(changed)} images added or changed, {len(deleted)} deleted"
+                    f"{latencyText}")
+        return True
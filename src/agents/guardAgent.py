@@ -1,37 +1,249 @@
+import asyncio
 import logging
 import os 
+import re
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+import cv2
+import numpy as np
+from src.agents.commandMatcher import CommandMatcher
 from src.agents.conversationAgent import ConversationAgent
-from src.agents.speechRecognition import listenAudio, speak
+from src.agents.speechRecognition import (Priority, configure_audio, configure_speech, get_recognizer,
+                                          get_speech_worker, listenAudio, speak)
 from src.agents.faceRecognition import FaceRecognition
-import cv2
+from src.agents.evidenceRecorder import EvidenceRecorder
+from src.agents.frameRate import AdaptiveFrameRate
+from src.agents.frameSource import create_frame_source
+from src.agents.galleryWatcher import GalleryWatcher
+from src.agents.motionDetector import MotionDetector
+from src.agents.faceTracker import FaceTracker
+from src.agents.frameBus import RecognitionPool
+from src.agents.guardStateMachine import GuardState, TransitionLog
+from src.agents.streamScheduler import CameraStream, FrameScheduler
+from src.eventJournal import configure_journal, get_journal, json_number
+from src.metrics import configure_metrics
+from src.startup import StartupProfiler, Warmup
+import time
 
 logger = logging.getLogger(__name__)
 
 class GuardAgent:
-    def __init__(self, config):
+    def __init__(self, config, profiler=None):
+        """
+        Create the agent. Only cheap setup happens here; the trusted-face galleries, camera
+        streams, recognition models, speech recognizer and LLM client are prepared on
+        background threads, so the agent can speak and listen right away.
+
+        :param config: Parsed config.yaml.
+        :param profiler: Optional StartupProfiler recording each initialization step.
+        """
         self.config = config
+        self.profiler = profiler or StartupProfiler()
         # Initialize other components as needed
         self.guardMode = False
-        self.addTrustedFace(self.config.get("paths", {}).get("trustedFaces", "data/trusted_faces"))
+        with self.profiler.step("metrics"):
+            configure_metrics(self.config.get("metrics", {}))
+        with self.profiler.step("event journal"):
+            configure_journal(self.config.get("journal", {}))
+        with self.profiler.step("speech worker"):
+            configure_speech(self.config.get("speech", {}))
+        with self.profiler.step("audio capture"):
+            configure_audio(self.config.get("audio", {}))
+        with self.profiler.step("command matcher"):
+            self.commandMatcher = CommandMatcher.from_config(self.config)
+        self.galleries = {}
+        self.galleryWatchers = {}
         self.conversationAgent = ConversationAgent(self.config)
+        self.streams = []
+        self.scheduler = FrameScheduler(self.streams)
+        self.transitions = TransitionLog()
+        # Recognition runs on one thread; speaking and listening on another, so neither blocks the other
+        self.recognitionExecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="Recognition")
+        self.dialogExecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="Dialog")
+        self.stopRequested = False
+        self.warmup = Warmup(self.profiler)
+        self.warmup.start("text-to-speech", get_speech_worker().wait_ready)
+        self.warmup.start("speech recognizer", get_recognizer)
+        self.warmup.start("LLM client", self.conversationAgent.warm_up)
+        self.warmup.start("guard streams", self.prepareStreams)
+
+    def prepareStreams(self):
+        """Encode the trusted-face galleries, load the recognition models and build the camera streams."""
+        self.addTrustedFace(
+            self.config.get("paths", {}).get("trustedFaces", "data/trusted_faces"),
+            self.config.get("paths", {}).get("encodingCache"),
+        )
+        streams = self.buildStreams()
+        with self.profiler.step("recognition models"):
+            self.face_recognition.warm_up()
+        schedulerConfig = self.config.get("scheduler", {})
+        self.scheduler = FrameScheduler(
+            streams,
+            budget=schedulerConfig.get("budget", 0.0),
+            boost=schedulerConfig.get("boost", 4.0),
+            cpuBudget=schedulerConfig.get("cpuBudget", 0.0),
+            maxRecognitionInterval=schedulerConfig.get("maxRecognitionInterval", 2.0),
+        )
+        self.streams = streams
+
+    def waitUntilReady(self, timeout=None):
+        """Block until every background initialization step has finished."""
+        self.warmup.wait(timeout=timeout)
+
+    def buildStreams(self):
+        """Create one CameraStream per entry of the cameras section, or a single one from the camera section."""
+        paths = self.config.get("paths", {})
+        defaultFaces = paths.get("trustedFaces", "data/trusted_faces")
+        camerasConfig = self.config.get("cameras") or [dict(self.config.get("camera", {}), name="camera")]
+        streams = []
+        for i, cameraConfig in enumerate(camerasConfig):
+            trustedFaces = cameraConfig.get("trustedFaces", defaultFaces)
+            encodingCache = cameraConfig.get("encodingCache", paths.get("encodingCache") if trustedFaces == defaultFaces else None)
+            faceRecognition = self.addTrustedFace(trustedFaces, encodingCache)
+            recognitionPool = None
+            if self.config.get("frameBus", {}).get("workers", 0) > 0:
+                # Capture and recognition run in separate processes sharing a frame ring
+                recognitionPool = RecognitionPool(self.config, trustedFacesPath=trustedFaces,
+                                                  cameraConfig=cameraConfig, cachePath=encodingCache)
+            name = cameraConfig.get("name", f"camera{i}")
+            frameSource = create_frame_source(cameraConfig)
+            frameRate = None
+            if recognitionPool is None and frameSource.live:
+                # Recorded sources keep their playback rate
+                frameRate = AdaptiveFrameRate.from_config(self.config.get("frameRate", {}))
+            evidence = None
+            if self.config.get("evidence", {}).get("enabled", False):
+                if recognitionPool is None:
+                    evidence = EvidenceRecorder.from_config(name, self.config["evidence"])
+                else:
+                    logger.warning(f"Evidence recording is not available for {name}: its frames are captured in a worker process")
+            streams.append(CameraStream(
+                name=name,
+                frameSource=frameSource,
+                faceTracker=FaceTracker.from_config(faceRecognition, self.config.get("tracking", {})),
+                motionDetector=MotionDetector.from_config(dict(self.config.get("motion", {}), **cameraConfig.get("motion", {}))),
+                priority=cameraConfig.get("priority", 1.0),
+                recognitionPool=recognitionPool,
+                readTimeout=cameraConfig.get("readTimeout", self.config.get("camera", {}).get("readTimeout", 2.0)),
+                evidence=evidence,
+                frameRate=frameRate,
+            ))
+        return streams
 
     def activate_guard(self):
+        if not self.warmup.ready("guard streams"):
+            logger.info("Waiting for the trusted faces and cameras to be ready...")
+        self.warmup.wait("guard streams")
+        try:
+            for stream in self.streams:
+                stream.start()
+        except RuntimeError as e:
+            logger.error(f"Failed to start frame source: {e}")
+            for stream in self.streams:
+                stream.stop()
+            speak("Camera unavailable. Guard mode not activated.")
+            return
         self.guardMode = True
         logger.info("Guard mode activated.")
+        get_journal().record("guardActivated", cameras=[stream.name for stream in self.streams])
         speak("Guard mode activated.")
         self.guardRoom()
 
     def deactivate_guard(self):
         self.guardMode = False
+        self.reportStreams()
+        for stream in self.streams:
+            self.discardSpeculation(stream)
+            if stream.state is not GuardState.IDLE:
+                self.transition(stream, GuardState.IDLE, "guard mode deactivated", evidenceAt=time.monotonic())
+            logger.info(f"Camera {stream.name}: motion gate {stream.motionDetector.stats()}, face tracker {stream.faceTracker.stats()}")
+            stream.stop()
         logger.info("Guard mode deactivated.")
+        get_journal().record("guardDeactivated")
         speak("Guard mode deactivated.")
         
-    def addTrustedFace(self, trustedFacesPath):
-        self.face_recognition = FaceRecognition()
-        self.face_recognition.add_known_face(trustedFacesPath)
+    def addTrustedFace(self, trustedFacesPath, encodingCachePath=None):
+        if trustedFacesPath in self.galleries:
+            return self.galleries[trustedFacesPath]
+        faceRecognition = FaceRecognition.from_config(self.config.get("recognition", {}))
+        watchConfig = self.config.get("galleryWatch", {})
+        watcher = None
+        if watchConfig.get("enabled", False) and Path(trustedFacesPath).is_dir():
+            # Snapshot first: files changed while the gallery is encoded are picked up by the watcher
+            watcher = GalleryWatcher.from_config(trustedFacesPath, faceRecognition, watchConfig)
+            watcher.snapshot()
+        with self.profiler.step(f"gallery {trustedFacesPath}"):
+            faceRecognition.add_known_face(trustedFacesPath, cachePath=encodingCachePath)
+        self.galleries[trustedFacesPath] = faceRecognition
+        if watcher is not None:
+            self.galleryWatchers[trustedFacesPath] = watcher.start()
+            if self.config.get("frameBus", {}).get("workers", 0) > 0:
+                logger.warning(f"Changes to {trustedFacesPath} only reach recognition worker processes after a restart")
+        if not hasattr(self, "face_recognition"):
+            self.face_recognition = faceRecognition
         logger.info(f"Trusted face added from {trustedFacesPath}")
         # speak(f"Trusted face added from {trustedFacesPath}")
+        return faceRecognition
+
+    def trustedFacesPath(self, camera=None):
+        """Trusted-faces path of a camera of the cameras section, or the default one."""
+        default = self.config.get("paths", {}).get("trustedFaces", "data/trusted_faces")
+        if camera is None:
+            return default
+        for i, cameraConfig in enumerate(self.config.get("cameras") or []):
+            if cameraConfig.get("name", f"camera{i}") == camera:
+                return cameraConfig.get("trustedFaces", default)
+        raise ValueError(f"Unknown camera: {camera}")
+
+    def enrollFace(self, name, imageBytes, camera=None):
+        """
+        Add a trusted face while the agent runs. The image is saved to the trusted-faces
+        directory and its face is matchable when this returns.
+
+        :param name: Person's name; the image is saved as <name>.jpg, or <name>_2.jpg and so on.
+        :param imageBytes: Encoded image (JPEG, PNG, ...).
+        :param camera: Camera whose gallery receives the face; the default gallery if None.
+        :return: Label and path of the saved image.
+        :raises ValueError: If the image cannot be decoded or shows no face, or the gallery is not a directory.
+        """
+        label = re.sub(r"[^\w-]+", "_", name).strip("_")
+        if not label:
+            raise ValueError(f"Invalid name: {name!r}")
+        trustedFacesPath = self.trustedFacesPath(camera)
+        self.warmup.wait("guard streams")
+        faceRecognition = self.galleries.get(trustedFacesPath)
+        directory = Path(trustedFacesPath)
+        if faceRecognition is None or not directory.is_dir():
+            raise ValueError(f"{trustedFacesPath} is not a loaded trusted-faces directory")
+        image = cv2.imdecode(np.frombuffer(imageBytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError("The image cannot be decoded")
+        stem, n = label, 2
+        while any(directory.glob(f"{stem}.*")):
+            stem, n = f"{label}_{n}", n + 1
+        path = directory / f"{stem}.jpg"
+        # Not an image suffix, so the gallery watcher ignores the file until it is renamed
+        temporary = directory / f".{stem}.jpg.tmp"
+        temporary.write_bytes(cv2.imencode(".jpg", image)[1].tobytes())
+        try:
+            encoding = faceRecognition.encode_image_file(temporary)
+            if encoding is None:
+                raise ValueError(f"No face found in the image of {name}")
+            watcher = self.galleryWatchers.get(trustedFacesPath)
+            if watcher is not None:
+                watcher.adopt(path.name, temporary.stat(), encoding)
+            os.replace(temporary, path)
+        finally:
+            if temporary.exists():
+                temporary.unlink()
+        faceRecognition.replace_known_faces([stem], [encoding], [stem])
+        logger.info(f"Enrolled {name} as {stem} from {path}")
+        get_journal().record("faceEnrolled", label=stem, path=str(path))
+        return {"label": stem, "path": str(path)}
+
+    @property
+    def frameFeedExhausted(self):
+        return all(stream.exhausted for stream in self.streams)
 
     def guardRoom(self):
         if not self.guardMode:
@@ -40,80 +252,299 @@ class GuardAgent:
         
         logger.info("Guarding the room...")
         speak("Guarding the room.")
-        
-        while self.guardMode:
-            # Here you would integrate with a camera feed to capture images
-            # For demonstration, we will assume an image path
-            videoCapture = cv2.VideoCapture(0)
-            ret, frame = videoCapture.read()
-            if not ret:
-                logger.warning("Failed to capture image from camera.")
-                continue
-
-            recognized_faces = self.face_recognition.recognize_faces(frame)
-            if any(recognized_faces):
-                logger.info("Known face detected.")
-                speak("Known face detected. Access granted.")
-                command = listenAudio()
-                if command and command in self.config.get("commands", {}).get("deactivationCommand", []):
-                    self.deactivate_guard()
-                    break
-            else:
-                logger.warning("Unknown face detected!")
-                speak("Warning! Unknown face detected!")
-                response = self.level1Response()
-                videoCapture = cv2.VideoCapture(0)
-                ret, frame = videoCapture.read()
-                if not ret:
-                    logger.warning("Failed to capture image from camera.")
-                    continue
-                recognized_faces = self.face_recognition.recognize_faces(frame)
-                if any(recognized_faces):
-                    logger.info("Known face detected after Level 1 Response.")
-                    speak("Known face detected. Access granted.")
-                    command = listenAudio()
-                    if command and command in self.config.get("commands", {}).get("deactivationCommand", []):
-                        self.deactivate_guard()
+
+        asyncio.run(self.superviseStreams())
+        if self.stopRequested:
+            # Consumed here, so the next activation starts afresh; GuardDaemon also clears it
+            # before starting guard mode, so a stop requested during warm-up is not lost
+            self.stopRequested = False
+            self.deactivate_guard()
+        elif self.guardMode and self.frameFeedExhausted:
+            logger.info("Frame source ended.")
+
+    async def superviseStreams(self):
+        """
+        Event loop of guard mode. Recognition results are produced on the recognition thread and
+        consumed here, where they drive each stream's state machine:
+
+        IDLE -> OBSERVING -> LEVEL1 -> LEVEL2 -> ALERTED -> OBSERVING
+
+        Speaking, listening and generating replies run as dialog tasks on other threads, so
+        recognition continues on every stream while the agent talks.
+        """
+        for stream in self.streams:
+            self.transition(stream, GuardState.OBSERVING, "guard mode activated", evidenceAt=time.monotonic())
+        observations = asyncio.Queue()
+        recognizer = asyncio.create_task(self.recognizeStreams(observations))
+        reportInterval = self.config.get("scheduler", {}).get("reportInterval", 60.0)
+        nextReport = time.monotonic() + reportInterval
+        try:
+            while self.guardMode and not self.stopRequested:
+                if time.monotonic() >= nextReport:
+                    self.reportStreams()
+                    nextReport = time.monotonic() + reportInterval
+                try:
+                    stream, tracks, observedAt = await asyncio.wait_for(observations.get(), timeout=0.5)
+                except asyncio.TimeoutError:
+                    if recognizer.done():
                         break
-                else:
-                    logger.error("Intruder detected! Escalating to Level 2 Response.")
-                    speak("Intruder detected! Escalating to Level 2 Response.")
-                    self.level2Response(response)
-                    # Here you could add more actions like sending alerts, etc.
-                    videoCapture = cv2.VideoCapture(0)
-                    ret, frame = videoCapture.read()
-                    if not ret:
-                        logger.warning("Failed to capture image from camera.")
-                        continue
-                    recognized_faces = self.face_recognition.recognize_faces(frame)
-                    if any(recognized_faces):
-                        logger.info("Known face detected after Level 2 Response.")
-                        speak("Known face detected. Access granted.")
-                        command = listenAudio()
-                        if command and command in self.config.get("commands", {}).get("deactivationCommand", []):
-                            self.deactivate_guard()
-                            break
-                    else:
-                        logger.error("Intruder still present after Level 2 Response. Authorities have been contacted.")
-                        speak("Intruder still present. Authorities have been contacted.")
-                        # Here you could add code to contact authorities
-        videoCapture.release()
+                    continue
+                self.handleStream(stream, tracks, observedAt)
+        finally:
+            recognizer.cancel()
+            dialogs = [stream.dialog for stream in self.streams if stream.dialog is not None]
+            if self.guardMode and not self.stopRequested:
+                # The frame feed ended: let pending responses finish
+                await asyncio.gather(*dialogs, return_exceptions=True)
+            else:
+                for dialog in dialogs:
+                    dialog.cancel()
+
+    async def recognizeStreams(self, observations):
+        """Producer: serve the streams picked by the scheduler and queue their tracks."""
+        loop = asyncio.get_running_loop()
+        while self.guardMode and not self.frameFeedExhausted:
+            stream, tracks, observedAt = await loop.run_in_executor(self.recognitionExecutor, self.observeNext)
+            if tracks is not None:
+                await observations.put((stream, tracks, observedAt))
+
+    def observeNext(self):
+        """Observe the next stream picked by the scheduler; returns it, its tracks and their capture time."""
+        stream = self.scheduler.next()
+        if stream is None:
+            return None, None, None
+        recognitions = stream.recognitions
+        tracks = stream.observe()
+        # Read here, before the next observation of this stream moves it on
+        observedAt = stream.lastObservedAt or time.monotonic()
+        self.scheduler.charge(stream, recognized=stream.recognitions > recognitions)
+        return stream, tracks, observedAt
+
+    def transition(self, stream, target, reason, evidenceAt):
+        """
+        Move a stream to a new state and record how long after the triggering capture it happened.
+
+        :param evidenceAt: time.monotonic() capture time of the frame that caused the transition.
+        """
+        now = time.monotonic()
+        record = self.transitions.record(stream.name, stream.state, target, reason, evidenceAt, now)
+        stream.state = target
+        get_journal().record("transition", camera=stream.name, source=record.source.name, target=target.name,
+                             reason=reason, latencyMs=round(record.latency * 1e3, 1))
+        logger.info(f"Camera {stream.name}: {record.source.name} -> {target.name} ({reason}, "
+                    f"{record.latency * 1e3:.0f} ms after capture)")
+        return record
+
+    def startDialog(self, stream, coroutine):
+        stream.dialog = asyncio.create_task(coroutine)
+        stream.dialog.add_done_callback(self.dialogDone)
 
+    @staticmethod
+    def dialogDone(task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Dialog failed: {task.exception()}")
+
+    def reportStreams(self):
+        for stats in self.scheduler.stats():
+            logger.info(f"Camera {stats['name']}: {stats['state']}, {stats['recognitions']} recognitions, "
+                        f"latency p50 {stats['latencyP50'] * 1e3:.0f} ms / p95 {stats['latencyP95'] * 1e3:.0f} ms, "
+                        f"{stats['framesDropped']} frames dropped, capturing at {stats['captureFps'] or 'full'} fps")
+        cpuBudget = self.scheduler.cpuBudget
+        if cpuBudget is not None:
+            logger.info(f"CPU use {cpuBudget.usage():.0f}% of {cpuBudget.cores} cores (budget {cpuBudget.percent:.0f}%), "
+                        f"recognition delayed {cpuBudget.throttledSeconds:.1f} s in total")
+        for kind, stats in self.transitions.stats().items():
+            logger.info(f"Transition {kind}: {stats['count']}x, capture to transition p50 "
+                        f"{stats['latencyP50'] * 1e3:.0f} ms / p95 {stats['latencyP95'] * 1e3:.0f} ms")
+
+    def where(self, stream):
+        """Location suffix for announcements, only needed when several cameras are guarded."""
+        return f" in {stream.name}" if len(self.streams) > 1 else ""
+
+    def handleStream(self, stream, tracks, observedAt):
+        """Advance the state machine of one stream given tracks observed at observedAt."""
+        if stream.dialog is not None and not stream.dialog.done():
+            # Still talking to the person; their face keeps being tracked meanwhile
+            return
+        where = self.where(stream)
+        if stream.recheckSince is not None:
+            if observedAt < stream.recheckSince:
+                return
+            verdict = self.recheckVerdict(stream, tracks)
+            if verdict is None:
+                return
+            get_journal().record("recheckVerdict", camera=stream.name, level=stream.level, known=verdict,
+                                 faces=[{"label": t.label, "distance": json_number(t.distance), "known": t.isKnown}
+                                        for t in tracks])
+            level = stream.level
+            stream.recheckSince = None
+            stream.acknowledged = {t.trackId: t.verifications for t in tracks}
+            if verdict:
+                self.discardSpeculation(stream)
+                self.transition(stream, GuardState.OBSERVING, f"known face after Level {level} Response",
+                                evidenceAt=observedAt)
+                self.startDialog(stream, self.grantDialog(f"Known face detected{where} after Level {level} Response."))
+                return
+            if level == 1:
+                self.transition(stream, GuardState.LEVEL2, "intruder still present", evidenceAt=observedAt)
+                self.recordEvidence(stream, "intruder", tracks, observedAt)
+                logger.error(f"Intruder detected{where}! Escalating to Level 2 Response.")
+                speak(f"Intruder detected{where}! Escalating to Level 2 Response.", priority=Priority.URGENT)
+                self.startDialog(stream, self.level2Dialog(stream))
+            else:
+                self.transition(stream, GuardState.ALERTED, "intruder still present after Level 2 Response",
+                                evidenceAt=observedAt)
+                self.recordEvidence(stream, "alert", tracks, observedAt)
+                logger.error(f"Intruder still present{where} after Level 2 Response. Authorities have been contacted.")
+                speak(f"Intruder still present{where}. Authorities have been contacted.", priority=Priority.URGENT)
+                # Here you could add code to contact authorities
+                self.transition(stream, GuardState.OBSERVING, "alert raised", evidenceAt=observedAt)
+            return
+
+        verdict = self.trackVerdict(stream, tracks)
+        if verdict is None:
+            return
+        if verdict:
+            self.startDialog(stream, self.grantDialog(f"Known face detected{where}."))
+            return
+        self.transition(stream, GuardState.LEVEL1, "unknown face", evidenceAt=observedAt)
+        self.recordEvidence(stream, "unknown-face", tracks, observedAt)
+        logger.warning(f"Unknown face detected{where}!")
+        speak(f"Warning! Unknown face detected{where}!", priority=Priority.URGENT)
+        self.startDialog(stream, self.level1Dialog(stream))
+
+    def recordEvidence(self, stream, event, tracks, observedAt):
+        """Keep the frames around an event and crops of the unknown faces, if the stream records evidence."""
+        if stream.evidence is None:
+            return
+        unknown = [t for t in tracks if t.isKnown is False]
+        stream.evidence.trigger(event, boxes=[t.box for t in unknown], timestamp=observedAt,
+                                details={"distances": [round(t.distance, 3) for t in unknown]})
+
+    async def grantDialog(self, message):
+        loop = asyncio.get_running_loop()
+        if await loop.run_in_executor(self.dialogExecutor, self.grantAccess, message):
+            self.stopRequested = True
+
+    async def level1Dialog(self, stream):
+        loop = asyncio.get_running_loop()
+        stream.intruderResponse = await loop.run_in_executor(self.dialogExecutor, self.level1Response)
+        # Reset tracking on the recognition thread so it never races an update
+        await loop.run_in_executor(self.recognitionExecutor, self.startRecheck, stream)
+        self.speculateLevel2(stream)
+
+    async def level2Dialog(self, stream):
+        loop = asyncio.get_running_loop()
+        speculation, stream.speculation = stream.speculation, None
+        await loop.run_in_executor(self.dialogExecutor, self.level2Response, stream.intruderResponse, speculation)
+        await loop.run_in_executor(self.recognitionExecutor, self.startRecheck, stream)
+
+    def trackVerdict(self, stream, tracks):
+        """
+        Turn track-level identity verdicts into a decision.
+
+        Returns True if a trusted face is present, False if only unknown faces are, and None
+        when there is nothing new to act on: no faces, or only verdicts already acted upon.
+        """
+        if not tracks:
+            return None
+        fresh = [t for t in tracks if t.isKnown is not None and stream.acknowledged.get(t.trackId) != t.verifications]
+        stream.acknowledged = {t.trackId: t.verifications for t in tracks if t.isKnown is not None}
+        if not fresh:
+            return None
+        journal = get_journal()
+        for track in fresh:
+            journal.record("faceVerdict", camera=stream.name, track=track.trackId, known=track.isKnown,
+                           label=track.label, distance=json_number(track.distance))
+        return any(t.isKnown for t in tracks)
+
+    def startRecheck(self, stream):
+        """Re-verify a stream with fresh tracks after an escalation step."""
+        stream.faceTracker.reset()
+        stream.recheckSince = time.monotonic()
+
+    def recheckVerdict(self, stream, tracks):
+        """
+        Returns True if a trusted face is seen, False if only unknown faces are seen or no face
+        is seen before tracking.verdictTimeout, and None while still waiting.
+        """
+        if any(t.isKnown for t in tracks):
+            return True
+        if tracks:
+            return False
+        if time.monotonic() - stream.recheckSince >= self.config.get("tracking", {}).get("verdictTimeout", 3.0):
+            return False
+        return None
+
+    def ask(self, question, priority=Priority.NORMAL):
+        """
+        Speak a question and listen for the answer.
+
+        Only speech that ends after the question has been spoken counts as the answer.
+
+        :param question: Text to speak.
+        :param priority: Priority of the question.
+        :return: The recognized answer, or None if nothing was heard or understood.
+        """
+        handle = speak(question, priority=priority)
+        handle.wait()
+        return listenAudio(timeout=self.config.get("audio", {}).get("responseTimeout", 10.0),
+                           since=handle.finishedAt)
+
+    def grantAccess(self, message):
+        """Greet a trusted face and listen for a deactivation command. Returns True if one was heard."""
+        logger.info(message)
+        command = self.ask("Known face detected. Access granted.")
+        return self.commandMatcher.match(command).intent == "deactivationCommand"
 
     def level1Response(self):
         logger.info("Initiating Level 1 Response.")
-        speak("Initiating Level 1 Response. Who are you? Please state your purpose.")
-        response = listenAudio()
+        response = self.ask("Initiating Level 1 Response. Who are you? Please state your purpose.", priority=Priority.HIGH)
+        get_journal().record("intruderResponse", text=response)
         if response:
             return response
         else:
             return "No response received."
         
-    def level2Response(self, intruderResponse):
+    def level2Prompt(self, intruderResponse):
+        return f"You are an AI security agent tasked to handle a potential intruder. You asked the intruder to state their purpose. They responded: '{intruderResponse}'. Based on this, give the second level response, asking them to leave immediately and warn them that authorities will be contacted if they do not comply."
+
+    def speculateLevel2(self, stream):
+        """Start generating the Level 2 reply while the intruder is being re-checked."""
+        if self.config.get("conversation", {}).get("speculate", True):
+            stream.speculation = self.conversationAgent.start_response(self.level2Prompt(stream.intruderResponse))
+
+    def discardSpeculation(self, stream):
+        if stream.speculation is not None:
+            stream.speculation.cancel()
+            stream.speculation = None
+            logger.info(f"Discarded speculative Level 2 response{self.where(stream)}.")
+
+    def level2Response(self, intruderResponse, speculation=None):
         logger.info("Initiating Level 2 Response.")
-        prompt = f"You are an AI security agent tasked to handle a potential intruder. You asked the intruder to state their purpose. They responded: '{intruderResponse}'. Based on this, give the second level response, asking them to leave immediately and warn them that authorities will be contacted if they do not comply."
-        response = self.conversationAgent.generate_response(prompt)
-        logger.info(f"Level 2 Response: {response}")
+        prompt = self.level2Prompt(intruderResponse)
         speak("Initiating Level 2 Response.")
-        speak(response)
-        
+        start = time.monotonic()
+        if speculation is None or speculation.prompt != prompt or speculation.cancelled:
+            speculation = self.conversationAgent.start_response(prompt)
+        handle = None
+        if not self.config.get("conversation", {}).get("stream", True):
+            sentences = list(speculation)
+            if sentences:
+                handle = speak(" ".join(sentences), cacheable=False)
+        else:
+            # Speak each sentence as soon as it has been generated
+            sentences = []
+            for sentence in speculation:
+                if not sentences:
+                    logger.info(f"First Level 2 sentence after {time.monotonic() - start:.2f} s")
+                handle = speak(sentence, cacheable=False)
+                sentences.append(sentence)
+        if not sentences:
+            sentences.append(self.conversationAgent.FALLBACK_RESPONSE)
+            handle = speak(sentences[0], cacheable=False)
+        logger.info(f"Level 2 Response: {' '.join(sentences)}")
+        get_journal().record("llmReply", prompt=intruderResponse, reply=" ".join(sentences),
+                             seconds=round(time.monotonic() - start, 3))
+        # The intruder hears the whole warning before being checked again
+        handle.wait()
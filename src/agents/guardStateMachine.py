@@ -0,0 +1,79 @@
+import logging
+import threading
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any, Dict, List
+
+import numpy as np
+
+from src.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+
+class GuardState(Enum):
+    """Escalation state of one guarded camera."""
+    IDLE = "idle"
+    OBSERVING = "observing"
+    LEVEL1 = "level1"
+    LEVEL2 = "level2"
+    ALERTED = "alerted"
+
+
+@dataclass(frozen=True)
+class Transition:
+    """
+    A state change of one camera. evidenceAt is the capture time (time.monotonic) of the
+    frame that caused it, so latency is the time from capture to reacting to it.
+    """
+    stream: str
+    source: GuardState
+    target: GuardState
+    reason: str
+    evidenceAt: float
+    at: float
+
+    @property
+    def latency(self) -> float:
+        return self.at - self.evidenceAt
+
+
+class TransitionLog:
+    def __init__(self, maxTransitions: int = 1000):
+        """
+        Record of recent state transitions with latency statistics per kind of transition.
+
+        :param maxTransitions: Number of recent transitions kept.
+        """
+        self.transitions = deque(maxlen=maxTransitions)
+        self._lock = threading.Lock()
+
+    def record(self, stream: str, source: GuardState, target: GuardState, reason: str,
+               evidenceAt: float, at: float) -> Transition:
+        transition = Transition(stream, source, target, reason, evidenceAt, at)
+        with self._lock:
+            self.transitions.append(transition)
+        metrics = get_metrics()
+        metrics.inc("guard_transitions_total", source=source.name, target=target.name)
+        metrics.observe("guard_transition_latency_seconds", transition.latency, source=source.name, target=target.name)
+        return transition
+
+    def recent(self, count: int = 20) -> List[Transition]:
+        with self._lock:
+            return list(self.transitions)[-count:]
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Count and latency percentiles (seconds) for each "SOURCE->TARGET" transition."""
+        latencies = defaultdict(list)
+        with self._lock:
+            for transition in self.transitions:
+                latencies[f"{transition.source.name}->{transition.target.name}"].append(transition.latency)
+        return {
+            kind: {
+                "count": len(values),
+                "latencyP50": float(np.percentile(values, 50)),
+                "latencyP95": float(np.percentile(values, 95)),
+            }
+            for kind, values in latencies.items()
+        }
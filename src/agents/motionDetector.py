@@ -0,0 +1,129 @@
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class MotionResult:
+    """Outcome of the motion gate for one frame."""
+    active: bool
+    score: float
+    region: Optional[Tuple[int, int, int, int]] = None
+
+
+class MotionDetector:
+    def __init__(self, width: int = 160, threshold: float = 0.005, pixelThreshold: int = 25,
+                 learningRate: float = 0.05, padding: float = 0.5, holdSeconds: float = 2.0,
+                 enabled: bool = True):
+        """
+        Cheap change detector run on a tiny grayscale copy of each frame ahead of face recognition.
+
+        :param width: Width of the grayscale copy the detector works on.
+        :param threshold: Fraction of changed pixels that counts as activity.
+        :param pixelThreshold: Per-pixel intensity change that counts as changed.
+        :param learningRate: Rate at which the running background absorbs the current frame.
+        :param padding: Fraction of the changed box size added on each side of the region.
+        :param holdSeconds: Time the gate stays open after the last activity.
+        :param enabled: When False every frame passes the gate.
+        """
+        self.width = width
+        self.threshold = threshold
+        self.pixelThreshold = pixelThreshold
+        self.learningRate = learningRate
+        self.padding = padding
+        self.holdSeconds = holdSeconds
+        self.enabled = enabled
+        self.background = None
+        self.lastActive = float("-inf")
+        self.lastRegion = None
+        self.framesSeen = 0
+        self.framesSkipped = 0
+        self.gateCpuSeconds = 0.0
+        self.recognitionCpuSeconds = 0.0
+        self.recognitionsTimed = 0
+
+    @classmethod
+    def from_config(cls, motionConfig: Optional[Dict[str, Any]] = None) -> "MotionDetector":
+        """
+        Create a MotionDetector from the motion section of the configuration.
+
+        :param motionConfig: Mapping of constructor keyword arguments.
+        """
+        return cls(**(motionConfig or {}))
+
+    def reset(self) -> None:
+        """Forget the background so the next frame passes the gate and starts a new model."""
+        self.background = None
+        self.lastActive = float("-inf")
+        self.lastRegion = None
+
+    def update(self, image: np.ndarray) -> MotionResult:
+        """
+        Compare a BGR frame with the running background.
+
+        :param image: Full-resolution BGR frame.
+        :return: Whether recognition should run and, if so, the changed region in
+            full-resolution (top, right, bottom, left) coordinates; None means the whole frame.
+        """
+        self.framesSeen += 1
+        if not self.enabled:
+            return MotionResult(True, 1.0)
+
+        start = time.process_time()
+        height, width = image.shape[:2]
+        scale = self.width / width
+        small = cv2.resize(image, (self.width, max(1, int(round(height * scale)))), interpolation=cv2.INTER_AREA)
+        gray = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+
+        if self.background is None or self.background.shape != gray.shape:
+            self.background = gray.astype(np.float32)
+            self.lastActive = time.monotonic()
+            self.gateCpuSeconds += time.process_time() - start
+            return MotionResult(True, 1.0)
+
+        mask = cv2.absdiff(gray, cv2.convertScaleAbs(self.background)) > self.pixelThreshold
+        cv2.accumulateWeighted(gray, self.background, self.learningRate)
+        score = float(mask.mean())
+        now = time.monotonic()
+        if score >= self.threshold:
+            self.lastActive = now
+            self.lastRegion = self._region(mask, scale, width, height)
+        active = now - self.lastActive <= self.holdSeconds
+        if not active:
+            self.framesSkipped += 1
+        self.gateCpuSeconds += time.process_time() - start
+        return MotionResult(active, score, self.lastRegion if active else None)
+
+    def _region(self, mask: np.ndarray, scale: float, width: int, height: int) -> Tuple[int, int, int, int]:
+        ys, xs = np.nonzero(mask)
+        top, bottom = ys.min() / scale, (ys.max() + 1) / scale
+        left, right = xs.min() / scale, (xs.max() + 1) / scale
+        padY = (bottom - top) * self.padding
+        padX = (right - left) * self.padding
+        return (
+            max(0, int(top - padY)),
+            min(width, int(right + padX)),
+            min(height, int(bottom + padY)),
+            max(0, int(left - padX)),
+        )
+
+    def note_recognition(self, cpuSeconds: float) -> None:
+        """Record the CPU cost of one recognition pass, used to estimate the CPU saved by skipping."""
+        self.recognitionCpuSeconds += cpuSeconds
+        self.recognitionsTimed += 1
+
+    def stats(self) -> Dict[str, float]:
+        """Frames seen and skipped, CPU spent in the gate and estimated CPU saved."""
+        meanRecognition = self.recognitionCpuSeconds / self.recognitionsTimed if self.recognitionsTimed else 0.0
+        return {
+            "framesSeen": self.framesSeen,
+            "framesSkipped": self.framesSkipped,
+            "gateCpuSeconds": self.gateCpuSeconds,
+            "cpuSecondsSaved": self.framesSkipped * meanRecognition - self.gateCpuSeconds,
+        }
@@ -0,0 +1,107 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PhraseCache:
+    def __init__(self, cacheDir: str = "data/ttsCache", maxBytes: int = 50 * 1024 * 1024):
+        """
+        Size-bounded on-disk cache of rendered utterances, evicted least recently used first.
+
+        :param cacheDir: Directory holding the audio files and their index.
+        :param maxBytes: Maximum total size of the cached audio files.
+        """
+        self.cacheDir = Path(cacheDir)
+        self.maxBytes = maxBytes
+        self.indexPath = self.cacheDir / "index.json"
+        self.hits = 0
+        self.misses = 0
+        self.index: Dict[str, Dict] = self._load_index()
+
+    @staticmethod
+    def key(text: str, voice: str, rate: int) -> str:
+        """Cache key of an utterance: hash of its text, voice and rate."""
+        return hashlib.sha1(f"{voice}\0{rate}\0{text}".encode("utf-8")).hexdigest()
+
+    def _load_index(self) -> Dict[str, Dict]:
+        try:
+            with open(self.indexPath, "r") as file:
+                index = json.load(file)
+        except (OSError, ValueError):
+            return {}
+        # Drop entries whose audio file has disappeared
+        return {key: entry for key, entry in index.items() if (self.cacheDir / entry["file"]).exists()}
+
+    def _save_index(self) -> None:
+        self.cacheDir.mkdir(parents=True, exist_ok=True)
+        fd, tmpPath = tempfile.mkstemp(dir=self.cacheDir, suffix=".tmp")
+        with os.fdopen(fd, "w") as file:
+            json.dump(self.index, file)
+        os.replace(tmpPath, self.indexPath)
+
+    @property
+    def totalBytes(self) -> int:
+        return sum(entry["size"] for entry in self.index.values())
+
+    def get(self, text: str, voice: str, rate: int) -> Optional[Path]:
+        """
+        Look up a rendered utterance.
+
+        :return: Path of the audio file, or None if it is not cached.
+        """
+        entry = self.index.get(self.key(text, voice, rate))
+        if entry is None:
+            self.misses += 1
+            return None
+        path = self.cacheDir / entry["file"]
+        if not path.exists():
+            self.misses += 1
+            return None
+        self.hits += 1
+        entry["lastUsed"] = time.time()
+        return path
+
+    def put(self, text: str, voice: str, rate: int, render: Callable[[Path], None]) -> Optional[Path]:
+        """
+        Render an utterance into the cache and evict old entries to stay within maxBytes.
+
+        :param render: Callable writing the audio for the text to the given path.
+        :return: Path of the cached audio file, or None if rendering failed.
+        """
+        key = self.key(text, voice, rate)
+        self.cacheDir.mkdir(parents=True, exist_ok=True)
+        path = self.cacheDir / f"{key}.wav"
+        try:
+            render(path)
+        except Exception as e:
+            logger.warning(f"Failed to render '{text}' to the phrase cache: {e}")
+            return None
+        if not path.exists() or path.stat().st_size == 0:
+            return None
+        self.index[key] = {"file": path.name, "text": text, "size": path.stat().st_size, "lastUsed": time.time()}
+        self._evict()
+        self._save_index()
+        return path if key in self.index else None
+
+    def _evict(self) -> None:
+        total = self.totalBytes
+        for key, entry in sorted(self.index.items(), key=lambda item: item[1]["lastUsed"]):
+            if total <= self.maxBytes:
+                break
+            total -= entry["size"]
+            del self.index[key]
+            try:
+                (self.cacheDir / entry["file"]).unlink()
+            except OSError:
+                pass
+
+    def flush(self) -> None:
+        """Persist the recency information gathered by get()."""
+        self._save_index()
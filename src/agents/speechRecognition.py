@@ -1,40 +1,500 @@
-import speech_recognition as sr
+import heapq
+import itertools
 import logging
 import os
-import pyttsx3
-from rapidfuzz import fuzz, process
-
-tts = pyttsx3.init()
-rate = tts.getProperty("rate")
-tts.setProperty("rate", int(rate * 0.95))
+import threading
+import time
+import wave
+from enum import IntEnum
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from src.agents.audioStream import AudioStream, create_audio_stream, create_recognizer
+from src.agents.phraseCache import PhraseCache
+from src.metrics import get_metrics
 
 logger = logging.getLogger(__name__)
 
-def listenAudio():
-    recognizer = sr.Recognizer()
-    with sr.Microphone() as source:
-        speak("Listening...")
-        logger.info("Listening...")
-        audio = recognizer.listen(source)
+
+class Priority(IntEnum):
+    """Speech priorities; lower values are spoken first and interrupt higher ones."""
+    URGENT = 0
+    HIGH = 1
+    NORMAL = 2
+    LOW = 3
+
+
+class SpeechHandle:
+    def __init__(self, text: str, priority: Priority, cacheable: bool = True):
+        """
+        Handle to a queued utterance.
+
+        :param text: Text to speak.
+        :param priority: Priority of the utterance.
+        :param cacheable: Whether the rendered audio may be cached and replayed.
+        """
+        self.text = text
+        self.priority = priority
+        self.cacheable = cacheable
+        self.interrupted = False
+        self.startedAt = None
+        self.finishedAt = None
+        self._done = threading.Event()
+
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until the utterance has been spoken, interrupted or dropped.
+
+        :param timeout: Seconds to wait; None waits indefinitely.
+        :return: True if the utterance finished within the timeout.
+        """
+        return self._done.wait(timeout)
+
+    def _finish(self, interrupted: bool = False) -> None:
+        self.interrupted = interrupted
+        self.finishedAt = time.monotonic()
+        self._done.set()
+
+
+class Pyttsx3Backend:
+    def __init__(self, rateFactor: float = 0.95, phraseCache: Optional[PhraseCache] = None,
+                 phrases: Sequence[str] = ()):
+        """
+        pyttsx3 speech output. The engine is created on the speech worker thread, which is
+        the only thread that uses it.
+
+        The configured fixed phrases, and utterances submitted as cacheable, are rendered to WAV
+        once and played back from the phrase cache afterwards. Other text is spoken live, as
+        rendering and then playing it would be slower and fill the cache with one-off strings.
+
+        :param rateFactor: Multiplier applied to the default speaking rate.
+        :param phraseCache: Optional cache of rendered utterances.
+        :param phrases: Fixed phrases, rendered into the cache while the worker has nothing to say.
+        """
+        self.rateFactor = rateFactor
+        self.phraseCache = phraseCache
+        self.phrases = list(phrases)
+        self._fixed = set(self.phrases)
+        self._unrendered = list(self.phrases) if phraseCache is not None else []
+        self.engine = None
+        self.voice = ""
+        self.rate = 0
+        self._audio = None
+        self._shouldStop = None
+
+    def open(self) -> None:
+        import pyttsx3
+        self.engine = pyttsx3.init()
+        rate = self.engine.getProperty("rate")
+        self.engine.setProperty("rate", int(rate * self.rateFactor))
+        self.voice = str(self.engine.getProperty("voice"))
+        self.rate = int(self.engine.getProperty("rate"))
+        # pyttsx3 can only be interrupted from its own callbacks
+        self.engine.connect("started-word", self._on_word)
+
+    def prerender(self) -> bool:
+        """
+        Render the next fixed phrase missing from the cache.
+
+        :return: Whether phrases remain to be rendered.
+        """
+        while self._unrendered:
+            phrase = self._unrendered.pop(0)
+            if self.phraseCache.get(phrase, self.voice, self.rate) is None:
+                self._render(phrase)
+                break
+        return bool(self._unrendered)
+
+    def _on_word(self, name, location, length) -> None:
+        if self._shouldStop is not None and self._shouldStop():
+            self.engine.stop()
+
+    def _render(self, text: str) -> Optional[Path]:
+        def render(path: Path) -> None:
+            self.engine.save_to_file(text, str(path))
+            self.engine.runAndWait()
+        return self.phraseCache.put(text, self.voice, self.rate, render)
+
+    def _play(self, path: Path, shouldStop: Callable[[], bool]) -> bool:
+        """Play a cached WAV file. Returns False if it cannot be played, so live synthesis is used instead."""
+        try:
+            import pyaudio
+        except ImportError:
+            return False
+        try:
+            with wave.open(str(path), "rb") as wav:
+                if self._audio is None:
+                    self._audio = pyaudio.PyAudio()
+                stream = self._audio.open(
+                    format=self._audio.get_format_from_width(wav.getsampwidth()),
+                    channels=wav.getnchannels(),
+                    rate=wav.getframerate(),
+                    output=True,
+                )
+                try:
+                    data = wav.readframes(1024)
+                    while data and not shouldStop():
+                        stream.write(data)
+                        data = wav.readframes(1024)
+                finally:
+                    stream.stop_stream()
+                    stream.close()
+            return True
+        except (wave.Error, EOFError, OSError) as e:
+            logger.warning(f"Cannot play cached phrase {path}: {e}")
+            return False
+
+    def say(self, text: str, shouldStop: Callable[[], bool], cacheable: bool = False) -> None:
+        if self.phraseCache is not None and (cacheable or text in self._fixed):
+            path = self.phraseCache.get(text, self.voice, self.rate) or self._render(text)
+            if path is not None and self._play(path, shouldStop):
+                self.phraseCache.flush()
+                return
+        self._shouldStop = shouldStop
+        try:
+            self.engine.say(text)
+            self.engine.runAndWait()
+        finally:
+            self._shouldStop = None
+
+
+class NullBackend:
+    def __init__(self, secondsPerChar: float = 0.0):
+        """
+        Speech output that only records what would have been said, for tests and headless runs.
+
+        :param secondsPerChar: Simulated speaking time per character.
+        """
+        self.secondsPerChar = secondsPerChar
+        self.spoken: List[str] = []
+        self.interrupted: List[str] = []
+
+    def open(self) -> None:
+        pass
+
+    def say(self, text: str, shouldStop: Callable[[], bool], cacheable: bool = False) -> None:
+        deadline = time.monotonic() + len(text) * self.secondsPerChar
+        while time.monotonic() < deadline:
+            if shouldStop():
+                self.interrupted.append(text)
+                return
+            time.sleep(min(0.01, max(0.0, deadline - time.monotonic())))
+        self.spoken.append(text)
+
+
+class SpeechWorker(threading.Thread):
+    def __init__(self, backend=None):
+        """
+        Background thread that speaks queued utterances in priority order.
+
+        An utterance identical to one still waiting in the queue is coalesced with it, and
+        a more urgent utterance interrupts a less urgent one that is being spoken.
+
+        :param backend: Speech output backend; defaults to pyttsx3.
+        """
+        super().__init__(name="SpeechWorker", daemon=True)
+        self.backend = backend if backend is not None else Pyttsx3Backend()
+        self._queue = []
+        self._pending: Dict[str, SpeechHandle] = {}
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._current: Optional[SpeechHandle] = None
+        self._interrupt = False
+        self._running = True
+        self.lastSpokeAt = 0.0
+        self._lastStartedAt = 0.0
+        self._ready = threading.Event()
+
+    def submit(self, text: str, priority: Priority = Priority.NORMAL, cacheable: bool = False) -> SpeechHandle:
+        """
+        Queue an utterance.
+
+        :param text: Text to speak.
+        :param priority: Priority of the utterance.
+        :param cacheable: Whether to cache the rendered audio; the backend's fixed phrases always are.
+        :return: Handle that can be waited on.
+        """
+        with self._condition:
+            handle = self._pending.get(text)
+            if handle is not None:
+                if priority < handle.priority:
+                    handle.priority = priority
+                    heapq.heappush(self._queue, (priority, next(self._counter), handle))
+                return handle
+            handle = SpeechHandle(text, priority, cacheable)
+            self._pending[text] = handle
+            heapq.heappush(self._queue, (priority, next(self._counter), handle))
+            if self._current is not None and priority < self._current.priority:
+                self._interrupt = True
+            self._condition.notify_all()
+            return handle
+
+    @property
+    def speaking(self) -> bool:
+        return self._current is not None
+
+    def idle(self) -> bool:
+        with self._condition:
+            return self._current is None and not self._pending
+
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until nothing is being spoken or queued.
+
+        :param timeout: Seconds to wait; None waits indefinitely.
+        :return: True if the worker became idle within the timeout.
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: self._current is None and not self._pending, timeout=timeout)
+
+    def spoke_between(self, start: float, end: float, tail: float = 0.0) -> bool:
+        """
+        Whether speech output overlapped the interval [start, end] of time.monotonic().
+
+        :param tail: Seconds after each utterance still counted as speaking (room echo).
+        """
+        with self._condition:
+            current = self._current
+            if current is not None and current.startedAt is not None and current.startedAt <= end:
+                return True
+            return self._lastStartedAt <= end and self.lastSpokeAt + tail >= start
+
+    def stop(self) -> None:
+        with self._condition:
+            self._running = False
+            self._interrupt = True
+            self._condition.notify_all()
+
+    def _should_stop(self) -> bool:
+        return self._interrupt
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """Block until the speech backend has been initialized (or failed to)."""
+        return self._ready.wait(timeout)
+
+    def run(self) -> None:
+        try:
+            self.backend.open()
+        except Exception as e:
+            logger.error(f"Failed to initialize text-to-speech: {e}")
+        finally:
+            self._ready.set()
+        # Fixed phrases are rendered between utterances, so queued speech never waits for all of them
+        prerendering = hasattr(self.backend, "prerender")
+        while True:
+            with self._condition:
+                if prerendering and not self._queue and self._running:
+                    handle = None
+                else:
+                    self._condition.wait_for(lambda: self._queue or not self._running)
+                    if not self._running:
+                        break
+                    _, _, handle = heapq.heappop(self._queue)
+            if handle is None:
+                try:
+                    prerendering = self.backend.prerender()
+                except Exception as e:
+                    logger.error(f"Failed to render fixed phrases: {e}")
+                    prerendering = False
+                continue
+            with self._condition:
+                if handle.done() or self._pending.get(handle.text) is not handle:
+                    # Stale heap entry left behind when a queued utterance was re-prioritized
+                    continue
+                del self._pending[handle.text]
+                self._current = handle
+                self._interrupt = False
+            handle.startedAt = time.monotonic()
+            try:
+                self.backend.say(handle.text, self._should_stop, cacheable=handle.cacheable)
+            except Exception as e:
+                logger.error(f"Error in text-to-speech: {e}")
+            with self._condition:
+                interrupted = self._interrupt
+                self._current = None
+                self._interrupt = False
+                self.lastSpokeAt = time.monotonic()
+                self._lastStartedAt = handle.startedAt
+                handle._finish(interrupted=interrupted)
+                if interrupted:
+                    logger.info(f"Interrupted speech: {handle.text}")
+                self._condition.notify_all()
+            metrics = get_metrics()
+            metrics.observe("tts_seconds", self.lastSpokeAt - handle.startedAt)
+            metrics.inc("tts_utterances_total", interrupted=str(interrupted).lower())
+        with self._condition:
+            for _, _, handle in self._queue:
+                if not handle.done():
+                    handle._finish(interrupted=True)
+            self._queue.clear()
+            self._pending.clear()
+            self._condition.notify_all()
+
+
+_speechWorker: Optional[SpeechWorker] = None
+_speechLock = threading.Lock()
+
+
+def configure_speech(speechConfig: Optional[Dict[str, Any]] = None, backend=None) -> SpeechWorker:
+    """
+    (Re)create the speech worker from the speech section of the configuration.
+
+    :param speechConfig: Mapping with backend ("pyttsx3" or "null"), rateFactor, secondsPerChar
+        and a phraseCache section (enabled, dir, maxMegabytes, phrases).
+    :param backend: Explicit backend instance, overriding the configuration.
+    :return: The running speech worker.
+    """
+    global _speechWorker
+    speechConfig = speechConfig or {}
+    if backend is None:
+        if speechConfig.get("backend", "pyttsx3") == "null":
+            backend = NullBackend(secondsPerChar=speechConfig.get("secondsPerChar", 0.0))
+        else:
+            cacheConfig = speechConfig.get("phraseCache", {})
+            phraseCache = None
+            if cacheConfig.get("enabled", False):
+                phraseCache = PhraseCache(
+                    cacheConfig.get("dir", "data/ttsCache"),
+                    maxBytes=int(cacheConfig.get("maxMegabytes", 50) * 1024 * 1024),
+                )
+            backend = Pyttsx3Backend(
+                rateFactor=speechConfig.get("rateFactor", 0.95),
+                phraseCache=phraseCache,
+                phrases=cacheConfig.get("phrases", []),
+            )
+    with _speechLock:
+        if _speechWorker is not None:
+            _speechWorker.stop()
+        _speechWorker = SpeechWorker(backend)
+        _speechWorker.start()
+        return _speechWorker
+
+
+def get_speech_worker() -> SpeechWorker:
+    """Return the speech worker, starting one with the default backend on first use."""
+    with _speechLock:
+        worker = _speechWorker
+    return worker if worker is not None else configure_speech()
+
+
+_audioStream: Optional[AudioStream] = None
+_recognizer = None
+_audioConfig: Dict[str, Any] = {}
+
+
+def _overlaps_speech(start: float, end: float) -> bool:
+    worker = _speechWorker
+    if worker is None:
+        return False
+    return worker.spoke_between(start, end, tail=_audioConfig.get("echoTailSeconds", 0.3))
+
+
+def configure_audio(audioConfig: Optional[Dict[str, Any]] = None, stream: Optional[AudioStream] = None,
+                    recognizer=None) -> AudioStream:
+    """
+    (Re)create the always-on audio capture and the speech recognizer from the audio section
+    of the configuration. Utterances overlapping our own speech output are dropped.
+
+    :param audioConfig: Mapping with source (microphone or wav), VAD, recognizer and timeout options.
+    :param stream: Explicit audio stream, overriding the configuration.
+    :param recognizer: Explicit recognizer, overriding the configuration.
+    :return: The running audio stream.
+    """
+    global _audioStream, _recognizer, _audioConfig
+    audioConfig = audioConfig or {}
+    with _speechLock:
+        if _audioStream is not None:
+            _audioStream.stop()
+        _audioConfig = audioConfig
+        # Created on first use or by get_recognizer(), as loading a recognizer can be slow
+        _recognizer = recognizer
+        _audioStream = stream if stream is not None else create_audio_stream(audioConfig, suppress=_overlaps_speech)
+        try:
+            _audioStream.start()
+        except Exception as e:
+            # Retried on the next listenAudio()
+            logger.error(f"Failed to start audio capture: {e}")
+        return _audioStream
+
+
+def get_audio_stream() -> AudioStream:
+    """Return the audio stream, starting one from the default microphone on first use."""
+    with _speechLock:
+        stream = _audioStream
+    return stream if stream is not None else configure_audio()
+
+
+def get_recognizer():
+    """Return the speech recognizer, creating it from the audio configuration on first use."""
+    global _recognizer
+    with _speechLock:
+        if _recognizer is None:
+            _recognizer = create_recognizer(_audioConfig)
+        return _recognizer
+
+
+def listenAudio(timeout=None, since=None, prompt=True):
+    """
+    Return the next utterance heard, lower-cased.
+
+    Without since, utterances spoken up to audio.maxAgeSeconds before the call are still
+    returned, so that a command said just before listening starts is not lost; the
+    "Listening..." prompt is only spoken when nothing is waiting. Callers expecting the answer
+    to a question pass the time the question finished, so that earlier speech is not taken
+    for the answer. Callers polling with a short timeout pass prompt=False.
+
+    :param timeout: Seconds to wait for an utterance; None uses audio.listenTimeout (null waits indefinitely).
+    :param since: time.monotonic() timestamp; utterances that ended before it are discarded.
+    :param prompt: Whether to say "Listening..." when nothing is waiting.
+    :return: The recognized text, or None if nothing was heard or understood.
+    """
+    stream = get_audio_stream()
+    if since is None:
+        since = time.monotonic() - _audioConfig.get("maxAgeSeconds", 5.0)
+    if timeout is None:
+        timeout = _audioConfig.get("listenTimeout")
+    segment = stream.next_segment(timeout=0, since=since)
+    if segment is None:
+        if prompt:
+            speak("Listening...", wait=True)
+            logger.info("Listening...")
+        segment = stream.next_segment(timeout=timeout, since=since)
+    if segment is None:
+        if prompt:
+            logger.info("No speech heard.")
+        return None
+    metrics = get_metrics()
+    start = time.perf_counter()
     try:
-        text = recognizer.recognize_google(audio)
-        logger.info(f"You said: {text}")
-        return text.lower()
-    except sr.UnknownValueError:
+        text = get_recognizer().recognize(segment)
+    except RuntimeError as e:
+        logger.error(f"Could not request results; {e}")
+        metrics.inc("asr_utterances_total", result="error")
+        return None
+    finally:
+        metrics.observe("asr_seconds", time.perf_counter() - start)
+    metrics.inc("asr_utterances_total", result="recognized" if text else "not_understood")
+    if not text:
         speak("Sorry, I did not understand that.")
         logger.warning("Sorry, I did not understand that.")
         return None
-    except sr.RequestError as e:
-        logger.error(f"Could not request results; {e}")
-        return None
-    
+    logger.info(f"You said: {text}")
+    return text.lower()
 
-def speak(text):
-    try:
-        tts.say(text)
-        tts.runAndWait()
-    except ImportError:
-        logger.error("pyttsx3 is not installed. Please install it to use text-to-speech functionality.")
-    except Exception as e:
-        logger.error(f"Error in text-to-speech: {e}")
-    
+
+def speak(text, priority=Priority.NORMAL, wait=False, cacheable=False):
+    """
+    Queue text for speech without blocking the caller.
+
+    :param text: Text to speak.
+    :param priority: Priority; more urgent utterances interrupt less urgent ones.
+    :param wait: Block until the utterance has been spoken.
+    :param cacheable: Whether to cache the rendered audio; the configured fixed phrases always are.
+    :return: SpeechHandle for the utterance.
+    """
+    handle = get_speech_worker().submit(text, priority, cacheable)
+    if wait:
+        handle.wait()
+    return handle
@@ -0,0 +1,270 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from src.agents.faceTracker import FaceTracker, Track
+from src.agents.frameRate import CpuBudget
+from src.agents.frameSource import FrameSource
+from src.agents.guardStateMachine import GuardState
+from src.agents.motionDetector import MotionDetector
+
+logger = logging.getLogger(__name__)
+
+
+class CameraStream:
+    def __init__(self, name: str, frameSource: FrameSource, faceTracker: FaceTracker,
+                 motionDetector: MotionDetector, priority: float = 1.0, recognitionPool=None,
+                 readTimeout: float = 2.0, evidence=None, frameRate=None):
+        """
+        One guarded camera with its own tracker, motion gate and escalation state.
+
+        :param name: Name used in logs and announcements.
+        :param frameSource: Source of frames, used when recognition runs in-process.
+        :param faceTracker: Tracker bound to this stream's trusted-face gallery.
+        :param motionDetector: Motion gate for this stream.
+        :param priority: Relative share of the recognition budget.
+        :param recognitionPool: Optional RecognitionPool doing capture and recognition out of process.
+        :param readTimeout: Seconds to wait for a frame or result.
+        :param evidence: Optional EvidenceRecorder fed with every captured frame.
+        :param frameRate: Optional AdaptiveFrameRate setting the capture rate of the frame source.
+        """
+        self.name = name
+        self.frameSource = frameSource
+        self.faceTracker = faceTracker
+        self.motionDetector = motionDetector
+        self.priority = priority
+        self.recognitionPool = recognitionPool
+        self.readTimeout = readTimeout
+        self.evidence = evidence
+        self.frameRate = frameRate
+        if evidence is not None:
+            frameSource.listeners.append(evidence.add)
+        self.state = GuardState.IDLE
+        self.recheckSince = None
+        self.intruderResponse = None
+        self.speculation = None
+        # Task speaking or listening on behalf of this stream, if any
+        self.dialog = None
+        self.acknowledged = {}
+        self.lastObservedAt = None
+        self.motionActive = False
+        self.virtualTime = 0.0
+        self.recognitions = 0
+        self.latencies = deque(maxlen=500)
+
+    @property
+    def feed(self):
+        return self.recognitionPool or self.frameSource
+
+    @property
+    def exhausted(self) -> bool:
+        return self.feed.exhausted
+
+    @property
+    def level(self) -> int:
+        """Escalation level: 1 after the Level 1 response, 2 after the Level 2 response, otherwise 0."""
+        return {GuardState.LEVEL1: 1, GuardState.LEVEL2: 2}.get(self.state, 0)
+
+    @property
+    def escalating(self) -> bool:
+        return self.level > 0 or self.recheckSince is not None
+
+    def start(self) -> None:
+        if self.evidence is not None:
+            self.evidence.start()
+        if self.frameRate is not None:
+            # Sampled as activity until the motion gate has a background to compare with
+            self.frameSource.set_fps(self.frameRate.update(active=True))
+        self.feed.start()
+        self.motionDetector.reset()
+        self.faceTracker.reset()
+        self.state = GuardState.IDLE
+        self.recheckSince = None
+        self.speculation = None
+        self.dialog = None
+        self.acknowledged = {}
+
+    def stop(self) -> None:
+        self.feed.stop()
+        if self.evidence is not None:
+            self.evidence.stop()
+
+    def pending(self) -> bool:
+        """Whether a new frame or recognition result is waiting to be processed."""
+        return self.feed.pending()
+
+    def observe(self) -> Optional[List[Track]]:
+        """
+        Process the newest frame of the stream and update its face tracks.
+
+        The motion gate is bypassed while re-checking after an escalation step.
+
+        :return: Live tracks, an empty list when the frame was gated out, or None if nothing could be read.
+        """
+        useMotionGate = self.recheckSince is None
+        if self.recognitionPool is not None:
+            return self._observe_pool(useMotionGate)
+        frame = self.frameSource.read(timeout=self.readTimeout)
+        if frame is None:
+            logger.warning(f"Failed to capture image from camera {self.name}.")
+            return None
+        self.lastObservedAt = frame.timestamp
+        region = None
+        if useMotionGate:
+            # Skip recognition while the room is unchanged
+            motion = self.motionDetector.update(frame.image)
+            self.motionActive = motion.active
+            self._adapt_rate(frame.timestamp)
+            if not motion.active:
+                return []
+            region = motion.region
+        else:
+            self._adapt_rate(frame.timestamp)
+        start = time.process_time()
+        tracks = self.faceTracker.update(frame.image, region=region)
+        self.motionDetector.note_recognition(time.process_time() - start)
+        self.recognitions += 1
+        self.latencies.append(time.monotonic() - frame.timestamp)
+        return tracks
+
+    def _adapt_rate(self, now: float) -> None:
+        if self.frameRate is not None:
+            # Streams only capture while guarding; the camera is closed otherwise
+            self.frameSource.set_fps(self.frameRate.update(self.motionActive, self.escalating, guarding=True, now=now))
+
+    def _observe_pool(self, useMotionGate: bool) -> Optional[List[Track]]:
+        self.recognitionPool.set_motion_gate(useMotionGate)
+        while True:
+            result = self.recognitionPool.get_result(timeout=self.readTimeout)
+            if result is None:
+                if useMotionGate and not self.recognitionPool.exhausted:
+                    # The capture process publishes nothing while the room is unchanged
+                    return []
+                logger.warning(f"No recognition result received from camera {self.name}.")
+                return None
+            if self.recheckSince is None or result.timestamp >= self.recheckSince:
+                self.lastObservedAt = result.timestamp
+                self.motionActive = True
+                self.recognitions += 1
+                self.latencies.append(time.monotonic() - result.timestamp)
+                return self.faceTracker.ingest(result.matches, now=result.timestamp)
+
+    def stats(self) -> Dict[str, Any]:
+        """Escalation level, recognition count, latency percentiles and backpressure of the stream."""
+        latencies = np.array(self.latencies) if self.latencies else np.zeros(1)
+        feedStats = self.feed.stats()
+        return {
+            "name": self.name,
+            "state": self.state.name,
+            "level": self.level,
+            "recognitions": self.recognitions,
+            "latencyP50": float(np.percentile(latencies, 50)),
+            "latencyP95": float(np.percentile(latencies, 95)),
+            "framesDropped": feedStats.get("framesDropped", feedStats.get("dropped", 0)),
+            "captureFps": self.frameSource.fps if self.recognitionPool is None else None,
+            "pending": self.pending(),
+        }
+
+
+class FrameScheduler:
+    def __init__(self, streams: List[CameraStream], budget: float = 0.0, boost: float = 4.0,
+                 cpuBudget: float = 0.0, maxRecognitionInterval: float = 2.0):
+        """
+        Shares a fixed recognition budget between camera streams.
+
+        Streams with a pending frame are served in stride-scheduling order: each service
+        advances a stream's virtual time by 1 / weight, and the ready stream with the
+        smallest virtual time goes next. The weight is the stream's priority, multiplied
+        by boost while the stream has motion or an active escalation. While no stream has a
+        pending frame the scheduler sleeps on one event set by every frame source and
+        recognition pool.
+
+        Streams recognizing out of process are paced (see RecognitionPool), so the budget limits
+        the recognitions their workers run, not only how fast results are read.
+
+        :param streams: Streams to schedule.
+        :param budget: Recognitions per second across all streams; 0 means unlimited.
+        :param boost: Weight multiplier for streams with motion or an escalation.
+        :param cpuBudget: Share of all cores the process may use, in percent; streams are served
+            less often while it is exceeded, except during an escalation. 0 means unlimited.
+        :param maxRecognitionInterval: Longest delay between two services caused by the CPU budget.
+        """
+        self.streams = streams
+        self.budget = budget
+        self.boost = boost
+        self.tokens = max(1.0, budget)
+        self._lastRefill = time.monotonic()
+        self.virtualTime = 0.0
+        self.cpuBudget = CpuBudget(cpuBudget, maxRecognitionInterval) if cpuBudget > 0 else None
+        self._wake = threading.Event()
+        for stream in streams:
+            stream.frameSource.waiters.append(self._wake)
+            if stream.recognitionPool is not None:
+                stream.recognitionPool.waiters.append(self._wake)
+                stream.recognitionPool.paced = budget > 0
+
+    def weight(self, stream: CameraStream) -> float:
+        boosted = stream.motionActive or stream.escalating
+        return max(1e-6, stream.priority * (self.boost if boosted else 1.0))
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        if self.budget > 0:
+            self.tokens = min(max(1.0, self.budget), self.tokens + (now - self._lastRefill) * self.budget)
+        self._lastRefill = now
+
+    def next(self, timeout: float = 1.0) -> Optional[CameraStream]:
+        """
+        Wait for the next stream to serve.
+
+        :param timeout: Seconds to wait for any stream to have a pending frame.
+        :return: The stream, or None on timeout or when every stream has ended.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            # Cleared before checking, so a frame arriving meanwhile still wakes the wait below
+            self._wake.clear()
+            live = [stream for stream in self.streams if not stream.exhausted]
+            if not live:
+                return None
+            ready = [stream for stream in live if stream.pending() or stream.escalating]
+            if ready:
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            self._wake.wait(remaining)
+
+        # A stream that was idle must not bank credit while it was waiting
+        for stream in ready:
+            stream.virtualTime = max(stream.virtualTime, self.virtualTime)
+        stream = min(ready, key=lambda s: s.virtualTime)
+        self.virtualTime = stream.virtualTime
+
+        if self.budget > 0:
+            self._refill()
+            if self.tokens < 1.0:
+                time.sleep((1.0 - self.tokens) / self.budget)
+                self._refill()
+        # Recognition runs on one thread, so a throttled stream would hold up an escalating one
+        if self.cpuBudget is not None and not any(candidate.escalating for candidate in ready):
+            self.cpuBudget.wait()
+        return stream
+
+    def charge(self, stream: CameraStream, recognized: bool) -> None:
+        """
+        Account for having served a stream.
+
+        :param stream: The stream that was served.
+        :param recognized: Whether recognition actually ran (gated frames do not use the budget).
+        """
+        stream.virtualTime += 1.0 / self.weight(stream)
+        if recognized and self.budget > 0:
+            self.tokens -= 1.0
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [stream.stats() for stream in self.streams]
@@ -0,0 +1,195 @@
+import atexit
+import json
+import logging
+import math
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def json_number(value: float, digits: int = 4) -> Optional[float]:
+    """Round a number for the journal; infinities and NaN, which JSON cannot represent, become null."""
+    return round(value, digits) if math.isfinite(value) else None
+
+
+class NullJournal:
+    """Journal used while the event journal is disabled: every call returns immediately."""
+    enabled = False
+
+    def record(self, event: str, **fields: Any) -> None:
+        pass
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class EventJournal(NullJournal):
+    enabled = True
+
+    def __init__(self, path: str, maxBytes: int = 20 * 1024 * 1024, backupCount: int = 5,
+                 flushInterval: float = 1.0, batchSize: int = 256):
+        """
+        Append-only JSONL journal of guard events.
+
+        record() only stamps the event and queues it. A writer thread appends queued events in
+        batches, at least every flushInterval seconds, and rotates the file once it would exceed
+        maxBytes (events.jsonl -> events.jsonl.1 -> ... -> events.jsonl.<backupCount>).
+
+        :param path: Journal file.
+        :param maxBytes: Size at which the file is rotated.
+        :param backupCount: Number of rotated files kept.
+        :param flushInterval: Maximum seconds an event waits before being written.
+        :param batchSize: Maximum events written at once.
+        """
+        self.path = Path(path)
+        self.maxBytes = maxBytes
+        self.backupCount = backupCount
+        self.flushInterval = flushInterval
+        self.batchSize = batchSize
+        self.written = 0
+        self._queue = queue.SimpleQueue()
+        self._closed = False
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="EventJournal", daemon=True)
+        self._thread.start()
+
+    def record(self, event: str, **fields: Any) -> None:
+        """Queue an event with its wall-clock time; fields must be JSON-serializable."""
+        self._queue.put(dict(time=time.time(), event=event, **fields))
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        """Wait until the events recorded so far have been written."""
+        marker = threading.Event()
+        self._queue.put(marker)
+        marker.wait(timeout)
+
+    def close(self) -> None:
+        """Write the remaining events and stop the writer."""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._thread.join(timeout=5.0)
+
+    def _run(self) -> None:
+        running = True
+        while running:
+            batch: List[Dict[str, Any]] = []
+            markers = []
+            try:
+                item = self._queue.get()
+                deadline = time.monotonic() + self.flushInterval
+                while True:
+                    if item is None:
+                        running = False
+                        break
+                    if isinstance(item, threading.Event):
+                        markers.append(item)
+                        break
+                    batch.append(item)
+                    remaining = deadline - time.monotonic()
+                    if len(batch) >= self.batchSize or remaining <= 0:
+                        break
+                    item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                pass
+            if batch:
+                try:
+                    self._write(batch)
+                except OSError as e:
+                    logger.error(f"Failed to write {len(batch)} journal events: {e}")
+            for marker in markers:
+                marker.set()
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        data = "".join(json.dumps(event, default=str) + "\n" for event in batch).encode()
+        try:
+            size = self.path.stat().st_size
+        except FileNotFoundError:
+            size = 0
+        if size and size + len(data) > self.maxBytes:
+            self._rotate()
+        with open(self.path, "ab") as file:
+            file.write(data)
+        self.written += len(batch)
+
+    def _rotate(self) -> None:
+        if self.backupCount <= 0:
+            self.path.unlink()
+            return
+        for i in range(self.backupCount - 1, 0, -1):
+            source = self.path.with_name(f"{self.path.name}.{i}")
+            if source.exists():
+                os.replace(source, self.path.with_name(f"{self.path.name}.{i + 1}"))
+        os.replace(self.path, self.path.with_name(f"{self.path.name}.1"))
+
+
+def journal_files(path: str) -> List[Path]:
+    """The journal file and its rotated predecessors, oldest first."""
+    current = Path(path)
+    rotated = []
+    for candidate in current.parent.glob(f"{current.name}.*"):
+        suffix = candidate.name[len(current.name) + 1:]
+        if suffix.isdigit():
+            rotated.append((int(suffix), candidate))
+    files = [candidate for _, candidate in sorted(rotated, reverse=True)]
+    if current.exists():
+        files.append(current)
+    return files
+
+
+def read_events(path: str) -> Iterator[Dict[str, Any]]:
+    """Events of a journal and its rotated files in the order they were written."""
+    for file in journal_files(path):
+        with open(file) as lines:
+            for line in lines:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # A line cut short by a crash
+                    continue
+
+
+_journal = NullJournal()
+_journalLock = threading.Lock()
+
+
+def configure_journal(journalConfig: Optional[Dict[str, Any]] = None):
+    """
+    (Re)create the event journal from the journal section of the configuration.
+
+    :param journalConfig: Mapping with enabled, path, maxMegabytes, backupCount and flushInterval.
+    :return: The active journal; a NullJournal when disabled.
+    """
+    global _journal
+    journalConfig = journalConfig or {}
+    with _journalLock:
+        _journal.close()
+        if journalConfig.get("enabled", False):
+            _journal = EventJournal(
+                journalConfig.get("path", "logs/events.jsonl"),
+                maxBytes=int(journalConfig.get("maxMegabytes", 20) * 1024 * 1024),
+                backupCount=journalConfig.get("backupCount", 5),
+                flushInterval=journalConfig.get("flushInterval", 1.0),
+            )
+        else:
+            _journal = NullJournal()
+        return _journal
+
+
+def get_journal():
+    """The active event journal; a NullJournal unless configure_journal enabled it."""
+    return _journal
+
+
+@atexit.register
+def _close_journal() -> None:
+    # Writes out the events still queued
+    _journal.close()
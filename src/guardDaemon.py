@@ -0,0 +1,385 @@
+import http.client
+import json
+import logging
+import os
+import socket
+import socketserver
+import stat
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from src.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+
+class ControlError(Exception):
+    """A control request that cannot be carried out; reported to the client with its HTTP status."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+class GuardDaemon:
+    def __init__(self, agent, voice: bool = True, shutdownMinScore: float = 95.0):
+        """
+        Keeps one GuardAgent, with its models, galleries, cameras and LLM client, loaded for the
+        life of the process and controls it through commands instead of restarts.
+
+        Guarding runs on its own thread, so every command returns at once: activate starts
+        that thread and deactivate asks it to stop, as a trusted person saying so would.
+        Voice is one client among others: a listener thread passes what it hears to command(),
+        like POST /command does, and pauses while guarding, when the guard dialogs own the
+        microphone. It listens in short polls under a lock that the guard thread takes before
+        guard mode starts, so it never takes an utterance meant for a guard dialog.
+
+        :param agent: The GuardAgent.
+        :param voice: Whether to listen for voice commands.
+        :param shutdownMinScore: Match score (0-100) a shutdown command needs, higher than for other
+            commands as a shutdown cannot be undone by voice; 100 accepts configured phrases only.
+        """
+        self.agent = agent
+        self.voice = voice
+        self.shutdownMinScore = shutdownMinScore
+        self.started = time.monotonic()
+        self.servers: List[ControlServer] = []
+        self._guardThread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        # Held by the voice listener while it takes an utterance, and by the guard thread as it starts
+        self._voiceLock = threading.Lock()
+
+    @property
+    def guarding(self) -> bool:
+        return self._guardThread is not None and self._guardThread.is_alive()
+
+    def activate(self) -> Dict[str, Any]:
+        with self._lock:
+            if self.guarding:
+                raise ControlError("Guard mode is already active", 409)
+            # Cleared before the guard thread starts, so a deactivation that follows at once is kept
+            self.agent.stopRequested = False
+            self._guardThread = threading.Thread(target=self._guard, name="Guard", daemon=True)
+            self._guardThread.start()
+        return {"guarding": True}
+
+    def _guard(self) -> None:
+        with self._voiceLock:
+            # The listener now sees guarding and leaves the microphone to the guard dialogs
+            pass
+        try:
+            # Blocks until guard mode ends
+            self.agent.activate_guard()
+        except Exception as e:
+            logger.exception(f"Guard mode failed: {e}")
+        if self.agent.guardMode:
+            # The frame feed ended or guarding failed: release the cameras
+            self.agent.deactivate_guard()
+
+    def deactivate(self) -> Dict[str, Any]:
+        with self._lock:
+            if not self.guarding:
+                raise ControlError("Guard mode is not active", 409)
+            # Handled by the guard loop within half a second, as a spoken deactivation is
+            self.agent.stopRequested = True
+        return {"guarding": False}
+
+    def state(self) -> Dict[str, Any]:
+        agent = self.agent
+        return {
+            "guardMode": agent.guardMode,
+            "guarding": self.guarding,
+            "warmup": agent.warmup.status(),
+            "streams": [stream.stats() for stream in agent.streams],
+            "galleries": {path: len(faceRecognition.gallery) for path, faceRecognition in list(agent.galleries.items())},
+            "uptimeSeconds": time.monotonic() - self.started,
+        }
+
+    def enroll(self, name: str, imageBytes: bytes, camera: Optional[str] = None) -> Dict[str, Any]:
+        start = time.perf_counter()
+        try:
+            enrolled = self.agent.enrollFace(name, imageBytes, camera=camera)
+        except ValueError as e:
+            raise ControlError(str(e), 422)
+        return dict(enrolled, seconds=time.perf_counter() - start)
+
+    def command(self, text: str, spoken: bool = False) -> Dict[str, Any]:
+        """
+        Carry out a command phrase, as the voice loop of scripts/milestone3.py did.
+
+        :param text: Recognized or typed phrase.
+        :param spoken: Whether it was heard; only then is the outcome spoken back.
+        :return: The matched intent and the result of the command.
+        """
+        # Imported on use, so that clients of the control API do not load the audio stack
+        from src.agents.speechRecognition import speak
+        match = self.agent.commandMatcher.match(text)
+        result: Dict[str, Any] = {"intent": match.intent}
+        if match.intent == "activationCommand":
+            if spoken:
+                speak("Activating guard mode.")
+            result.update(self.activate())
+        elif match.intent == "deactivationCommand":
+            if spoken:
+                speak("Deactivating guard mode.")
+            result.update(self.deactivate())
+        elif match.intent == "shutdownCommand":
+            if match.score < self.shutdownMinScore:
+                if spoken:
+                    speak("Please say the shutdown command exactly.")
+                raise ControlError(f"'{text}' is too far from a shutdown command to shut down "
+                                   f"(score {match.score:.0f}, {self.shutdownMinScore:.0f} needed)", 409)
+            if spoken:
+                speak("Shutting down. Goodbye!", wait=True)
+            result.update(self.shutdown())
+        elif spoken:
+            speak("Command not recognized. Please try again.")
+        return result
+
+    def shutdown(self) -> Dict[str, Any]:
+        self._stopping.set()
+        return {"stopping": True}
+
+    def _listen(self, pollSeconds: float = 0.5) -> None:
+        from src.agents.speechRecognition import listenAudio, speak
+        prompted = False
+        while not self._stopping.is_set():
+            with self._voiceLock:
+                guarding = self.guarding
+                if not guarding:
+                    if not prompted:
+                        speak("Listening...", wait=True)
+                        prompted = True
+                    # Heard before guard mode started, so it is a command even if guarding starts now
+                    text = listenAudio(timeout=pollSeconds, prompt=False)
+            if guarding:
+                prompted = False
+                self._stopping.wait(pollSeconds)
+                continue
+            if not text:
+                continue
+            prompted = False
+            logger.info(f"Recognized speech: {text}")
+            try:
+                self.command(text, spoken=True)
+            except ControlError as e:
+                logger.info(f"Voice command not carried out: {e}")
+
+    def run(self, controlConfig: Optional[Dict[str, Any]] = None, activate: bool = False) -> None:
+        """
+        Serve the control API until shutdown is requested or the process is interrupted.
+
+        :param controlConfig: Mapping with host and port (null disables TCP) and socketPath
+            (null disables the Unix socket).
+        :param activate: Start guarding right away.
+        """
+        controlConfig = controlConfig or {}
+        if controlConfig.get("port") is not None:
+            logger.warning("The TCP control endpoint is enabled; every local user can control the guard through it")
+            self.servers.append(ControlServer(self, host=controlConfig.get("host", "127.0.0.1"),
+                                              port=controlConfig["port"]).start())
+        if controlConfig.get("socketPath") and hasattr(socket, "AF_UNIX"):
+            self.servers.append(ControlServer(self, socketPath=controlConfig["socketPath"]).start())
+        if not self.servers:
+            logger.warning("No control endpoint is configured; the agent can only be controlled by voice")
+        if self.voice:
+            threading.Thread(target=self._listen, name="VoiceCommands", daemon=True).start()
+        if activate:
+            self.activate()
+        try:
+            while not self._stopping.wait(1.0):
+                pass
+        except KeyboardInterrupt:
+            logger.info("Stopping by KeyboardInterrupt.")
+        finally:
+            for server in self.servers:
+                server.stop()
+            if self.guarding:
+                self.agent.stopRequested = True
+                self._guardThread.join(timeout=10.0)
+            logger.info("Guard daemon stopped.")
+
+
+class UnixHTTPServer(ThreadingHTTPServer):
+    address_family = getattr(socket, "AF_UNIX", None)
+
+    def server_bind(self) -> None:
+        # HTTPServer.server_bind expects a (host, port) address
+        socketserver.TCPServer.server_bind(self)
+        self.server_name, self.server_port = "localhost", 0
+
+
+class ControlServer:
+    # (method, path) -> GuardDaemon method
+    ROUTES = {
+        ("GET", "/state"): "state",
+        ("POST", "/activate"): "activate",
+        ("POST", "/deactivate"): "deactivate",
+        ("POST", "/command"): "command",
+        ("POST", "/enroll"): "enroll",
+        ("POST", "/shutdown"): "shutdown",
+    }
+
+    def __init__(self, daemon: GuardDaemon, host: str = "127.0.0.1", port: int = 8765,
+                 socketPath: Optional[str] = None):
+        """
+        Local HTTP control API of a GuardDaemon, on a TCP port or a Unix socket.
+
+        GET /state, /metrics and /metrics.json report; POST /activate, /deactivate and /shutdown
+        control guarding; POST /command takes a command phrase as the text body; POST
+        /enroll?name=<name>[&camera=<camera>] takes an image as the body. Responses are JSON,
+        with an "error" member and a 4xx status when a request cannot be carried out.
+
+        Requests carrying an Origin header come from a web page and are refused with 403, so that a
+        page open in a local browser cannot control the guard.
+
+        :param daemon: Daemon receiving the commands.
+        :param host: Interface of the TCP endpoint; the default only accepts local connections.
+        :param port: TCP port; 0 picks a free one.
+        :param socketPath: Serve on this Unix socket instead of TCP; only its owner may connect.
+        """
+        self.daemon = daemon
+        self.socketPath = socketPath
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keeps connections open between requests, without Nagle delays on small TCP replies
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = not socketPath
+
+            def do_GET(handler):
+                server.handle(handler, "GET")
+
+            def do_POST(handler):
+                server.handle(handler, "POST")
+
+            def log_message(handler, format, *args):
+                logger.debug(f"Control request: {format % args}")
+
+        if socketPath:
+            path = Path(socketPath)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if path.exists() and stat.S_ISSOCK(path.stat().st_mode):
+                # Left behind by a previous daemon that did not shut down
+                path.unlink()
+            self.server = UnixHTTPServer(str(path), Handler)
+            os.chmod(path, 0o600)
+        else:
+            self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, name="ControlServer", daemon=True)
+
+    @property
+    def address(self) -> str:
+        if self.socketPath:
+            return f"unix:{self.socketPath}"
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "ControlServer":
+        self._thread.start()
+        logger.info(f"Control API served at {self.address}")
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        if self.socketPath:
+            Path(self.socketPath).unlink(missing_ok=True)
+
+    def handle(self, handler: BaseHTTPRequestHandler, method: str) -> None:
+        start = time.perf_counter()
+        url = urlsplit(handler.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        body = handler.rfile.read(int(handler.headers.get("Content-Length") or 0))
+        route = self.ROUTES.get((method, url.path))
+        try:
+            if handler.headers.get("Origin") is not None:
+                raise ControlError("Requests from web pages are not accepted", 403)
+            if method == "GET" and url.path == "/metrics":
+                self.reply(handler, 200, get_metrics().prometheus_text().encode(), "text/plain; version=0.0.4; charset=utf-8")
+                return
+            if method == "GET" and url.path == "/metrics.json":
+                result = get_metrics().snapshot()
+            elif route is None:
+                raise ControlError(f"No such endpoint: {method} {url.path}", 404)
+            elif route == "command":
+                result = self.daemon.command(body.decode("utf-8", errors="replace").strip())
+            elif route == "enroll":
+                if "name" not in query:
+                    raise ControlError("The name query parameter is required")
+                result = self.daemon.enroll(query["name"], body, camera=query.get("camera"))
+            else:
+                result = getattr(self.daemon, route)()
+            self.reply(handler, 200, json.dumps(result).encode())
+        except ControlError as e:
+            self.reply(handler, e.status, json.dumps({"error": str(e)}).encode())
+        except Exception as e:
+            logger.exception(f"Control request {method} {url.path} failed: {e}")
+            self.reply(handler, 500, json.dumps({"error": str(e)}).encode())
+        finally:
+            get_metrics().observe("control_request_seconds", time.perf_counter() - start, endpoint=url.path)
+
+    @staticmethod
+    def reply(handler: BaseHTTPRequestHandler, status: int, body: bytes, contentType: str = "application/json") -> None:
+        handler.send_response(status)
+        handler.send_header("Content-Type", contentType)
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socketPath: str, timeout: float = 30.0):
+        super().__init__("localhost", timeout=timeout)
+        self.socketPath = socketPath
+
+    def connect(self) -> None:
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socketPath)
+
+
+class ControlClient:
+    def __init__(self, host: str = "127.0.0.1", port: int = 8765, socketPath: Optional[str] = None,
+                 timeout: float = 30.0):
+        """
+        Client of the control API of a running guard daemon; one connection is kept open.
+
+        :param host: Host of the TCP endpoint.
+        :param port: Port of the TCP endpoint.
+        :param socketPath: Connect to this Unix socket instead.
+        :param timeout: Seconds to wait for a reply.
+        """
+        if socketPath:
+            self.connection = UnixHTTPConnection(socketPath, timeout=timeout)
+        else:
+            self.connection = http.client.HTTPConnection(host, port, timeout=timeout)
+
+    @classmethod
+    def from_config(cls, controlConfig: Optional[Dict[str, Any]] = None) -> "ControlClient":
+        """Connect to the daemon configured by the control section, preferring its Unix socket."""
+        controlConfig = controlConfig or {}
+        socketPath = controlConfig.get("socketPath") if hasattr(socket, "AF_UNIX") else None
+        return cls(controlConfig.get("host", "127.0.0.1"), controlConfig.get("port") or 8765, socketPath)
+
+    def request(self, method: str, path: str, body: bytes = b"") -> Tuple[int, Any]:
+        """
+        Send one request.
+
+        :return: HTTP status and the decoded JSON reply, or the reply text for /metrics.
+        """
+        self.connection.request(method, path, body=body, headers={"Content-Length": str(len(body))})
+        response = self.connection.getresponse()
+        data = response.read()
+        if response.getheader("Content-Type", "").startswith("application/json"):
+            return response.status, json.loads(data)
+        return response.status, data.decode()
+
+    def close(self) -> None:
+        self.connection.close()
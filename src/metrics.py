@@ -0,0 +1,300 @@
+import bisect
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the latency histogram buckets
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+DESCRIPTIONS = {
+    "frames_captured_total": "Frames read from a frame source.",
+    "frame_capture_seconds": "Time to grab one frame from a frame source.",
+    "recognition_stage_seconds": "Time spent per frame in each face recognition stage.",
+    "asr_seconds": "Time to recognize one utterance.",
+    "asr_utterances_total": "Utterances passed to the speech recognizer, by result.",
+    "llm_first_chunk_seconds": "Time from request to the first streamed LLM chunk.",
+    "llm_response_seconds": "Time to generate a complete LLM response.",
+    "llm_requests_total": "LLM requests, by result.",
+    "tts_seconds": "Time to speak one utterance.",
+    "tts_utterances_total": "Utterances spoken, by whether they were interrupted.",
+    "control_request_seconds": "Time to handle one control API request.",
+    "guard_transitions_total": "Guard state transitions.",
+    "gallery_update_seconds": "Time from a trusted-face image appearing to it being matchable.",
+    "guard_transition_latency_seconds": "Time from capturing the frame that caused a guard state transition to the transition.",
+}
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def escape_label(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float] = BUCKETS):
+        """Counts of observations per bucket, plus their sum and count."""
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate a quantile by linear interpolation within its bucket."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            if cumulative + count >= rank and count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+
+class NullMetrics:
+    """Metrics sink used while metrics are disabled: every call returns immediately."""
+    enabled = False
+
+    def inc(self, name: str, amount: float = 1.0, **labels: str) -> None:
+        pass
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        pass
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {}
+
+    def prometheus_text(self) -> str:
+        return ""
+
+
+class MetricsRegistry(NullMetrics):
+    enabled = True
+
+    def __init__(self, buckets: Sequence[float] = BUCKETS):
+        """
+        Thread-safe counters and latency histograms, keyed by metric name and labels.
+
+        :param buckets: Upper bounds of the histogram buckets in seconds.
+        """
+        self.buckets = tuple(buckets)
+        self.counters: Dict[str, Dict[LabelKey, float]] = {}
+        self.histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + amount
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Counters, and count, sum and estimated percentiles of each histogram, as plain data."""
+        with self._lock:
+            counters = {name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                        for name, series in self.counters.items()}
+            histograms = {
+                name: [{
+                    "labels": dict(key),
+                    "count": histogram.count,
+                    "sum": histogram.sum,
+                    "p50": histogram.quantile(0.5),
+                    "p95": histogram.quantile(0.95),
+                    "p99": histogram.quantile(0.99),
+                } for key, histogram in series.items()]
+                for name, series in self.histograms.items()
+            }
+        return {"counters": counters, "histograms": histograms}
+
+    def prometheus_text(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self.counters.items()):
+                self._header(lines, name, "counter")
+                for key, value in series.items():
+                    lines.append(f"{name}{self._labels(key)} {value:g}")
+            for name, series in sorted(self.histograms.items()):
+                self._header(lines, name, "histogram")
+                for key, histogram in series.items():
+                    cumulative = 0
+                    for bound, count in zip(self.buckets + (float("inf"),), histogram.counts):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                        lines.append(f"{name}_bucket{self._labels(key + (('le', le),))} {cumulative}")
+                    lines.append(f"{name}_sum{self._labels(key)} {histogram.sum:.6f}")
+                    lines.append(f"{name}_count{self._labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _header(lines: List[str], name: str, kind: str) -> None:
+        if name in DESCRIPTIONS:
+            lines.append(f"# HELP {name} {DESCRIPTIONS[name]}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    @staticmethod
+    def _labels(key: LabelKey) -> str:
+        if not key:
+            return ""
+        return "{" + ",".join(f'{name}="{escape_label(value)}"' for name, value in key) + "}"
+
+
+class MetricsServer:
+    def __init__(self, registry: MetricsRegistry, host: str = "127.0.0.1", port: int = 9108):
+        """
+        HTTP endpoint serving /metrics in Prometheus text format and /metrics.json as a snapshot.
+
+        :param registry: Metrics to serve.
+        :param host: Interface to listen on; the default only accepts local connections.
+        :param port: Port to listen on; 0 picks a free one.
+        """
+        self.registry = registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(handler):
+                if handler.path.split("?")[0] == "/metrics":
+                    body = registry.prometheus_text().encode()
+                    contentType = "text/plain; version=0.0.4; charset=utf-8"
+                elif handler.path.split("?")[0] == "/metrics.json":
+                    body = json.dumps(registry.snapshot()).encode()
+                    contentType = "application/json"
+                else:
+                    handler.send_error(404)
+                    return
+                handler.send_response(200)
+                handler.send_header("Content-Type", contentType)
+                handler.send_header("Content-Length", str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(handler, format, *args):
+                logger.debug(f"Metrics request: {format % args}")
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, name="MetricsServer", daemon=True)
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self.server.server_address[:2]
+
+    def start(self) -> "MetricsServer":
+        self._thread.start()
+        logger.info(f"Metrics served at http://{self.address[0]}:{self.address[1]}/metrics")
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class SnapshotWriter:
+    def __init__(self, registry: MetricsRegistry, path: str, interval: float = 60.0):
+        """
+        Appends a JSON snapshot of the metrics to a JSONL file every interval seconds.
+
+        :param registry: Metrics to write.
+        :param path: JSONL file appended to.
+        :param interval: Seconds between snapshots.
+        """
+        self.registry = registry
+        self.path = Path(path)
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="MetricsSnapshots", daemon=True)
+
+    def start(self) -> "SnapshotWriter":
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._thread.start()
+        return self
+
+    def write(self) -> None:
+        snapshot = dict(time=time.time(), **self.registry.snapshot())
+        with open(self.path, "a") as file:
+            file.write(json.dumps(snapshot) + "\n")
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.write()
+            except OSError as e:
+                logger.error(f"Failed to write metrics snapshot: {e}")
+
+    def stop(self) -> None:
+        """Stop writing, after a final snapshot."""
+        if not self._stop.is_set():
+            self._stop.set()
+            try:
+                self.write()
+            except OSError as e:
+                logger.error(f"Failed to write metrics snapshot: {e}")
+
+
+_metrics = NullMetrics()
+_server: Optional[MetricsServer] = None
+_snapshots: Optional[SnapshotWriter] = None
+_metricsLock = threading.Lock()
+
+
+def configure_metrics(metricsConfig: Optional[Dict[str, Any]] = None):
+    """
+    (Re)configure metrics from the metrics section of the configuration.
+
+    While disabled, instrumented code records into a NullMetrics whose calls do nothing.
+    Metrics recorded in recognition worker processes are not collected.
+
+    :param metricsConfig: Mapping with enabled, host, port (null disables the endpoint),
+        snapshotPath (null disables snapshots) and snapshotInterval.
+    :return: The active metrics sink.
+    """
+    global _metrics, _server, _snapshots
+    metricsConfig = metricsConfig or {}
+    with _metricsLock:
+        if _server is not None:
+            _server.stop()
+            _server = None
+        if _snapshots is not None:
+            _snapshots.stop()
+            _snapshots = None
+        if not metricsConfig.get("enabled", False):
+            _metrics = NullMetrics()
+            return _metrics
+        if not isinstance(_metrics, MetricsRegistry):
+            _metrics = MetricsRegistry()
+        if metricsConfig.get("port") is not None:
+            try:
+                _server = MetricsServer(_metrics, host=metricsConfig.get("host", "127.0.0.1"),
+                                        port=metricsConfig["port"]).start()
+            except OSError as e:
+                logger.error(f"Failed to start the metrics endpoint: {e}")
+        if metricsConfig.get("snapshotPath"):
+            _snapshots = SnapshotWriter(_metrics, metricsConfig["snapshotPath"],
+                                        interval=metricsConfig.get("snapshotInterval", 60.0)).start()
+        return _metrics
+
+
+def get_metrics():
+    """The active metrics sink; a NullMetrics unless configure_metrics enabled metrics."""
+    return _metrics
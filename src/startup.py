@@ -0,0 +1,97 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import wait as waitFutures
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class StartupProfiler:
+    def __init__(self):
+        """Records how long each import and initialization step takes, and on which thread."""
+        self.started = time.perf_counter()
+        self.steps: List[Tuple[str, float, float, str]] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def step(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter() - start)
+
+    def record(self, name: str, start: float, seconds: float) -> None:
+        with self._lock:
+            self.steps.append((name, start - self.started, seconds, threading.current_thread().name))
+
+    def report(self) -> str:
+        """Table of steps in start order with their offset from profiler creation and duration."""
+        with self._lock:
+            steps = sorted(self.steps, key=lambda step: step[1])
+        lines = [f"{'step':<44} {'start ms':>9} {'took ms':>9}  thread"]
+        for name, offset, seconds, thread in steps:
+            lines.append(f"{name:<44} {offset * 1e3:>9.1f} {seconds * 1e3:>9.1f}  {thread}")
+        lines.append(f"{'total':<44} {'':>9} {(time.perf_counter() - self.started) * 1e3:>9.1f}")
+        return "\n".join(lines)
+
+
+class Warmup:
+    def __init__(self, profiler: Optional[StartupProfiler] = None, workers: int = 4):
+        """
+        Runs named initialization steps in the background so that start-up does not block on them.
+
+        :param profiler: Profiler recording the duration of each step.
+        :param workers: Number of steps run at once.
+        """
+        self.profiler = profiler or StartupProfiler()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="Warmup")
+        self._futures: Dict[str, Future] = {}
+
+    def start(self, name: str, function: Callable, *args) -> Future:
+        def run():
+            with self.profiler.step(f"warm up {name}"):
+                return function(*args)
+
+        def logFailure(future: Future) -> None:
+            if not future.cancelled() and future.exception() is not None:
+                logger.error(f"Warm-up of {name} failed: {future.exception()}")
+
+        future = self._executor.submit(run)
+        future.add_done_callback(logFailure)
+        self._futures[name] = future
+        return future
+
+    def ready(self, name: str) -> bool:
+        future = self._futures.get(name)
+        return future is None or future.done()
+
+    def status(self) -> Dict[str, str]:
+        """State of each step: running, ready or failed."""
+        states = {}
+        for name, future in self._futures.items():
+            if not future.done():
+                states[name] = "running"
+            else:
+                states[name] = "failed" if future.cancelled() or future.exception() is not None else "ready"
+        return states
+
+    def wait(self, name: Optional[str] = None, timeout: Optional[float] = None):
+        """
+        Wait for one step, or for all of them.
+
+        :param name: Step to wait for; None waits for every step.
+        :param timeout: Seconds to wait; None waits indefinitely.
+        :return: The step's result when a name is given.
+        :raises: The step's exception if it failed.
+        """
+        if name is not None:
+            future = self._futures.get(name)
+            return future.result(timeout=timeout) if future is not None else None
+        waitFutures(list(self._futures.values()), timeout=timeout)
+        for future in self._futures.values():
+            if future.done():
+                future.result()
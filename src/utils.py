@@ -1,9 +1,12 @@
+import atexit
 import logging
 import os
+import queue
 import yaml
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 logger = logging.getLogger(__name__)
 
@@ -18,8 +21,23 @@ def load_config(config_path: str = "config.yaml") -> Dict[str, Any]:
         logger.error(f"Failed to load configuration: {e}")
         raise
 
-def setup_logging(log_dir: str = "logs", logLevel: int = logging.INFO) -> None:
-    """Set up logging to a file with a timestamp."""
+_logListener: Optional[QueueListener] = None
+
+
+def setup_logging(log_dir: str = "logs", logLevel: int = logging.INFO, maxBytes: int = 10 * 1024 * 1024,
+                  backupCount: int = 5) -> None:
+    """
+    Set up logging to the console and to a size-rotated file with a timestamp.
+
+    Log calls only put the record on a queue; a QueueListener thread formats and writes it,
+    so slow disks or consoles never stall the caller.
+
+    :param log_dir: Directory of the log files.
+    :param logLevel: Minimum level logged.
+    :param maxBytes: Size at which the log file is rotated.
+    :param backupCount: Number of rotated log files kept.
+    """
+    global _logListener
     logPath = Path(log_dir)
     logPath.mkdir(parents=True, exist_ok=True)
     log_filename = datetime.now().strftime("log_%Y%m%d_%H%M%S.txt")
@@ -31,17 +49,30 @@ def setup_logging(log_dir: str = "logs", logLevel: int = logging.INFO) -> None:
 
     if logger.hasHandlers():
         logger.handlers.clear()
+    if _logListener is not None:
+        _logListener.stop()
 
     consoleHandler = logging.StreamHandler()
     consoleHandler.setFormatter(logFormat)
-    logger.addHandler(consoleHandler)
 
-    fileHandler = logging.FileHandler(logFile)
+    fileHandler = RotatingFileHandler(logFile, maxBytes=maxBytes, backupCount=backupCount)
     fileHandler.setFormatter(logFormat)
-    logger.addHandler(fileHandler)
+
+    logQueue = queue.SimpleQueue()
+    logger.addHandler(QueueHandler(logQueue))
+    _logListener = QueueListener(logQueue, consoleHandler, fileHandler, respect_handler_level=True)
+    _logListener.start()
 
     logger.info(f"Logging initialized. Log file: {logFile}")
 
+
+@atexit.register
+def _stop_logging() -> None:
+    # Writes out the records still queued
+    if _logListener is not None:
+        _logListener.stop()
+
+
 def load_api_key(service_name: str, config: Dict[str, Any]) -> str:
     """Load API key for a given service from the configuration."""
     try:
@@ -0,0 +1,43 @@
+from pathlib import Path
+
+import pytest
+
+from src.agents.commandMatcher import CommandMatcher
+from src.utils import load_config
+
+CONFIG_PATH = Path(__file__).resolve().parents[1] / "config.yaml"
+
+
+@pytest.fixture(scope="module")
+def matcher():
+    return CommandMatcher.from_config(load_config(str(CONFIG_PATH)))
+
+
+@pytest.mark.parametrize("utterance, intent", [
+    ("guard my room please", "activationCommand"),
+    ("Guard my room!", "activationCommand"),
+    ("secure my room please", "activationCommand"),
+    ("deactivate guard", "deactivationCommand"),
+    ("stop", "deactivationCommand"),
+    ("shut down now", "shutdownCommand"),
+    ("exit", "shutdownCommand"),
+])
+def test_commands_match(matcher, utterance, intent):
+    assert matcher.match(utterance).intent == intent
+
+
+@pytest.mark.parametrize("utterance", [
+    "please do not stop",
+    "dont stop me",
+    "close the door behind you",
+    "i will exit now",
+    "i am here to start trouble",
+    "i just came to get my charger",
+    "quiet",
+    "terminator",
+    "close it",
+    "top",
+    "stars",
+])
+def test_speech_containing_a_command_word_does_not_match(matcher, utterance):
+    assert matcher.match(utterance).intent is None
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from src.agents.galleryIndex import Gallery, IvfGallery
+
+
+def encodings(count, seed=0):
+    return np.random.default_rng(seed).normal(size=(count, 128)).astype(np.float32)
+
+
+def labels(start, stop):
+    return [f"person{i}" for i in range(start, stop)]
+
+
+def test_retrain_keeps_configured_nlist():
+    gallery = IvfGallery.build(encodings(100), labels(0, 100), nlist=7, iterations=3)
+    grown = gallery.extended(encodings(150, seed=1), labels(100, 250))
+    # The gallery has more than doubled, so the centroids were retrained
+    assert grown.trainedSize == 250
+    assert len(grown.centroids) == 7
+    assert grown.nlist == 7 and grown.iterations == 3
+
+
+def test_extended_without_retrain_keeps_settings():
+    gallery = IvfGallery.build(encodings(100), labels(0, 100), nlist=5)
+    grown = gallery.extended(encodings(10, seed=1), labels(100, 110))
+    assert grown.trainedSize == 100
+    assert grown.centroids is gallery.centroids
+    assert grown.nlist == 5
+
+
+@pytest.mark.parametrize("storage", ["float16", "int8"])
+def test_removed_renumbers_ids(storage):
+    data = encodings(60)
+    gallery = IvfGallery.build(data, labels(0, 60), nlist=4, nprobe=4, storage=storage)
+    dropped = {"person3", "person10", "person59"}
+    smaller = gallery.removed(dropped)
+
+    expected = [label for label in labels(0, 60) if label not in dropped]
+    assert smaller.labels == expected
+    ids = np.sort(np.concatenate([inverted.ids for inverted in smaller.lists]))
+    np.testing.assert_array_equal(ids, np.arange(len(expected)))
+    # Every surviving entry is still found as its own nearest neighbour, under its new index
+    kept = data[[int(label[len("person"):]) for label in expected]]
+    best, _ = smaller.nearest(kept)
+    assert [smaller.labels[i] for i in best] == expected
+
+
+def test_removed_unknown_label_returns_same_gallery():
+    gallery = IvfGallery.build(encodings(20), labels(0, 20), nlist=2)
+    assert gallery.removed(["nobody"]) is gallery
+
+
+@pytest.mark.parametrize("gallery", [
+    Gallery(),
+    IvfGallery.build(encodings(10), labels(0, 10), nlist=2).removed(labels(0, 10)),
+], ids=["exact", "ivf"])
+def test_nearest_on_empty_gallery(gallery):
+    assert len(gallery) == 0
+    best, distances = gallery.nearest(encodings(3))
+    np.testing.assert_array_equal(best, [-1, -1, -1])
+    assert np.isinf(distances).all()